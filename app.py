@@ -1,39 +1,84 @@
-from config.shared import FIREBASE_CONFIG
+from config.app import QUERY_DEFAULT_LIMIT, QUERY_MAX_LIMIT
+from config.shared import LEAGUE, LEAGUES
 from dash.dependencies import ALL, Input, Output, State
-from pyrebase.pyrebase import Firebase
+from dashboard.datacache import DataFrameCache
+from dashboard.rendering import RENDER_DENSITY, create_figure, get_figure_selection, get_render_mode
+from dashboard.selection import SelectionEngine, get_brush, get_selection_key
+from flask import jsonify, request
+from ipc.leaderlock import LeaderLock
+from ipc.notifications import NotificationSubscriber
+from metrics.registry import registry
+from storage.itemindex import ItemIndex
+from storage.listingsstore import create_listings_store
 from threads.stashprocessor.stashprocessor import StashProcessor
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
 import math
-import pandas as pd
-import plotly.express as px
+import numpy as np
+import time
 
 
-database = Firebase(FIREBASE_CONFIG).database()
-data = None
+LOAD_DATA_SECONDS = registry.histogram('dashboard_load_data_seconds', 'Time to load the dataset of a selected item', ('league',))
+UPDATE_FIG_SECONDS = registry.histogram('dashboard_update_fig_seconds', 'Time to update the figures after a selection')
+QUERY_SECONDS = registry.histogram('dashboard_query_seconds', 'Time to answer a range query over listings', ('league',))
 
-def create_item_selector():
-    item_names = [value.key() for value in database.child('StashProcessor').child('listings').get().each()]
-    item_selector = dcc.Dropdown(
-        id='item-selector',
-        options=[
-            {'label': item_name, 'value': item_name}
-        for item_name in item_names]
+def on_notification(message):
+    if 'metrics' in message:
+        # the ingest process publishes its metrics, every worker serves them next to its own
+        registry.set_external('ingest', message['metrics'])
+    else:
+        data_caches[message.get('league', LEAGUE)].mark_stale(message['items'])
+
+notifications = NotificationSubscriber(on_notification)
+data_caches = {
+    league: DataFrameCache(create_listings_store(league), notifications, league)
+for league, _ in LEAGUES}
+notifications.start()
+
+def create_league_selector():
+    league_selector = dcc.Dropdown(
+        id='league-selector',
+        options=[{'label': league_name, 'value': league} for league, league_name in LEAGUES],
+        value=LEAGUE,
+        clearable=False,
     )
-    return item_selector
+    return league_selector
+
+def create_item_options(league):
+    listings_store = data_caches[league].listings_store
+    item_index = ItemIndex(listings_store.read_item_index())
+    item_names = item_index.get_item_names() or sorted(listings_store.get_item_names())
+    return [
+        {'label': f'{item_name} ({item_index.get_active_count(item_name)})' if item_name in item_index.entries else item_name, 'value': item_name}
+    for item_name in item_names]
 
 def create_app():
     external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
     app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
     app.layout = html.Div([
         html.H2('PoE Market Analyser'),
-        create_item_selector(),
+        create_league_selector(),
+        dcc.Dropdown(id='item-selector'),
+        dcc.Store(id='dataset-handle'),
+        dcc.Store(id='figure-state'),
+        dcc.Store(id='figure-updates'),
+        dcc.Store(id={'type': 'dataset-stale', 'index': 'figures'}),
+        dcc.Store(id={'type': 'dataset-stale', 'index': 'filters'}),
+        html.Div(id='filter-panel'),
+        html.Div(id='filter-results'),
         html.Div(id='figures-container')
     ])
     return app
 
+# held for the life of the process, the flock is released once the lock is garbage collected
+leader_lock = LeaderLock()
+
 def create_stash_processor_thread():
+    # ingest normally runs in its own process (ingest.py), this is only for running the app on its own
+    if not leader_lock.acquire():
+        print('Ingest process already running, not starting a StashProcessor')
+        return None
     thread = StashProcessor()
     thread.setDaemon(True)
     thread.start()
@@ -42,25 +87,78 @@ def create_stash_processor_thread():
 app = create_app()
 server = app.server
 
-def load_data(item_name):
-    dict_ = {}
-    json_data = database.child('StashProcessor').child('listings').child(item_name).get().val()
-    for item in filter(lambda item: not item['corrupted'], json_data.values()):
-        if 'price' not in dict_:
-            dict_['price'] = []
-        dict_['price'].append(item['price'])
-        for mod in item.get('explicitMods', []) + item.get('implicitMods', []):
-            key, = mod.keys()
-            value, = mod.values()
-            if key not in dict_:
-                dict_[key] = []
-            dict_[key].append(value)
+@server.route('/metrics')
+def metrics():
+    return server.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
+
+def load_data(league, item_name):
+    with LOAD_DATA_SECONDS.labels(league).time():
+        return data_caches[league].get(item_name)
+
+def get_data(dataset_handle):
+    '''
+    Returns the DataFrame a session's dataset handle refers to, or None if its version is gone.
+    '''
+    return data_caches[dataset_handle['league']].get_version(dataset_handle['item'], dataset_handle['version'])
+
+def query_listings(league, item_name, conditions, limit=QUERY_DEFAULT_LIMIT, version=None):
+    '''
+    Returns the listings of an item matching every {column: (min, max)} condition, cheapest first, as
+    {'version', 'matches', 'listings'}, from the current version or the given one. Returns None if that
+    version is gone. Unknown columns raise a KeyError.
+    '''
+    with QUERY_SECONDS.labels(league).time():
+        result = data_caches[league].query(item_name, conditions, max(0, min(limit, QUERY_MAX_LIMIT)), version)
+    if result is None:
+        return None
+    num_matches, listings, version = result
+    return {'version': version, 'matches': num_matches, 'listings': listings}
+
+def parse_bound(value):
+    return None if value is None else float(value)
+
+@server.route('/api/query', methods=['POST'])
+def range_query():
+    '''
+    Range query over an item's current listings. Takes {"league", "item", "filters": {column: {"min", "max"}},
+    "limit"}, where either bound may be left out, and returns the cheapest matching listings.
+    '''
+    body = request.get_json(silent=True) or {}
+    league = body.get('league', LEAGUE)
+    if league not in data_caches:
+        return jsonify({'error': f'Unknown league: {league}'}), 404
+    if not body.get('item'):
+        return jsonify({'error': 'No item given'}), 400
     try:
-        df = pd.DataFrame.from_dict(dict_)
-    except ValueError:
-        print('Inconsistent number of mods!')
-        return data  # return old(existing) data
-    return df
+        conditions = {
+            column: (parse_bound(bounds.get('min')), parse_bound(bounds.get('max')))
+        for column, bounds in body.get('filters', {}).items()}
+        limit = int(body.get('limit', QUERY_DEFAULT_LIMIT))
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({'error': 'Filters must be {column: {"min": number, "max": number}}'}), 400
+    try:
+        return jsonify(query_listings(league, body['item'], conditions, limit))
+    except KeyError as e:
+        return jsonify({'error': f'Unknown column: {e.args[0]}'}), 400
+
+def create_filter_panel(columns):
+    return [
+        html.Div([
+            html.Label(column, style={'flex': 1}),
+            dcc.Input(id={'type': 'filter-min', 'index': column}, type='number', placeholder='min', debounce=True),
+            dcc.Input(id={'type': 'filter-max', 'index': column}, type='number', placeholder='max', debounce=True),
+        ], style={'display': 'flex'})
+    for column in columns]
+
+def create_results_table(result, columns):
+    header = html.Tr([html.Th(column) for column in columns])
+    rows = [
+        html.Tr([html.Td('' if listing[column] is None else round(listing[column], 2)) for column in columns])
+    for listing in result['listings']]
+    return [
+        html.P(f'{result["matches"]} matching listings, cheapest {len(result["listings"])} shown'),
+        html.Table([header] + rows),
+    ]
 
 def create_figures(num_columns):
     FIGS_PER_ROW = 2
@@ -79,56 +177,147 @@ def create_figures(num_columns):
         rows.append(html.Div(row, style={'display': 'flex'}))
     return rows
 
+@app.callback(
+    Output('item-selector', 'options'),
+    Output('item-selector', 'value'),
+    Input('league-selector', 'value'),
+)
+def league_selected(league):
+    return create_item_options(league), None
+
 @app.callback(
     Output('figures-container', 'children'),
+    Output('filter-panel', 'children'),
+    Output('dataset-handle', 'data'),
     Input('item-selector', 'value'),
+    Input({'type': 'dataset-stale', 'index': ALL}, 'data'),
+    State('league-selector', 'value'),
     State('figures-container', 'children'),
+    State('filter-panel', 'children'),
+    State('dataset-handle', 'data'),
 )
-def item_selected(value, current_figures):
-    global data
-    print(f'{value} selected')
+def item_selected(value, stale, league, current_figures, current_filters, dataset_handle):
+    # also runs when a callback finds the session's version gone, to load the latest one
+    print(f'{value} selected in {league}')
     if value:
-        new_data = load_data(value)
-        new_figures = create_figures(len(new_data.columns))
-        data = new_data
+        data, version = load_data(league, value)
         print(f'{len(data)} listings found')
-        return new_figures
-    return current_figures
+        # each session keeps its own handle, so users sharing a worker no longer overwrite each other's data.
+        # Every load gets a new handle, which tells update_fig the figures were created anew.
+        return (
+            create_figures(len(data.columns)),
+            create_filter_panel(data.columns),
+            {'league': league, 'item': value, 'version': version, 'loaded': time.time()},
+        )
+    return current_figures, current_filters, dataset_handle
 
 @app.callback(
-    Output({'type': 'figure', 'index': ALL}, 'figure'),
-    Input({'type': 'figure', 'index': ALL}, 'selectedData')
+    Output('filter-results', 'children'),
+    Output({'type': 'dataset-stale', 'index': 'filters'}, 'data'),
+    Input({'type': 'filter-min', 'index': ALL}, 'value'),
+    Input({'type': 'filter-max', 'index': ALL}, 'value'),
+    State({'type': 'filter-min', 'index': ALL}, 'id'),
+    State('dataset-handle', 'data'),
 )
-def update_fig(*args):
-    def intersect(a, b):
-        return [v for v in a if v in b]
-    
-    def get_figure(df, x_col, y_col, selectedpoints):
-        fig = px.scatter(df, x=df[x_col], y=df[y_col], text=df.index)
-        fig.update_traces(
-            selectedpoints=selectedpoints,
-            customdata=df.index,
-            mode='markers',
-            marker={ 'color': 'rgba(255, 0, 0, 0.3)', 'size': 10 },
-            unselected={
-                'marker': {
-                    'color': 'rgba(0, 116, 217, 0.2)',
-                    'size': 5,
-                },
-            }
-        )
-        fig.update_layout(dragmode='select')
-        return fig
+def filters_changed(mins, maxes, ids, dataset_handle):
+    conditions = {
+        filter_id['index']: (low, high)
+    for filter_id, low, high in zip(ids, mins, maxes) if low is not None or high is not None}
+    if not dataset_handle or not conditions:
+        return None, dash.no_update
+    # the version the session's figures show, so results and figures agree
+    result = query_listings(dataset_handle['league'], dataset_handle['item'], conditions, version=dataset_handle['version'])
+    if result is None:
+        return None, time.time()
+    return create_results_table(result, [filter_id['index'] for filter_id in ids]), dash.no_update
 
-    selected_points = data.index
-    for selected_data in args[0]:
-        if selected_data and selected_data['points']:
-            selected_points = intersect(selected_points, [p['customdata'] for p in selected_data['points']])
-    return [
-        get_figure(data, data.columns[i], data.columns[0], selected_points)
-    for i in range(1, len(data.columns))]
+@app.callback(
+    Output('figure-updates', 'data'),
+    Output('figure-state', 'data'),
+    Output({'type': 'dataset-stale', 'index': 'figures'}, 'data'),
+    Input({'type': 'figure', 'index': ALL}, 'selectedData'),
+    State('figure-state', 'data'),
+    State('dataset-handle', 'data'),
+)
+def update_fig(selected_datas, figure_state, dataset_handle):
+    if not dataset_handle:
+        return dash.no_update, dash.no_update, dash.no_update
+    with UPDATE_FIG_SECONDS.time():
+        if (data := get_data(dataset_handle)) is None:
+            return dash.no_update, dash.no_update, time.time()
+        if not figure_state or figure_state['dataset'] != dataset_handle:
+            # a new handle comes with new figures that have not been drawn yet
+            figure_state = {'dataset': dataset_handle, 'figures': None}
+        updates, states = update_figures(data, selected_datas, figure_state['figures'])
+        return updates, {'dataset': dataset_handle, 'figures': states}, dash.no_update
+
+def update_figures(data, selected_datas, figure_state):
+    '''
+    Returns the update of every figure after a brush, and the figure state. Figures are redrawn from the
+    session's dataset, so the browser never sends them back: an update is a whole figure when one is drawn
+    or drilled into, just its selectedpoints when only those changed and None otherwise. The figure state
+    keeps, per figure, the brush it was drilled into and a fingerprint of the selection it shows.
+    '''
+    states = figure_state or [None] * len(selected_datas)
+
+    def get_columns(i):
+        return data.columns[i + 1], data.columns[0]
+
+    selection = SelectionEngine(data)
+    for i, selected_data in enumerate(selected_datas):
+        selection.set_selection(i, selected_data, *get_columns(i))
+    selected_rows = selection.get_selected_rows()
+    updates = []
+    for i, state in enumerate(states):
+        x_col, y_col = get_columns(i)
+        if state is None:
+            # first render after an item was selected
+            figure = create_figure(data, x_col, y_col, selected_rows)
+            updates.append({'figure': figure})
+            states[i] = {'drill': None, 'selection': get_selection_key(figure.data[0].selectedpoints)}
+            continue
+        drilled = state['drill'] is not None
+        if (get_render_mode(len(data)) == RENDER_DENSITY or drilled) and drilled != (i in selection.masks):
+            # drill into a brushed density figure, or back out once its brush is cleared
+            drill = get_brush(selected_datas[i]) if i in selection.masks else None
+            rows = np.flatnonzero(selection.masks[i]) if i in selection.masks else None
+            figure = create_figure(data, x_col, y_col, selected_rows, rows)
+            updates.append({'figure': figure})
+            states[i] = {'drill': drill, 'selection': get_selection_key(figure.data[0].selectedpoints)}
+            continue
+        rows = np.unique(selection.get_customdata_rows(state['drill'], x_col, y_col)) if drilled else None
+        selectedpoints = get_figure_selection(data, x_col, y_col, selected_rows, rows)
+        if (key := get_selection_key(selectedpoints)) != state['selection']:
+            # only the selection changed, so only the selected points are sent
+            updates.append({'selectedpoints': selectedpoints.tolist() if selectedpoints is not None else None})
+            state['selection'] = key
+        else:
+            updates.append(None)
+    return updates, states
 
-create_stash_processor_thread()
+# applies the updates in the browser, which already holds the rendered figures
+app.clientside_callback(
+    '''
+    function(updates, figures) {
+        return figures.map(function(figure, i) {
+            var update = updates && updates.length === figures.length ? updates[i] : null;
+            if (!update) {
+                return window.dash_clientside.no_update;
+            }
+            if (update.figure) {
+                return update.figure;
+            }
+            var data = figure.data.slice();
+            data[0] = Object.assign({}, data[0], {selectedpoints: update.selectedpoints});
+            return Object.assign({}, figure, {data: data});
+        });
+    }
+    ''',
+    Output({'type': 'figure', 'index': ALL}, 'figure'),
+    Input('figure-updates', 'data'),
+    State({'type': 'figure', 'index': ALL}, 'figure'),
+)
 
 if __name__ == '__main__':
+    create_stash_processor_thread()
     app.run_server()
@@ -0,0 +1,76 @@
+'''
+Compares modifier cleaning on the processing thread with the CleaningPool on recorded public stash pages.
+
+    python -m benchmarks.cleaningpool [--workers N] uniques.json page.json[.gz] [page.json[.gz] ...]
+
+uniques.json holds UniquesInfoSvc data ({category: {name: item info}}). Items are cleaned for the 50 and 500
+most listed uniques in the pages and for every unique in uniques.json.
+'''
+from collections import Counter
+from threads.stashprocessor.cleaningpool import CleaningPool
+from threads.stashprocessor.modifiertemplate import UniqueTemplate
+import argparse
+import gzip
+import json
+import multiprocessing
+import time
+
+
+def read_page(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        return f.read()
+
+
+def clean_single(templates, pages):
+    for items in pages:
+        for item in items:
+            template = templates.get((item['extended']['category'], item['name']))
+            if template is not None:
+                template.explicit.match(item.get('explicitMods', []))
+                template.implicit.match(item.get('implicitMods', []))
+
+
+def clean_pooled(pool, pages):
+    for items in pages:
+        pool.match(items)
+
+
+def measure(label, pages, fn):
+    num_items = sum(map(len, pages))
+    start = time.perf_counter()
+    fn(pages)
+    elapsed = time.perf_counter() - start
+    print(f'{label:>24}: {num_items} items, {round(num_items / elapsed)} items/s')
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    arg_parser.add_argument('uniques')
+    arg_parser.add_argument('pages', nargs='+')
+    args = arg_parser.parse_args()
+
+    with open(args.uniques) as f:
+        uniques_info = json.load(f)
+    templates = {
+        (item_category, item_name): UniqueTemplate(item_info)
+    for item_category, category_items in uniques_info.items() for item_name, item_info in category_items.items()}
+    pages = [
+        [item for stash in json.loads(read_page(path))['stashes'] for item in stash['items'] if 'extended' in item]
+    for path in args.pages]
+    names = Counter(item['name'] for items in pages for item in items if item['name'])
+    pool = CleaningPool(uniques_info, args.workers)
+    try:
+        for num_uniques in (50, 500, None):
+            tracking = {name for name, _ in names.most_common(num_uniques)} if num_uniques else {name for _, name in templates}
+            tracked_pages = [[item for item in items if item['name'] in tracking] for items in pages]
+            label = f'{num_uniques or "all"} uniques'
+            measure(f'{label}, single', tracked_pages, lambda pages: clean_single(templates, pages))
+            measure(f'{label}, {args.workers} workers', tracked_pages, lambda pages: clean_pooled(pool, pages))
+    finally:
+        pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+'''
+Records everything ingest reads from upstream so it can be replayed offline with benchmarks.replay: the
+poe.ninja uniques, build overview and currency responses it starts up with, and a run of consecutive public
+stash pages starting at the current head.
+
+    python -m benchmarks.record [--pages N] recording_dir
+'''
+from benchmarks.recording import Recording, RecordingClient, patch_standins
+from threads.stashprocessor.httpclient import shared_client
+from threads.stashprocessor.stashprocessor import StashProcessor
+import argparse
+import tempfile
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--pages', type=int, default=100)
+    arg_parser.add_argument('recording_dir')
+    args = arg_parser.parse_args()
+
+    recording = Recording(args.recording_dir)
+    client = RecordingClient(shared_client, recording)
+    with tempfile.TemporaryDirectory() as data_root, patch_standins(client, data_root):
+        # starts from an empty database and no snapshots, so every bit of reference data is fetched from poe.ninja
+        stash_processor = StashProcessor()
+        stash_processor.uniques_data_svc.wait_until_loaded()
+        change_id = recording.head_change_id = stash_processor.fetch_next_change_id()
+        for page in range(args.pages):
+            change_id = stash_processor.fetch_stash_data(change_id)['next_change_id']
+            print(f'Recorded page {page + 1}/{args.pages}')
+    recording.save_manifest()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+'''
+Recorded upstream responses and the local stand-ins used to record and replay them: an HTTP client that serves
+recorded responses, one that records real ones, and an in-memory Firebase.
+
+A recording is a directory of gzipped response bodies plus manifest.json, which maps every request (url and
+params) to its file.
+'''
+from contextlib import ExitStack
+from datetime import timedelta
+from storage.sqlitestore import SQLiteListingsStore
+from threads.stashprocessor.uniquesinfosvc import UniquesInfoSvc
+from unittest import mock
+import gzip
+import json
+import os
+import time
+
+
+def get_request_key(url, params=None):
+    return json.dumps([url, sorted((params or {}).items())])
+
+
+class ReplayResponse:
+    '''
+    The part of a `requests` response the ingest code uses, over a recorded body.
+    '''
+    status_code = 200
+
+    def __init__(self, content, elapsed=timedelta(0)):
+        self.content = content
+        self.elapsed = elapsed
+        self.headers = {}
+        self.requested = time.time()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def raise_for_status(self):
+        pass
+
+
+class Recording:
+    def __init__(self, path):
+        self.path = path
+        self.requests = {}  # request key -> file name
+        self.head_change_id = None
+        manifest_path = os.path.join(path, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            self.requests = manifest['requests']
+            self.head_change_id = manifest['head_change_id']
+
+    def save_manifest(self):
+        with open(os.path.join(self.path, 'manifest.json'), 'w') as f:
+            json.dump({'head_change_id': self.head_change_id, 'requests': self.requests}, f, indent=1)
+
+    def add(self, url, params, content):
+        os.makedirs(self.path, exist_ok=True)
+        file_name = f'{len(self.requests):05}.json.gz'
+        with gzip.open(os.path.join(self.path, file_name), 'wb') as f:
+            f.write(content)
+        self.requests[get_request_key(url, params)] = file_name
+
+    def has(self, url, params=None):
+        return get_request_key(url, params) in self.requests
+
+    def read(self, url, params=None):
+        file_name = self.requests.get(get_request_key(url, params))
+        if file_name is None:
+            raise KeyError(f'Not in the recording: {url} {params}')
+        with gzip.open(os.path.join(self.path, file_name), 'rb') as f:
+            return f.read()
+
+
+class RecordingClient:
+    '''
+    Passes requests on to a real client and records every response body.
+    '''
+    def __init__(self, client, recording):
+        self.client = client
+        self.recording = recording
+
+    def get(self, url, params=None, headers=None, stream=False):
+        response = self.client.get(url, params=params, headers=headers)
+        self.recording.add(url, params, response.content)
+        return ReplayResponse(response.content, response.elapsed)
+
+
+class ReplayClient:
+    '''
+    Serves recorded responses right away, without any rate limiting.
+    '''
+    def __init__(self, recording):
+        self.recording = recording
+        self.bodies = {}
+
+    def get(self, url, params=None, headers=None, stream=False):
+        key = get_request_key(url, params)
+        if key not in self.bodies:
+            self.bodies[key] = self.recording.read(url, params)
+        return ReplayResponse(self.bodies[key])
+
+
+class InMemoryDatabase:
+    '''
+    The subset of a pyrebase database reference the ingest code uses, over a nested dict.
+    '''
+    def __init__(self, data):
+        self.data = data
+        self.path = []
+
+    def child(self, *args):
+        for arg in args:
+            self.path += [part for part in str(arg).split('/') if part]
+        return self
+
+    def get_node(self, create=False):
+        node = self.data
+        for part in self.path:
+            if part not in node:
+                if not create:
+                    return None
+                node[part] = {}
+            node = node[part]
+        return node
+
+    def get(self):
+        return InMemoryResponse(self.get_node())
+
+    def set(self, value):
+        *parents, key = self.path
+        node = self.data
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[key] = value
+
+    def update(self, values):
+        node = self.get_node(create=True)
+        for path, value in values.items():
+            *parents, key = path.split('/')
+            target = node
+            for part in parents:
+                target = target.setdefault(part, {})
+            target[key] = value
+
+
+class InMemoryResponse:
+    def __init__(self, value):
+        self.value = value
+
+    def val(self):
+        return self.value
+
+
+class InMemoryFirebase:
+    def __init__(self, config=None, data=None):
+        self.data = data if data is not None else {}
+
+    def database(self):
+        return InMemoryDatabase(self.data)
+
+
+def patch_standins(client, data_root):
+    '''
+    Returns a context manager that points every upstream call of the ingest code at `client`, Firebase at a
+    fresh in-memory database, every listings store at an in-memory SQLite database and the local snapshots
+    of reference data at `data_root`.
+    '''
+    data = {}
+    patches = ExitStack()
+    for module in ('stashprocessor', 'currencyexchange', 'uniquesinfosvc'):
+        patches.enter_context(mock.patch(f'threads.stashprocessor.{module}.shared_client', client))
+    for module in ('stashprocessor', 'uniquesinfosvc'):
+        patches.enter_context(mock.patch(
+            f'threads.stashprocessor.{module}.Firebase', lambda config: InMemoryFirebase(config, data)
+        ))
+    patches.enter_context(mock.patch(
+        'threads.stashprocessor.leaguesubscriber.create_listings_store', lambda league: SQLiteListingsStore(':memory:')
+    ))
+    for module in ('stashprocessor', 'leaguesubscriber'):
+        patches.enter_context(mock.patch(f'threads.stashprocessor.{module}.DATA_ROOT', data_root))
+    patches.enter_context(mock.patch(
+        'threads.stashprocessor.stashprocessor.UniquesInfoSvc',
+        lambda: UniquesInfoSvc(os.path.join(data_root, 'uniques.snapshot'))
+    ))
+    return patches
@@ -0,0 +1,119 @@
+'''
+Replays a recording made with benchmarks.record through StashProcessor, CurrencyExchange and UniquesInfoSvc
+at full speed, with Firebase and HTTP replaced by local stand-ins and listings written to in-memory SQLite.
+
+    python -m benchmarks.replay [--repeat N] [--verbose] recording_dir
+
+Pages are run through the fetch, process and persist stages one after another on this thread, so per-page
+latency and the per-stage breakdown are not blurred by the pipeline overlapping them. The first run starts
+cold and fetches all reference data, later runs start from the local snapshots it saved.
+'''
+from benchmarks.recording import Recording, ReplayClient, patch_standins
+from config.stashprocessor import PUBLIC_STASH_URL
+from contextlib import redirect_stdout
+from threads.stashprocessor.stashprocessor import StashProcessor
+import argparse
+import io
+import math
+import resource
+import tempfile
+import time
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(math.ceil(fraction * len(ordered)) - 1, len(ordered) - 1)] if ordered else 0.0
+
+
+def count_pages(recording):
+    '''
+    Returns the number of consecutive recorded pages from the head and the number of items on them.
+    '''
+    num_pages = num_items = 0
+    change_id = recording.head_change_id
+    while recording.has(PUBLIC_STASH_URL, {'id': change_id}):
+        stash_data = ReplayClient(recording).get(PUBLIC_STASH_URL, {'id': change_id}).json()
+        num_items += sum(len(stash['items']) for stash in stash_data['stashes'])
+        change_id = stash_data['next_change_id']
+        num_pages += 1
+    return num_pages, num_items
+
+
+def replay(recording, num_pages, data_root):
+    '''
+    Returns the startup time, the time until all uniques data is loaded, {stage: [seconds per page]}, the
+    number of listings and the final flush time.
+    '''
+    stage_times = {'fetch': [], 'process': [], 'persist': []}
+    num_listings = 0
+    with patch_standins(ReplayClient(recording), data_root):
+        start = time.perf_counter()
+        stash_processor = StashProcessor()
+        startup_time = time.perf_counter() - start
+        # pages are only comparable between runs once every unique can be cleaned
+        stash_processor.uniques_data_svc.wait_until_loaded()
+        loaded_time = time.perf_counter() - start
+        stash_processor.last_checkpoint = math.inf  # nothing to resume from, so no checkpoints
+        stash_processor.next_change_id = recording.head_change_id
+        for subscriber in stash_processor.subscribers:
+            subscriber.listings_writer.start()
+        for _ in range(num_pages):
+            start = time.perf_counter()
+            page = stash_processor.fetch_stage(None)
+            fetched = time.perf_counter()
+            processed_page = stash_processor.process_stage(page)
+            processed = time.perf_counter()
+            stash_processor.persist_stage(processed_page)
+            persisted = time.perf_counter()
+            stage_times['fetch'].append(fetched - start)
+            stage_times['process'].append(processed - fetched)
+            stage_times['persist'].append(persisted - processed)
+            num_listings += len(processed_page[1])
+        start = time.perf_counter()
+        for subscriber in stash_processor.subscribers:
+            subscriber.listings_writer.stop()
+        for subscriber in stash_processor.subscribers:
+            subscriber.listings_writer.flush()
+        flush_time = time.perf_counter() - start
+    return startup_time, loaded_time, stage_times, num_listings, flush_time
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--repeat', type=int, default=1)
+    arg_parser.add_argument('--verbose', action='store_true', help='keep the ingest log output')
+    arg_parser.add_argument('recording_dir')
+    args = arg_parser.parse_args()
+
+    recording = Recording(args.recording_dir)
+    num_pages, num_items = count_pages(recording)
+    print(f'{num_pages} recorded pages, {num_items} items')
+    data_root = tempfile.TemporaryDirectory()
+    for run in range(args.repeat):
+        log = io.StringIO()
+        with redirect_stdout(None if args.verbose else log):
+            startup_time, loaded_time, stage_times, num_listings, flush_time = replay(recording, num_pages, data_root.name)
+        page_times = [sum(times) for times in zip(*stage_times.values())]
+        total_time = sum(page_times) + flush_time
+        print(
+            f'run {run + 1}: startup {round(startup_time * 1000, 2)}ms, '
+            f'uniques data loaded after {round(loaded_time * 1000, 2)}ms'
+        )
+        print(
+            f'  {round(num_items / total_time, 1)} items/s, {round(num_listings / total_time, 1)} listings/s, '
+            f'{round(num_pages / total_time, 2)} pages/s, '
+            f'page p50 {round(percentile(page_times, 0.5) * 1000, 2)}ms p99 {round(percentile(page_times, 0.99) * 1000, 2)}ms'
+        )
+        for stage, times in stage_times.items():
+            print(
+                f'  {stage:>8}: {round(sum(times) * 1000 / num_pages, 2)}ms/page '
+                f'({round(sum(times) / total_time * 100, 1)}%) p99 {round(percentile(times, 0.99) * 1000, 2)}ms'
+            )
+        print(f'  {"flush":>8}: {round(flush_time * 1000, 2)}ms')
+    data_root.cleanup()
+    # ru_maxrss is in KiB on Linux
+    print(f'peak RSS {round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+'''
+Compares the streaming stash parser with decoding whole pages via json.loads on recorded public stash pages.
+
+    python -m benchmarks.stashparser [--num-uniques N] page.json[.gz] [page.json[.gz] ...]
+
+Tracked uniques default to the N most listed item names across the given pages, tracked in every league that
+appears in them.
+'''
+from collections import Counter
+from threads.stashprocessor.dispatchindex import DispatchIndex
+from threads.stashprocessor.stashparser import StashStreamParser, iter_stash_items
+import argparse
+import gzip
+import json
+import time
+import tracemalloc
+
+
+def read_page(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        return f.read()
+
+
+def iter_chunks(raw, chunk_size):
+    for i in range(0, len(raw), chunk_size):
+        yield raw[i:i + chunk_size].decode('utf-8')
+
+
+def json_path(raw, dispatch_index):
+    stash_data = json.loads(raw)
+    return stash_data['next_change_id'], [
+        (stash['id'], [item for item in iter_stash_items(stash) if dispatch_index.is_acceptable(item)])
+    for stash in stash_data['stashes']]
+
+
+def streaming_path(raw, parser):
+    return parser.parse_chunks(iter_chunks(raw, StashStreamParser.CHUNK_SIZE))
+
+
+def measure(label, pages, fn):
+    # time and memory are measured in separate passes since tracemalloc slows allocation down
+    start = time.perf_counter()
+    results = [fn(raw) for raw in pages]
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    for raw in pages:
+        fn(raw)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:>10}: {round(elapsed * 1000 / len(pages), 2)}ms/page, peak {round(peak / 2 ** 20, 2)}MiB')
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--num-uniques', type=int, default=50)
+    arg_parser.add_argument('pages', nargs='+')
+    args = arg_parser.parse_args()
+
+    pages = [read_page(path) for path in args.pages]
+    items = [item for raw in pages for stash in json.loads(raw)['stashes'] for item in stash['items']]
+    names = Counter(item['name'] for item in items if item['name'])
+    tracking_uniques = [name for name, _ in names.most_common(args.num_uniques)]
+    dispatch_index = DispatchIndex()
+    for league_name in {item['league'] for item in items}:
+        dispatch_index.subscribe(league_name, tracking_uniques, league_name)
+    parser = StashStreamParser(dispatch_index.get_item_names(), dispatch_index.is_acceptable)
+    print(f'{len(pages)} pages, {round(sum(map(len, pages)) / 2 ** 20, 2)}MiB, {len(tracking_uniques)} tracking uniques')
+
+    expected = measure('json', pages, lambda raw: json_path(raw, dispatch_index))
+    actual = measure('streaming', pages, lambda raw: streaming_path(raw, parser))
+    for (expected_id, expected_stashes), (actual_id, actual_stashes) in zip(expected, actual):
+        assert expected_id == actual_id, 'next_change_id mismatch'
+        assert [stash_id for stash_id, _ in expected_stashes] == [stash_id for stash_id, _ in actual_stashes], 'stash ids mismatch'
+        assert [item['id'] for _, items in expected_stashes for item in items] == [
+            item['id'] for _, items in actual_stashes for item in items
+        ], 'accepted items mismatch'
+
+
+if __name__ == '__main__':
+    main()
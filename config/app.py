@@ -0,0 +1,8 @@
+DATA_CACHE_TTL = 60  # seconds before a cached item's listings are refreshed
+DATA_CACHE_MAX_BYTES = 256 * 2 ** 20  # cached DataFrames above this are evicted, least recently used first
+WEBGL_POINT_THRESHOLD = 2000  # figures with more points than this are drawn with WebGL
+DENSITY_POINT_THRESHOLD = 50000  # figures with more points than this are binned on the server
+DENSITY_BINS = 60  # bins per axis in binned figures
+SHARED_DATA_DIR = 'shared'  # memory-mapped datasets shared by all workers, relative to a league's data directory
+QUERY_DEFAULT_LIMIT = 20  # cheapest listings returned by a range query unless asked for more
+QUERY_MAX_LIMIT = 500  # most listings a single range query returns
@@ -3,6 +3,13 @@ import os
 
 LEAGUE = 'ultimatum'
 LEAGUE_CAP = 'Ultimatum'
+# leagues ingested in one pass over the river as (poe.ninja overview name, stash API league name), the first is
+# the one shown by default
+LEAGUES = (
+    (LEAGUE, LEAGUE_CAP),
+    (f'{LEAGUE}hc', f'Hardcore {LEAGUE_CAP}'),
+    ('standard', 'Standard'),
+)
 
 DEFAULT_POE_HEADERS = {
     'accept': 'application/json',
@@ -10,7 +17,18 @@ DEFAULT_POE_HEADERS = {
     'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.128 Safari/537.36'
 }
 
-DATA_DIR = f'./data/{LEAGUE}'
+DATA_ROOT = './data'  # holds one data directory per league
+DATA_DIR = f'{DATA_ROOT}/{LEAGUE}'
+
+LISTINGS_STORE = os.environ.get('LISTINGS_STORE', 'firebase')  # 'firebase' or 'sqlite'
+
+INGEST_LOCK_FILE = os.path.join(DATA_DIR, 'ingest.lock')  # held by the one ingest process on this host
+INGEST_SOCKET_FILE = os.path.join(DATA_DIR, 'ingest.sock')  # ingest -> web worker notifications
+LEADER_RETRY_INTERVAL = 5  # seconds between standby attempts to take the leader lock
+NOTIFICATION_RECONNECT_INTERVAL = 5  # seconds
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'  # off turns every metric into a no-op
+METRICS_PUBLISH_INTERVAL = 15  # seconds between the ingest process sending its metrics to web workers
+METRICS_EXTERNAL_MAX_AGE = 3 * METRICS_PUBLISH_INTERVAL  # seconds before metrics another process stopped sending are dropped
 
 FIREBASE_CONFIG = {
         'apiKey': os.environ.get('apiKey'),
@@ -21,7 +39,8 @@ FIREBASE_CONFIG = {
                 "type": os.environ.get('type'),
                 "project_id": os.environ.get('project_id'),
                 "private_key_id": os.environ.get('private_key_id'),
-                "private_key": os.environ.get('private_key').replace('\\n', '\n'),
+                # unset without Firebase credentials, e.g. with LISTINGS_STORE=sqlite
+                "private_key": (os.environ.get('private_key') or '').replace('\\n', '\n'),
                 "client_email": os.environ.get('client_email'),
                 "client_id": os.environ.get('client_id'),
                 "auth_uri": os.environ.get('auth_uri'),
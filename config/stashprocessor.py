@@ -1,12 +1,38 @@
 from config.shared import DATA_DIR
+from datetime import timedelta
 import os
 
 
 NUM_TRACKING_UNIQUES = 50  # number of uniques to scan for
-DUMP_THRESHOLD = 20  # number of items in dict before updating to db
-LISTINGS_DIR = os.path.join(DATA_DIR, 'listings')
-UNIQUES_DATA_FILE = os.path.join(DATA_DIR, 'uniques.json')
-TRACKING_UNIQUES_FILE = os.path.join(DATA_DIR, 'tracking_uniques.json')
+WRITE_BATCH_SIZE = 200  # listings per multi-path database update
+WRITE_MAX_LATENCY = 10  # seconds a listing may wait before its batch is written
+WRITE_MAX_INFLIGHT_BYTES = 8 * 2 ** 20  # pending and in-flight listings before ingest is held back
+WRITE_RETRY_BACKOFF = 1  # seconds, doubled on every failed write
+WRITE_RETRY_MAX_BACKOFF = 60  # seconds
+WRITER_STOP_TIMEOUT = 10  # seconds a writer may take to finish its current write on shutdown
+FETCH_OVERRUN_TIME = 0.51  # a page fetch and parse slower than this checks the lag against the river head early
+LAG_CHECK_INTERVAL = 30  # seconds between comparing our change id with the river head on poe.ninja
+LAG_OVERRUN_CHECK_INTERVAL = 5  # seconds between lag checks while page fetches overrun
+PAGE_ADVANCE_WINDOW = 20  # recent pages averaged to turn change id lag into pages
+CATCH_UP_MIN_LAG_PAGES = 2  # pages behind the head before the next page is requested while the last one streams in
+CATCH_UP_MAX_LAG_PAGES = 600  # pages behind the head before the backlog is dropped and ingest skips to the head
+CATCH_UP_CONCURRENCY = 3  # pages streaming in at once while catching up, keep below HTTP_POOL_SIZE
+BOOTSTRAP_CONCURRENCY = 4  # reference data requests in flight at once during startup, keep at or below HTTP_POOL_SIZE
+BOOTSTRAP_RETRY_INTERVAL = 10  # seconds between attempts to load uniques data on a cold start
+STASH_INDEX_MAX_STASHES = 100000  # stashes with tracked listings remembered for detecting delistings
+PAGE_QUEUE_SIZE = 4  # fetched pages waiting to be processed
+LISTING_QUEUE_SIZE = 16  # processed pages waiting to be persisted
+STATS_LOG_INTERVAL = 30  # seconds between pipeline stats reports
+CLEANING_POOL_WORKERS = 0  # worker processes for modifier matching, 0 cleans on the processing thread
+STREAMING_STASH_PARSER = True  # parse stash pages as they stream in, skipping stashes without tracked items
+LISTINGS_DB_FILE = os.path.join('listings', 'listings.sqlite3')  # relative to a league's data directory
+UNIQUES_DATA_FILE = os.path.join(DATA_DIR, 'uniques.snapshot')
+TRACKING_UNIQUES_FILE = 'tracking_uniques.snapshot'  # relative to a league's data directory
+RATES_FILE = 'rates.snapshot'  # relative to a league's data directory
+UNIQUES_DATA_MAX_AGE = timedelta(days=1)  # snapshot age before it is revalidated in the background
+TRACKING_UNIQUES_MAX_AGE = timedelta(days=1)  # snapshot age before it is revalidated in the background
+CHECKPOINT_FILE = os.path.join(DATA_DIR, 'checkpoint.json')  # change id and unwritten listings to resume from
+CHECKPOINT_INTERVAL = 10  # seconds between checkpoints
 
 POE_NINJA_WTV = '421b35051547a888e1390ffbd9aa7428'
 POE_NINJA_BUILD_OVERVIEW_URL = f'https://poe.ninja/api/data/{POE_NINJA_WTV}/getbuildoverview'
@@ -42,6 +68,15 @@ UNIQUES_BLACKLIST = (
 
 PUBLIC_STASH_URL = 'http://www.pathofexile.com/api/public-stash-tabs'
 
+HTTP_TIMEOUT = 30  # seconds
+HTTP_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.5  # seconds, doubled on every retry
+HTTP_POOL_SIZE = 4  # keep-alive connections per host
+# (max hits, period in seconds) used for a host until its rate limit headers have been seen
+DEFAULT_RATE_LIMITS = {
+    'www.pathofexile.com': [(1, 0.51)],
+}
+
 POE_NINJA_CURRENCY_OVERVIEW_URL = 'https://poe.ninja/api/data/CurrencyOverview'
 
 CURRENCY_KEYS = (
@@ -168,6 +203,31 @@ CURRENCY_NAMES = (
     'Veiled Chaos Orb',
 )
 
+CURRENCY_ALIASES = {  # short names players use in price notes
+    'c': 'chaos',
+    'chaos-orb': 'chaos',
+    'ex': 'exalted',
+    'exa': 'exalted',
+    'exalt': 'exalted',
+    'div': 'divine',
+    'alchemy': 'alch',
+    'fuse': 'fusing',
+    'fusings': 'fusing',
+    'chrom': 'chrome',
+    'chromatic': 'chrome',
+    'jew': 'jewellers',
+    'jewels': 'jewellers',
+    'alts': 'alt',
+    'gemcutters': 'gcp',
+    'regrets': 'regret',
+    'scouring': 'scour',
+    'mir': 'mirror',
+}
+
+PRICE_NOTE_CACHE_SIZE = 4096  # distinct price notes kept parsed
+RATE_HISTORY_SIZE = 90  # exchange rate snapshots kept for converting listings at the rate they were seen
+RATE_REFRESH_RETRY_INTERVAL = timedelta(minutes=5)
+
 class _TwoWayDict:
     def __init__(self, iterable):
         self._dict = {}
@@ -0,0 +1,200 @@
+from collections import OrderedDict
+from config.app import DATA_CACHE_MAX_BYTES, DATA_CACHE_TTL, SHARED_DATA_DIR
+from config.shared import DATA_ROOT, LEAGUE
+from dashboard.queryindex import QueryIndex
+from dashboard.sharedstore import SharedDatasetStore
+from storage.listingsbuffer import ListingsBuffer
+from threading import Lock
+import os
+import pandas as pd
+import time
+
+
+class CacheEntry:
+    def __init__(self, buffer, cursor, refreshed=None):
+        self.buffer = buffer  # None for entries mapped from the shared store
+        self.cursor = cursor
+        self.refreshed = refreshed if refreshed is not None else time.time()
+        self.df = None
+        self.query_index = None
+        self.counted_index_nbytes = 0
+        self.nbytes = 0
+
+    @property
+    def version(self):
+        return str(self.cursor)
+
+    def build_df(self):
+        columns, _ = self.buffer.to_columns()
+        self.df = pd.DataFrame(columns)
+        # the buffer holds roughly as much again as the frame
+        self.nbytes = 2 * int(self.df.memory_usage(deep=True).sum())
+        self.query_index = None  # indexes the previous frame
+        self.counted_index_nbytes = 0
+
+    def use_shared(self, df):
+        '''
+        Serves the published copy of the built frame instead, whose pages are shared with the other workers.
+        Only the buffer, which incremental refreshes add to, stays private and counts towards the cache size.
+        '''
+        self.df = df
+        self.nbytes //= 2
+
+
+class DataFrameCache:
+    '''
+    Per-item cache of one league's listing DataFrames. Entries older than DATA_CACHE_TTL are refreshed incrementally by
+    asking the store only for listings written since the last load, and the least recently used entries
+    are evicted once the cached frames exceed DATA_CACHE_MAX_BYTES. Every built frame is published to the
+    SharedDatasetStore, and a fresh enough version published by another worker is mapped instead of loaded.
+    While `notifications` is connected to the ingest process, entries are only refreshed after the ingest
+    process reports new listings for them instead of every DATA_CACHE_TTL.
+    '''
+    def __init__(self, listings_store, notifications=None, league=LEAGUE):
+        self.name = f'DataFrameCache {league}'
+        self.listings_store = listings_store
+        self.shared_store = SharedDatasetStore(os.path.join(DATA_ROOT, league, SHARED_DATA_DIR))
+        self.notifications = notifications
+        self.stale_since = {}  # item name -> time the ingest process last reported new listings
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.lock = Lock()
+        self.item_locks = {}  # item name -> lock serializing that item's loads
+
+    def log(self, msg):
+        print(f'[{self.name}]: {msg}')
+
+    def load(self, item_name):
+        listings, cursor = self.listings_store.read_listings_since(item_name)
+        return CacheEntry(ListingsBuffer.from_listings(listings), cursor)
+
+    def refresh(self, entry, item_name):
+        listings, entry.cursor = self.listings_store.read_listings_since(item_name, entry.cursor)
+        entry.refreshed = time.time()
+        for item_id, listing in listings.items():
+            entry.buffer.add_listing(item_id, listing)
+        return len(listings)
+
+    def map_shared(self, item_name, version, age):
+        df = self.shared_store.open(item_name, version)
+        if df is None:
+            return None
+        entry = CacheEntry(None, version, time.time() - age)
+        entry.df = df
+        return entry
+
+    def mark_stale(self, item_names):
+        now = time.time()
+        for item_name in item_names:
+            self.stale_since[item_name] = now
+
+    def is_fresh(self, item_name, refreshed):
+        if refreshed < self.stale_since.get(item_name, 0):
+            return False
+        if self.notifications is not None and self.notifications.connected:
+            return True
+        return time.time() - refreshed <= DATA_CACHE_TTL
+
+    def get_entry(self, item_name, entry):
+        if entry is not None and self.is_fresh(item_name, entry.refreshed):
+            return entry
+        shared = self.shared_store.get_latest(item_name)
+        if (
+            shared is not None and
+            self.is_fresh(item_name, time.time() - shared[1]) and
+            (entry is None or shared[0] != entry.version)
+        ):
+            if (mapped := self.map_shared(item_name, *shared)) is not None:
+                return mapped
+        if entry is None or entry.buffer is None:
+            entry = self.load(item_name)
+        elif not self.refresh(entry, item_name):
+            return entry
+        entry.build_df()
+        self.shared_store.publish(item_name, entry.version, entry.df)
+        if (df := self.shared_store.open(item_name, entry.version)) is not None:
+            entry.use_shared(df)
+        return entry
+
+    def get(self, item_name):
+        '''
+        Returns (DataFrame, version) of an item's listings.
+        '''
+        entry = self.get_current(item_name)
+        return entry.df, entry.version
+
+    def get_query_entry(self, item_name, version=None):
+        with self.lock:
+            entry = self.entries.get(item_name)
+        if entry is None or version is None or entry.version != version:
+            entry = self.get_current(item_name)
+        if version is not None and entry.version != version:
+            if (df := self.shared_store.open(item_name, version)) is None:
+                return None
+            # a version the cache has moved past is indexed for this query only
+            entry = CacheEntry(None, version)
+            entry.df = df
+        if entry.query_index is None:
+            entry.query_index = QueryIndex(entry.df)
+        return entry
+
+    def query(self, item_name, conditions, limit, version=None):
+        '''
+        Runs QueryIndex.query over the current version of an item's listings, or the given version. Returns
+        (number of matches, matching listings, version), or None if that version is no longer available. The
+        column indexes a query builds are kept with the cached frame and count towards DATA_CACHE_MAX_BYTES.
+        '''
+        if (entry := self.get_query_entry(item_name, version)) is None:
+            return None
+        num_matches, rows = entry.query_index.query(conditions, limit)
+        with self.lock:
+            if self.entries.get(item_name) is entry:
+                added = entry.query_index.nbytes - entry.counted_index_nbytes
+                entry.counted_index_nbytes += added
+                entry.nbytes += added
+                self.nbytes += added
+                self.evict()
+        return num_matches, entry.query_index.get_rows(rows), entry.version
+
+    def get_item_lock(self, item_name):
+        with self.lock:
+            return self.item_locks.setdefault(item_name, Lock())
+
+    def get_current(self, item_name):
+        # concurrent gets of one item wait for a single load instead of each loading and counting it
+        with self.get_item_lock(item_name):
+            with self.lock:
+                entry = self.entries.pop(item_name, None)
+                if entry is not None:
+                    self.nbytes -= entry.nbytes
+            entry = self.get_entry(item_name, entry)
+            with self.lock:
+                self.entries[item_name] = entry
+                self.nbytes += entry.nbytes
+                self.evict()
+        return entry
+
+    def get_version(self, item_name, version):
+        '''
+        Returns the DataFrame of a specific version, as held by a session's dataset handle, or None if that
+        version is no longer available and the session has to load the item again.
+        '''
+        with self.lock:
+            entry = self.entries.get(item_name)
+        if entry is not None and entry.version == version:
+            return entry.df
+        return self.shared_store.open(item_name, version)
+
+    def evict(self):
+        while self.nbytes > DATA_CACHE_MAX_BYTES and len(self.entries) > 1:
+            item_name, entry = self.entries.popitem(last=False)
+            self.nbytes -= entry.nbytes
+            self.log(f'Evicted {item_name}')
+
+    def invalidate(self, item_name=None):
+        with self.lock:
+            if item_name is None:
+                self.entries.clear()
+                self.nbytes = 0
+            elif (entry := self.entries.pop(item_name, None)) is not None:
+                self.nbytes -= entry.nbytes
@@ -0,0 +1,98 @@
+from threading import Lock
+import numpy as np
+
+
+class ColumnIndex:
+    '''
+    One column's row positions sorted by value, so the rows within a value range are a contiguous slice
+    found with two binary searches. Missing values sort last and never fall inside a range.
+    '''
+    def __init__(self, values):
+        self.order = np.argsort(values, kind='stable')
+        self.sorted_values = values[self.order]
+        self.num_present = len(values) - int(np.isnan(values).sum())
+
+    @property
+    def nbytes(self):
+        return self.order.nbytes + self.sorted_values.nbytes
+
+    def get_bounds(self, low, high):
+        start = 0 if low is None else int(np.searchsorted(self.sorted_values, low, side='left'))
+        end = self.num_present if high is None else int(np.searchsorted(self.sorted_values, high, side='right'))
+        return start, max(start, min(end, self.num_present))
+
+
+class QueryIndex:
+    '''
+    Sorted per-column indexes over one version of an item's DataFrame, answering conjunctive range queries
+    such as "mod A >= 80 and price < 50". Every condition's matching rows are a slice of its column index, so
+    only the most selective condition's rows are read and the other conditions are checked on those alone.
+    A query costs the size of its most selective range rather than a scan of the item's listings. Column
+    indexes are built on the first query that uses them.
+    '''
+    def __init__(self, df):
+        self.columns = list(df.columns)
+        self.values = {column: df[column].to_numpy(dtype=np.float64) for column in self.columns}
+        self.indexes = {}
+        self.lock = Lock()
+
+    @property
+    def nbytes(self):
+        return sum(index.nbytes for index in list(self.indexes.values()))
+
+    def get_index(self, column):
+        index = self.indexes.get(column)
+        if index is None:
+            with self.lock:
+                if (index := self.indexes.get(column)) is None:
+                    index = self.indexes[column] = ColumnIndex(self.values[column])
+        return index
+
+    def get_matching_rows(self, conditions):
+        '''
+        Returns the row positions matching every {column: (low, high)} condition, bounds inclusive and None
+        for an open bound, ordered by the column of the most selective condition, and that column. Unknown
+        columns raise a KeyError.
+        '''
+        for column in conditions:
+            if column not in self.values:
+                raise KeyError(column)
+        bounds = {column: self.get_index(column).get_bounds(*bounds) for column, bounds in conditions.items()}
+        column = min(bounds, key=lambda column: bounds[column][1] - bounds[column][0])
+        rows = self.indexes[column].order[slice(*bounds[column])]
+        for other, (low, high) in conditions.items():
+            if other == column or not len(rows):
+                continue
+            values = self.values[other][rows]
+            mask = ~np.isnan(values)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+            rows = rows[mask]
+        return rows, column
+
+    def query(self, conditions, limit, order_by='price'):
+        '''
+        Returns the number of rows matching all conditions and the positions of the `limit` cheapest of
+        them, cheapest first.
+        '''
+        rows, column = self.get_matching_rows(conditions or {order_by: (None, None)})
+        if column == order_by:
+            # read off the price index, the rows are cheapest first already
+            return len(rows), rows[:limit]
+        prices = self.values[order_by][rows]
+        if len(rows) > limit:
+            cheapest = np.argpartition(prices, limit)[:limit]
+            return len(rows), rows[cheapest][np.argsort(prices[cheapest], kind='stable')]
+        return len(rows), rows[np.argsort(prices, kind='stable')]
+
+    def get_rows(self, rows):
+        '''
+        Returns the given rows as {column: value} dicts, with None for missing values.
+        '''
+        return [{column: get_value(self.values[column][row]) for column in self.columns} for row in rows]
+
+
+def get_value(value):
+    return None if np.isnan(value) else float(value)
@@ -0,0 +1,149 @@
+from config.app import DENSITY_BINS, DENSITY_POINT_THRESHOLD, WEBGL_POINT_THRESHOLD
+import numpy as np
+import plotly.express as px
+
+
+RENDER_SVG = 'svg'
+RENDER_WEBGL = 'webgl'
+RENDER_DENSITY = 'density'
+
+MARKER = { 'color': 'rgba(255, 0, 0, 0.3)', 'size': 10 }
+UNSELECTED = {
+    'marker': {
+        'color': 'rgba(0, 116, 217, 0.2)',
+        'size': 5,
+    },
+}
+
+
+def get_render_mode(num_points):
+    if num_points > DENSITY_POINT_THRESHOLD:
+        return RENDER_DENSITY
+    if num_points > WEBGL_POINT_THRESHOLD:
+        return RENDER_WEBGL
+    return RENDER_SVG
+
+
+class Grid:
+    '''
+    Regular 2D binning. Bins are numbered ix * ny + iy and each binned point carries its grid in its
+    customdata, so a selection can be mapped back to rows without knowing how the figure was rendered.
+    '''
+    def __init__(self, x0, y0, dx, dy, nx, ny):
+        self.x0, self.y0, self.dx, self.dy, self.nx, self.ny = x0, y0, dx, dy, nx, ny
+
+    @classmethod
+    def from_values(cls, x, y, num_bins=DENSITY_BINS):
+        x0, x1 = np.nanmin(x), np.nanmax(x)
+        y0, y1 = np.nanmin(y), np.nanmax(y)
+        # pad so the maximum falls inside the last bin
+        dx = (x1 - x0) / num_bins * 1.0001 or 1.0
+        dy = (y1 - y0) / num_bins * 1.0001 or 1.0
+        return cls(float(x0), float(y0), float(dx), float(dy), num_bins, num_bins)
+
+    @classmethod
+    def from_customdata(cls, customdata):
+        _, x0, y0, dx, dy, nx, ny = customdata
+        return cls(x0, y0, dx, dy, int(nx), int(ny))
+
+    def key(self):
+        return (self.x0, self.y0, self.dx, self.dy, self.nx, self.ny)
+
+    def bin_ids(self, x, y):
+        '''
+        Bin id of every point, -1 for points outside the grid or with a missing value.
+        '''
+        with np.errstate(invalid='ignore'):
+            ix = np.floor((np.asarray(x, dtype=float) - self.x0) / self.dx)
+            iy = np.floor((np.asarray(y, dtype=float) - self.y0) / self.dy)
+            inside = (ix >= 0) & (ix < self.nx) & (iy >= 0) & (iy < self.ny)
+        ids = np.full(len(ix), -1, dtype=np.int64)
+        ids[inside] = ix[inside].astype(np.int64) * self.ny + iy[inside].astype(np.int64)
+        return ids
+
+
+def create_point_figure(df, x_col, y_col, rows, selected_rows, mode):
+    subset = df.iloc[rows] if rows is not None else df
+    fig = px.scatter(subset, x=subset[x_col], y=subset[y_col], render_mode='webgl' if mode == RENDER_WEBGL else 'svg')
+    fig.update_traces(
+        selectedpoints=get_point_selection(subset.index.to_numpy(), selected_rows),
+        customdata=subset.index,
+        mode='markers',
+        marker=MARKER,
+        unselected=UNSELECTED,
+    )
+    fig.update_layout(dragmode='select')
+    return fig
+
+
+def bin_points(df, x_col, y_col, rows):
+    '''
+    Returns the grid and the ids of the non-empty bins a density figure of `rows`, or all rows, is drawn with,
+    and the number of points in each of those bins.
+    '''
+    x = df[x_col].to_numpy(dtype=float)
+    y = df[y_col].to_numpy(dtype=float)
+    if rows is not None:
+        x, y = x[rows], y[rows]
+    grid = Grid.from_values(x, y)
+    ids = grid.bin_ids(x, y)
+    counts = np.bincount(ids[ids >= 0], minlength=grid.nx * grid.ny)
+    bin_ids = np.flatnonzero(counts)
+    return grid, bin_ids, counts[bin_ids]
+
+
+def create_density_figure(df, x_col, y_col, rows, selected_rows):
+    grid, bin_ids, counts = bin_points(df, x_col, y_col, rows)
+    fig = px.scatter(
+        x=grid.x0 + (bin_ids // grid.ny + 0.5) * grid.dx,
+        y=grid.y0 + (bin_ids % grid.ny + 0.5) * grid.dy,
+        color=np.log10(counts),
+        labels={'x': x_col, 'y': y_col, 'color': 'log10(listings)'},
+        render_mode='webgl',
+    )
+    fig.update_traces(
+        selectedpoints=get_density_selection(grid, bin_ids, df, x_col, y_col, selected_rows),
+        customdata=[[int(bin_id), *grid.key()] for bin_id in bin_ids],
+        mode='markers',
+        marker={'size': 8, 'symbol': 'square'},
+        unselected={'marker': {'opacity': 0.2}},
+    )
+    fig.update_layout(dragmode='select')
+    return fig
+
+
+def create_figure(df, x_col, y_col, selected_rows, rows=None):
+    '''
+    Draws `y_col` against `x_col` for all rows, or just `rows` when drilling into a selection. Large frames
+    are drawn with WebGL and very large ones are binned into a density scatter whose bins can be brushed.
+    '''
+    mode = get_render_mode(len(rows) if rows is not None else len(df))
+    if mode == RENDER_DENSITY:
+        return create_density_figure(df, x_col, y_col, rows, selected_rows)
+    return create_point_figure(df, x_col, y_col, rows, selected_rows, mode)
+
+
+def get_point_selection(point_rows, selected_rows):
+    if selected_rows is None:
+        return None
+    if len(point_rows) and point_rows[-1] == len(point_rows) - 1:
+        return selected_rows  # the figure shows every row, so trace indices are row positions
+    return np.flatnonzero(np.isin(point_rows, selected_rows))
+
+
+def get_density_selection(grid, bin_ids, df, x_col, y_col, selected_rows):
+    if selected_rows is None:
+        return None
+    selected_ids = grid.bin_ids(df[x_col].to_numpy(dtype=float)[selected_rows], df[y_col].to_numpy(dtype=float)[selected_rows])
+    return np.flatnonzero(np.isin(bin_ids, selected_ids))
+
+
+def get_figure_selection(df, x_col, y_col, selected_rows, rows=None):
+    '''
+    The selectedpoints of the figure create_figure draws for the same arguments. Figures are drawn the same
+    way from the same frame every time, so this works out the trace indices without the rendered figure.
+    '''
+    if get_render_mode(len(rows) if rows is not None else len(df)) == RENDER_DENSITY:
+        grid, bin_ids, _ = bin_points(df, x_col, y_col, rows)
+        return get_density_selection(grid, bin_ids, df, x_col, y_col, selected_rows)
+    return get_point_selection(rows if rows is not None else np.arange(len(df)), selected_rows)
@@ -0,0 +1,66 @@
+from dashboard.rendering import Grid
+import numpy as np
+import zlib
+
+
+class SelectionEngine:
+    '''
+    Linked brushing over one DataFrame. Each figure's brush is kept as a boolean mask over the frame's rows
+    and the selection shown everywhere is the AND of all masks. Figures without a brush select everything.
+    '''
+    def __init__(self, df):
+        self.df = df
+        self.num_rows = len(df)
+        self.masks = {}  # figure index -> boolean mask
+
+    def get_point_rows(self, selected_data, x_col, y_col):
+        return self.get_customdata_rows(get_brush(selected_data), x_col, y_col)
+
+    def get_customdata_rows(self, points, x_col, y_col):
+        rows = np.fromiter(
+            (p[0] if isinstance(p, list) else p for p in points if not isinstance(p, list) or len(p) == 1),
+            dtype=np.int64
+        )
+        # brushed bins of a density figure: map every grid's bins back to the rows inside them
+        grids = {}
+        for p in points:
+            if isinstance(p, list) and len(p) > 1:
+                grid = Grid.from_customdata(p)
+                grids.setdefault(grid.key(), (grid, []))[1].append(p[0])
+        for grid, bin_ids in grids.values():
+            ids = grid.bin_ids(self.df[x_col].to_numpy(dtype=float), self.df[y_col].to_numpy(dtype=float))
+            rows = np.concatenate([rows, np.flatnonzero(np.isin(ids, bin_ids))])
+        return rows[(rows >= 0) & (rows < self.num_rows)]
+
+    def set_selection(self, figure_index, selected_data, x_col, y_col):
+        if not selected_data or not selected_data.get('points'):
+            self.masks.pop(figure_index, None)
+            return
+        mask = np.zeros(self.num_rows, dtype=bool)
+        mask[self.get_point_rows(selected_data, x_col, y_col)] = True
+        self.masks[figure_index] = mask
+
+    def get_selected_rows(self):
+        '''
+        Returns the selected row positions, or None if nothing is brushed.
+        '''
+        if not self.masks:
+            return None
+        return np.flatnonzero(np.logical_and.reduce(list(self.masks.values())))
+
+
+def get_brush(selected_data):
+    '''
+    The customdata of a figure's brushed points, which is all that is needed to find the brushed rows again.
+    '''
+    return [p['customdata'] for p in selected_data['points'] if 'customdata' in p]
+
+
+def get_selection_key(selectedpoints):
+    '''
+    A short fingerprint of a figure's selectedpoints, to tell whether they changed without keeping them.
+    '''
+    if selectedpoints is None:
+        return None
+    selectedpoints = np.asarray(selectedpoints, dtype=np.int64)
+    return f'{len(selectedpoints)}:{zlib.crc32(selectedpoints.tobytes())}'
@@ -0,0 +1,83 @@
+from config.app import SHARED_DATA_DIR
+from config.shared import DATA_DIR
+from urllib.parse import quote
+import json
+import numpy as np
+import os
+import pandas as pd
+import shutil
+import time
+
+
+class SharedDatasetStore:
+    '''
+    Cross-process store of item DataFrames as memory-mapped .npy files, one directory per item and version.
+    Every gunicorn worker maps the same files read-only, so the pages are shared between workers and a load
+    in one worker is reused by all the others. Versions are published atomically by renaming a finished
+    directory into place and then pointing the item's LATEST file at it.
+    '''
+    KEEP_VERSIONS = 2  # older versions may still be open in other workers
+
+    def __init__(self, root=os.path.join(DATA_DIR, SHARED_DATA_DIR)):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def get_item_dir(self, item_name):
+        return os.path.join(self.root, quote(item_name, safe=''))
+
+    def get_version_dir(self, item_name, version):
+        return os.path.join(self.get_item_dir(item_name), str(version))
+
+    def publish(self, item_name, version, df):
+        version_dir = self.get_version_dir(item_name, version)
+        if os.path.isdir(version_dir):
+            return
+        tmp_dir = f'{version_dir}.{os.getpid()}.tmp'
+        os.makedirs(tmp_dir, exist_ok=True)
+        np.save(os.path.join(tmp_dir, 'data.npy'), df.to_numpy(dtype=np.float64))
+        with open(os.path.join(tmp_dir, 'columns.json'), 'w') as f:
+            json.dump(list(df.columns), f)
+        try:
+            os.rename(tmp_dir, version_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)  # another worker published the same version first
+            return
+        latest_tmp = os.path.join(self.get_item_dir(item_name), f'LATEST.{os.getpid()}.tmp')
+        with open(latest_tmp, 'w') as f:
+            f.write(str(version))
+        os.replace(latest_tmp, os.path.join(self.get_item_dir(item_name), 'LATEST'))
+        self.remove_old_versions(item_name)
+
+    def remove_old_versions(self, item_name):
+        item_dir = self.get_item_dir(item_name)
+        versions = sorted(
+            (entry for entry in os.scandir(item_dir) if entry.is_dir() and not entry.name.endswith('.tmp')),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in versions[:-self.KEEP_VERSIONS]:
+            # workers that still map these files keep their pages until they unmap them
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    def get_latest(self, item_name):
+        '''
+        Returns (version, seconds since it was published) or None if the item was never published.
+        '''
+        path = os.path.join(self.get_item_dir(item_name), 'LATEST')
+        try:
+            with open(path) as f:
+                return f.read().strip(), time.time() - os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def open(self, item_name, version):
+        '''
+        Maps a published version as a read-only DataFrame without copying it, or returns None if it is gone.
+        '''
+        version_dir = self.get_version_dir(item_name, version)
+        try:
+            values = np.load(os.path.join(version_dir, 'data.npy'), mmap_mode='r')
+            with open(os.path.join(version_dir, 'columns.json')) as f:
+                columns = json.load(f)
+        except OSError:
+            return None
+        return pd.DataFrame(values, columns=columns, copy=False)
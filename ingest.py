@@ -0,0 +1,56 @@
+from ipc.leaderlock import LeaderLock
+from ipc.notifications import NotificationServer
+from config.shared import LEADER_RETRY_INTERVAL, METRICS_ENABLED, METRICS_PUBLISH_INTERVAL
+from config.stashprocessor import WRITER_STOP_TIMEOUT
+from metrics.registry import registry
+from threads.stashprocessor.stashprocessor import StashProcessor
+from threading import Thread
+import signal
+import sys
+import time
+
+
+def wait_for_leadership(lock):
+    if not lock.acquire():
+        print('[Ingest]: Another ingest process is running, standing by')
+        while not lock.acquire():
+            time.sleep(LEADER_RETRY_INTERVAL)
+    print('[Ingest]: Acquired leader lock')
+
+
+def publish_metrics(notification_server):
+    '''
+    Web workers serve the metrics endpoint, so the ingest metrics are pushed to them over the notification
+    socket.
+    '''
+    while True:
+        time.sleep(METRICS_PUBLISH_INTERVAL)
+        notification_server.publish({'metrics': registry.render()})
+
+
+def main():
+    lock = LeaderLock()
+    wait_for_leadership(lock)
+    notification_server = NotificationServer()
+    notification_server.start()
+    stash_processor = StashProcessor()
+    for subscriber in stash_processor.subscribers:
+        subscriber.listings_writer.on_write = (
+            lambda item_names, league=subscriber.league: notification_server.publish({'league': league, 'items': item_names})
+        )
+
+    def shutdown(signum, frame):
+        # the checkpoint holds whatever the writers have not written, they only have to finish their current write
+        for subscriber in stash_processor.subscribers:
+            subscriber.listings_writer.stop(WRITER_STOP_TIMEOUT)
+        stash_processor.save_checkpoint()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    if METRICS_ENABLED:
+        Thread(target=publish_metrics, args=(notification_server,), name='MetricsPublisher', daemon=True).start()
+    stash_processor.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+from config.shared import INGEST_LOCK_FILE
+import fcntl
+import os
+
+
+class LeaderLock:
+    '''
+    Host-wide leader election through an exclusive flock on INGEST_LOCK_FILE. The kernel releases the lock
+    when its holder exits for any reason, so a standby can take over without any stale lock cleanup. Only
+    processes sharing a filesystem see the same lock: on Heroku the web and ingest process types run on
+    separate dynos, so neither this lock nor the notification socket next to it connects them. There, web
+    workers refresh every DATA_CACHE_TTL and only serve their own metrics.
+    '''
+    def __init__(self, path=INGEST_LOCK_FILE):
+        self.path = path
+        self.file = None
+
+    def acquire(self):
+        '''
+        Tries to become the leader without blocking. Returns True if this process now holds the lock.
+        '''
+        if self.file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        file = open(self.path, 'a+')
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        file.seek(0)
+        file.truncate()
+        file.write(str(os.getpid()))
+        file.flush()
+        self.file = file
+        return True
+
+    def release(self):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
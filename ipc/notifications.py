@@ -0,0 +1,85 @@
+from config.shared import INGEST_SOCKET_FILE, NOTIFICATION_RECONNECT_INTERVAL
+from threading import Lock, Thread
+import json
+import os
+import socket
+import time
+
+
+class NotificationServer(Thread):
+    '''
+    Broadcasts fresh-data notifications from the ingest process to web workers as JSON lines over a Unix
+    socket. Slow or dead subscribers are dropped rather than allowed to hold up ingest.
+    '''
+    SEND_TIMEOUT = 0.1  # seconds
+
+    def __init__(self, path=INGEST_SOCKET_FILE):
+        super().__init__()
+        self.name = 'NotificationServer'
+        self.path = path
+        self.clients = []
+        self.lock = Lock()
+        self.setDaemon(True)
+
+    def log(self, msg):
+        print(f'[{self.name}]: {msg}')
+
+    def run(self):
+        # only the leader runs a server, so an existing socket file is left over from a previous leader
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen()
+        while True:
+            client, _ = server.accept()
+            client.settimeout(self.SEND_TIMEOUT)
+            with self.lock:
+                self.clients.append(client)
+            self.log(f'{len(self.clients)} subscribers')
+
+    def publish(self, message):
+        line = (json.dumps(message) + '\n').encode()
+        with self.lock:
+            for client in list(self.clients):
+                try:
+                    client.sendall(line)
+                except OSError:
+                    client.close()
+                    self.clients.remove(client)
+
+
+class NotificationSubscriber(Thread):
+    '''
+    Receives the ingest process' notifications in a web worker and hands each message to `callback`.
+    Reconnects whenever the ingest process restarts or a new leader takes over.
+    '''
+    def __init__(self, callback, path=INGEST_SOCKET_FILE):
+        super().__init__()
+        self.name = 'NotificationSubscriber'
+        self.callback = callback
+        self.path = path
+        self.connected = False
+        self.setDaemon(True)
+
+    def log(self, msg):
+        print(f'[{self.name}]: {msg}')
+
+    def listen(self, sock):
+        for line in sock.makefile('r'):
+            try:
+                self.callback(json.loads(line))
+            except Exception as e:
+                self.log(f'Error handling notification: {e}')
+
+    def run(self):
+        while True:
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.connect(self.path)
+                    self.connected = True
+                    self.listen(sock)
+            except OSError:
+                pass
+            self.connected = False
+            time.sleep(NOTIFICATION_RECONNECT_INTERVAL)
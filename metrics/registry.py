@@ -0,0 +1,217 @@
+from bisect import bisect_left
+from config.shared import METRICS_ENABLED, METRICS_EXTERNAL_MAX_AGE
+from threading import Lock
+import time
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_labels(label_names, label_values):
+    if not label_names:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(label_names, label_values)) + '}'
+
+
+def get_families(text):
+    '''
+    Names of the metric families in rendered metrics.
+    '''
+    return {line.split()[2] for line in text.splitlines() if line.startswith('# TYPE ')}
+
+
+def format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Metric:
+    '''
+    A metric and its children, one per combination of label values. Metrics without labels are their own
+    only child.
+    '''
+    TYPE = None
+
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.lock = Lock()
+        self.children = {}
+        if not label_names:
+            self.children[()] = self
+
+    def labels(self, *label_values):
+        child = self.children.get(label_values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(label_values, self.create_child())
+        return child
+
+    def create_child(self):
+        return type(self)(self.name, self.help)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.TYPE}']
+        for label_values, child in sorted(self.children.items()):
+            lines += child.render_samples(self.label_names, label_values)
+        return lines
+
+
+class Counter(Metric):
+    TYPE = 'counter'
+
+    def __init__(self, name, help, label_names=()):
+        self.value = 0
+        super().__init__(name, help, label_names)
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def render_samples(self, label_names, label_values):
+        return [f'{self.name}{format_labels(label_names, label_values)} {format_value(self.value)}']
+
+
+class Gauge(Metric):
+    TYPE = 'gauge'
+
+    def __init__(self, name, help, label_names=()):
+        self.value = 0
+        super().__init__(name, help, label_names)
+
+    def set(self, value):
+        self.value = value
+
+    def render_samples(self, label_names, label_values):
+        return [f'{self.name}{format_labels(label_names, label_values)} {format_value(self.value)}']
+
+
+class Histogram(Metric):
+    TYPE = 'histogram'
+
+    def __init__(self, name, help, label_names=(), buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last count is the +Inf bucket
+        self.sum = 0.0
+        super().__init__(name, help, label_names)
+
+    def create_child(self):
+        return Histogram(self.name, self.help, buckets=self.buckets)
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        return Timer(self)
+
+    def render_samples(self, label_names, label_values):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        labels = format_labels(label_names, label_values)
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{format_labels(label_names + ("le",), label_values + (bound,))} {cumulative}')
+        lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class NullMetric:
+    '''
+    Stands in for every metric while metrics are disabled, so instrumented code costs one no-op call.
+    '''
+    def labels(self, *label_values):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return NULL_TIMER
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_METRIC = NullMetric()
+NULL_TIMER = NullTimer()
+
+
+class Registry:
+    '''
+    Process-wide metrics, rendered in the Prometheus text format. Metrics of other processes can be added as
+    already rendered text with `set_external`. Their families replace local metrics of the same name, which
+    every process registers by importing the same modules, and they are dropped once their source has not
+    sent them for METRICS_EXTERNAL_MAX_AGE seconds. With METRICS_ENABLED off every metric is a NullMetric.
+    '''
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.metrics = {}
+        self.external = {}  # source -> (rendered metrics, their family names, time they were set)
+        self.lock = Lock()
+
+    def register(self, metric_type, name, help, label_names=(), **kwargs):
+        if not self.enabled:
+            return NULL_METRIC
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = metric_type(name, help, label_names, **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name, help, label_names=()):
+        return self.register(Counter, name, help, label_names)
+
+    def gauge(self, name, help, label_names=()):
+        return self.register(Gauge, name, help, label_names)
+
+    def histogram(self, name, help, label_names=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram, name, help, label_names, buckets=buckets)
+
+    def set_external(self, source, text):
+        families = get_families(text)
+        with self.lock:
+            self.external[source] = (text, families, time.time())
+
+    def render(self):
+        now = time.time()
+        with self.lock:
+            for source, (_, _, updated) in list(self.external.items()):
+                if now - updated > METRICS_EXTERNAL_MAX_AGE:
+                    del self.external[source]
+            external = list(self.external.values())
+            external_families = set().union(*(families for _, families, _ in external))
+            metrics = [metric for name, metric in self.metrics.items() if name not in external_families]
+        lines = [line for metric in metrics for line in metric.render()]
+        text = '\n'.join(lines) + '\n' if lines else ''
+        return text + ''.join(text for text, _, _ in external)
+
+
+registry = Registry()
@@ -0,0 +1,59 @@
+from config.shared import FIREBASE_CONFIG, LEAGUE
+from pyrebase.pyrebase import Firebase
+from storage.listingsstore import ListingsStore
+
+
+# replaced by the database's own clock when the write is committed
+WRITTEN_TIMESTAMP = {'.sv': 'timestamp'}
+
+
+class FirebaseListingsStore(ListingsStore):
+    def __init__(self, root=f'StashProcessor/leagues/{LEAGUE}'):
+        self.root = root
+        self.firebase = Firebase(FIREBASE_CONFIG)
+
+    def listings_ref(self):
+        # pyrebase keeps the child path on the database object, so every call starts from a fresh one
+        return self.firebase.database().child(self.root).child('listings')
+
+    def write_listings(self, listings):
+        self.firebase.database().child(self.root).update({
+            f'listings/{item_name}/{item_id}': {**listing, 'written': WRITTEN_TIMESTAMP}
+        for item_name, item_listings in listings.items() for item_id, listing in item_listings.items()})
+
+    def write_delistings(self, delistings):
+        # Only ids the writer has already written are delisted, so this never creates stub listings.
+        self.firebase.database().child(self.root).update({
+            f'listings/{item_name}/{item_id}/{key}': value
+        for item_name, item_delistings in delistings.items() for item_id, delisted in item_delistings.items()
+            for key, value in (('delisted', round(delisted)), ('written', WRITTEN_TIMESTAMP))})
+
+    def read_listings(self, item_name):
+        return self.listings_ref().child(item_name).get().val() or {}
+
+    def read_listings_since(self, item_name, cursor=None):
+        # Item ids are not ordered in time, so listings are range queried on the server time they were last
+        # written instead. Their 'seen' time is set when they are cleaned, up to WRITE_MAX_LATENCY before they
+        # reach the database, and a restored checkpoint writes old 'seen' times again, so it cannot serve as
+        # the cursor. This needs '.indexOn': 'written' on the listings in the database rules. start_at is
+        # inclusive, so listings written at exactly `cursor` come back again and simply replace themselves.
+        # The first read only asks for active listings: missing 'delisted' values sort before every number,
+        # so ending at 0 skips every delisted one. This needs '.indexOn': ['written', 'delisted'].
+        if cursor is None:
+            listings = self.listings_ref().child(item_name).order_by_child('delisted').end_at(0).get().val() or {}
+        else:
+            listings = self.listings_ref().child(item_name).order_by_child('written').start_at(cursor).get().val() or {}
+        written = [listing['written'] for listing in listings.values() if 'written' in listing]
+        return listings, max(written, default=cursor if cursor is not None else 0)
+
+    def get_item_names(self):
+        # shallow only returns the keys, not every listing underneath them
+        return list((self.listings_ref().shallow().get().val() or {}).keys())
+
+    def read_item_index(self):
+        return dict(self.firebase.database().child(self.root).child('itemIndex').get().val() or {})
+
+    def write_item_index(self, entries):
+        self.firebase.database().child(self.root).update({
+            f'itemIndex/{item_name}': entry
+        for item_name, entry in entries.items()})
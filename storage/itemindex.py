@@ -0,0 +1,56 @@
+import math
+import time
+
+
+class ItemIndex:
+    '''
+    Compact summary of every unique with listings: how many times listings were listed and delisted, when it
+    was last updated and its modifier columns. It lets the dashboard list items without reading any listings.
+    Rewrites of a listing this process knows to be active are not counted again, so only the listings active
+    in the store are kept in memory. A relisted listing counts as listed again, which keeps the active count
+    right. Listings still active when the process restarted are counted again the next time they are written.
+    '''
+    def __init__(self, entries=None):
+        self.entries = entries or {}  # item name -> {'count', 'delisted', 'lastUpdated', 'columns'}
+        self.active = {}  # item name -> ids of the active listings this process has written
+
+    def get_entry(self, item_name):
+        entry = self.entries.setdefault(item_name, {'count': 0, 'lastUpdated': 0, 'columns': []})
+        entry.setdefault('delisted', 0)
+        return entry
+
+    def update(self, item_name, buffer=None, delisted_ids=()):
+        '''
+        Counts the listings of `buffer` and the `delisted_ids` about to be written.
+        '''
+        entry = self.get_entry(item_name)
+        active = self.active.setdefault(item_name, set())
+        entry['lastUpdated'] = round(time.time())
+        if buffer is not None:
+            for item_id, row in buffer.rows.items():
+                if item_id not in active:
+                    entry['count'] += 1
+                    active.add(item_id)
+                if not math.isnan(buffer.delisted[row]):
+                    self.delist(entry, active, item_id)
+            columns = buffer.get_column_names()
+            if len(columns) >= len(entry['columns']):
+                entry['columns'] = columns
+        for item_id in delisted_ids:
+            self.delist(entry, active, item_id)
+        return entry
+
+    def delist(self, entry, active, item_id):
+        # ids written before a restart are not known, but the writer only delists listings it has written
+        active.discard(item_id)
+        entry['delisted'] += 1
+
+    def get_active_count(self, item_name):
+        entry = self.entries[item_name]
+        return max(entry['count'] - entry.get('delisted', 0), 0)
+
+    def get_item_names(self):
+        '''
+        Item names, most listed first.
+        '''
+        return sorted(self.entries, key=lambda item_name: self.entries[item_name]['count'], reverse=True)
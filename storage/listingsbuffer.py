@@ -0,0 +1,181 @@
+from array import array
+from config.stashprocessor import CURRENCY_KEYS
+import math
+
+
+CURRENCY_INDEX = {key: index for index, key in enumerate(CURRENCY_KEYS)}
+MOD_KINDS = (('explicit', 'explicitMods'), ('implicit', 'implicitMods'))
+
+
+class ListingsBuffer:
+    '''
+    Columnar listings of one unique: a price array, one float array per modifier column (NaN where a listing
+    lacks the mod), a parallel item id index, a corrupted flag and a delisted time (NaN while listed) per row. Columns come from the unique's
+    template when ingesting, or are discovered from stored listings when loading.
+    '''
+    def __init__(self, template=None):
+        self.item_ids = []
+        self.rows = {}  # item id -> row
+        self.corrupted = bytearray()
+        self.price = array('d')
+        self.amount = array('d')
+        self.currency = array('h')  # index into CURRENCY_KEYS, -1 if unknown
+        self.seen = array('d')
+        self.delisted = array('d')
+        self.columns = []  # (kind, name) per modifier column
+        self.column_index = {}  # (kind, name, occurrence) -> column
+        self.values = []  # array('d') per modifier column
+        self.template_columns = {}  # kind -> buffer column of each template column
+        if template is not None:
+            self.set_template(template)
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def set_template(self, template):
+        '''
+        Maps the template's columns onto the buffer's, adding the ones it does not have yet. Lets listings be
+        added to a buffer that was filled from stored listings.
+        '''
+        for kind, _ in MOD_KINDS:
+            occurrences = {}
+            columns = []
+            for name in getattr(template, kind).columns:
+                occurrence = occurrences.get(name, 0)
+                occurrences[name] = occurrence + 1
+                column = self.column_index.get((kind, name, occurrence))
+                if column is None:
+                    column = self.add_column(kind, name)
+                columns.append(column)
+            self.template_columns[kind] = columns
+
+    def add_column(self, kind, name):
+        occurrence = sum(1 for column in self.columns if column == (kind, name))
+        self.column_index[(kind, name, occurrence)] = len(self.columns)
+        self.columns.append((kind, name))
+        self.values.append(array('d', [math.nan]) * len(self.item_ids))
+        return len(self.columns) - 1
+
+    def get_row(self, item_id):
+        '''
+        Returns the row for `item_id`, appending an empty one if the item is new. Relisted items reuse their row.
+        '''
+        row = self.rows.get(item_id)
+        if row is None:
+            row = len(self.item_ids)
+            self.rows[item_id] = row
+            self.item_ids.append(item_id)
+            self.corrupted.append(0)
+            for column in (self.price, self.amount, self.seen, self.delisted):
+                column.append(math.nan)
+            self.currency.append(-1)
+            for values in self.values:
+                values.append(math.nan)
+        else:
+            for values in self.values:
+                values[row] = math.nan
+        return row
+
+    def add(self, cleaned_item):
+        if not self.template_columns:
+            self.set_template(cleaned_item.template)
+        row = self.get_row(cleaned_item.id)
+        self.corrupted[row] = cleaned_item.corrupted
+        self.price[row] = cleaned_item.price
+        self.amount[row] = cleaned_item.amount
+        self.currency[row] = cleaned_item.currency_index
+        self.seen[row] = cleaned_item.seen
+        self.delisted[row] = math.nan
+        for kind, _ in MOD_KINDS:
+            columns = self.template_columns[kind]
+            for template_column, value in getattr(cleaned_item, kind).items():
+                self.values[columns[template_column]][row] = value
+
+    def add_listing(self, item_id, listing):
+        '''
+        Adds a listing in its stored dict form.
+        '''
+        row = self.get_row(item_id)
+        self.corrupted[row] = listing.get('corrupted', False)
+        self.price[row] = listing['price']
+        self.amount[row] = listing.get('amount', math.nan)
+        self.currency[row] = CURRENCY_INDEX.get(listing.get('currency'), -1)
+        self.seen[row] = listing.get('seen', math.nan)
+        self.delisted[row] = listing.get('delisted', math.nan)
+        for kind, key in MOD_KINDS:
+            occurrences = {}
+            for mod in listing.get(key, []):
+                (name, value), = mod.items()
+                occurrence = occurrences.get(name, 0)
+                occurrences[name] = occurrence + 1
+                column = self.column_index.get((kind, name, occurrence))
+                if column is None:
+                    column = self.add_column(kind, name)
+                self.values[column][row] = value
+
+    def delist(self, item_id, timestamp):
+        '''
+        Marks a buffered listing as delisted. Returns False if the item is not in this buffer.
+        '''
+        if (row := self.rows.get(item_id)) is None:
+            return False
+        self.delisted[row] = timestamp
+        return True
+
+    def to_listings(self):
+        '''
+        Returns {item id: listing} in the stored dict form.
+        '''
+        listings = {}
+        for item_id, row in self.rows.items():
+            listing = {
+                'corrupted': bool(self.corrupted[row]),
+                'explicitMods': [],
+                'implicitMods': [],
+                'price': self.price[row],
+            }
+            for (kind, name), values in zip(self.columns, self.values):
+                if not math.isnan(value := values[row]):
+                    listing[f'{kind}Mods'].append({name: value})
+            if self.currency[row] >= 0:
+                listing['amount'] = self.amount[row]
+                listing['currency'] = CURRENCY_KEYS[self.currency[row]]
+            if not math.isnan(self.seen[row]):
+                listing['seen'] = round(self.seen[row])
+            if not math.isnan(self.delisted[row]):
+                listing['delisted'] = round(self.delisted[row])
+            listings[item_id] = listing
+        return listings
+
+    def get_column_names(self):
+        '''
+        Modifier column names, made unique where the same mod text appears more than once.
+        '''
+        names = []
+        for _, name in self.columns:
+            unique_name, count = name, 1
+            while unique_name in names or unique_name == 'price':
+                count += 1
+                unique_name = f'{name} ({count})'
+            names.append(unique_name)
+        return names
+
+    def to_columns(self, include_corrupted=False, include_delisted=False):
+        '''
+        Returns {'price': [...], column name: [...]} ready for pd.DataFrame, plus the matching item ids.
+        '''
+        rows = [
+            row
+        for row in range(len(self.item_ids))
+            if (include_corrupted or not self.corrupted[row]) and (include_delisted or math.isnan(self.delisted[row]))]
+        columns = {'price': [self.price[row] for row in rows]}
+        for name, values in zip(self.get_column_names(), self.values):
+            columns[name] = [values[row] for row in rows]
+        return columns, [self.item_ids[row] for row in rows]
+
+    @classmethod
+    def from_listings(cls, listings):
+        buffer = cls()
+        for item_id, listing in listings.items():
+            buffer.add_listing(item_id, listing)
+        return buffer
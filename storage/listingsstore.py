@@ -0,0 +1,64 @@
+from config.shared import DATA_ROOT, LEAGUE, LISTINGS_STORE
+from config.stashprocessor import LISTINGS_DB_FILE
+import os
+
+
+class ListingsStore:
+    '''
+    Storage backend for cleaned listings of one league. Listings are grouped by unique name and keyed by item
+    id; writing an id that already exists replaces that listing. Listings that disappeared from their stash
+    are kept with a 'delisted' time.
+    '''
+    def write_listings(self, listings):
+        '''
+        Writes {item name: {item id: listing}} in one batch.
+        '''
+        raise NotImplementedError
+
+    def write_delistings(self, delistings):
+        '''
+        Marks {item name: {item id: delisted time}} as delisted in one batch. Only ids with a stored listing
+        may be passed.
+        '''
+        raise NotImplementedError
+
+    def read_listings(self, item_name):
+        '''
+        Returns {item id: listing} for one unique, or an empty dict if it has no listings.
+        '''
+        raise NotImplementedError
+
+    def read_listings_since(self, item_name, cursor=None):
+        '''
+        Returns ({item id: listing}, cursor) with the listings written or delisted since `cursor`, or all active
+        listings if `cursor` is None. Pass the returned cursor to the next call to only fetch newer changes.
+        '''
+        raise NotImplementedError
+
+    def get_item_names(self):
+        '''
+        Returns the names of all uniques that have listings, without reading the listings themselves.
+        '''
+        raise NotImplementedError
+
+    def read_item_index(self):
+        '''
+        Returns the stored item index entries as {item name: entry}, see ItemIndex.
+        '''
+        raise NotImplementedError
+
+    def write_item_index(self, entries):
+        '''
+        Writes {item name: entry} item index entries, replacing existing entries of the same items.
+        '''
+        raise NotImplementedError
+
+
+def create_listings_store(league=LEAGUE, backend=LISTINGS_STORE):
+    if backend == 'firebase':
+        from storage.firebasestore import FirebaseListingsStore
+        return FirebaseListingsStore(f'StashProcessor/leagues/{league}')
+    if backend == 'sqlite':
+        from storage.sqlitestore import SQLiteListingsStore
+        return SQLiteListingsStore(os.path.join(DATA_ROOT, league, LISTINGS_DB_FILE))
+    raise ValueError(f'Unknown listings store: {backend}')
@@ -0,0 +1,102 @@
+from config.shared import DATA_DIR
+from config.stashprocessor import LISTINGS_DB_FILE
+from storage.listingsstore import ListingsStore
+from threading import Lock
+import json
+import os
+import sqlite3
+
+
+class SQLiteListingsStore(ListingsStore):
+    '''
+    Local append-only listings store. Every write appends rows and reads take the newest row per item id, so
+    writes never touch the network and one unique's history is a single indexed range scan. A delisting
+    appends a copy of the item's newest row with its delisted time set.
+    '''
+    def __init__(self, path=os.path.join(DATA_DIR, LISTINGS_DB_FILE)):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = Lock()
+        with self.lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS listings ('
+                'seq INTEGER PRIMARY KEY AUTOINCREMENT, item_name TEXT NOT NULL, item_id TEXT NOT NULL, data TEXT NOT NULL, '
+                'delisted REAL)'
+            )
+            columns = [column for _, column, *_ in self.connection.execute('PRAGMA table_info(listings)')]
+            if 'delisted' not in columns:
+                self.connection.execute('ALTER TABLE listings ADD COLUMN delisted REAL')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS listings_item ON listings (item_name, seq)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS listings_item_id ON listings (item_name, item_id, seq)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS item_index (item_name TEXT PRIMARY KEY, data TEXT NOT NULL)'
+            )
+
+    def write_listings(self, listings):
+        rows = [
+            (item_name, item_id, json.dumps(listing, separators=(',', ':')), listing.get('delisted'))
+        for item_name, item_listings in listings.items() for item_id, listing in item_listings.items()]
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT INTO listings (item_name, item_id, data, delisted) VALUES (?, ?, ?, ?)', rows)
+
+    def write_delistings(self, delistings):
+        rows = [
+            (delisted, item_name, item_id)
+        for item_name, item_delistings in delistings.items() for item_id, delisted in item_delistings.items()]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                'INSERT INTO listings (item_name, item_id, data, delisted) '
+                'SELECT item_name, item_id, data, ?1 FROM listings WHERE item_name = ?2 AND item_id = ?3 '
+                'ORDER BY seq DESC LIMIT 1', rows
+            )
+
+    def load_listing(self, data, delisted):
+        listing = json.loads(data)
+        if delisted is not None:
+            listing['delisted'] = round(delisted)
+        return listing
+
+    def read_listings(self, item_name):
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT item_id, data, delisted FROM listings WHERE item_name = ? ORDER BY seq', (item_name,)
+            ).fetchall()
+        return {item_id: self.load_listing(data, delisted) for item_id, data, delisted in rows}
+
+    def read_listings_since(self, item_name, cursor=None):
+        with self.lock:
+            if cursor is None:
+                # newest row of every item id that is still listed
+                rows = self.connection.execute(
+                    'SELECT seq, item_id, data, delisted FROM listings WHERE seq IN ('
+                    'SELECT MAX(seq) FROM listings WHERE item_name = ? GROUP BY item_id) AND delisted IS NULL '
+                    'ORDER BY seq', (item_name,)
+                ).fetchall()
+                last_seq, = self.connection.execute(
+                    'SELECT MAX(seq) FROM listings WHERE item_name = ?', (item_name,)
+                ).fetchone()
+            else:
+                rows = self.connection.execute(
+                    'SELECT seq, item_id, data, delisted FROM listings WHERE item_name = ? AND seq > ? ORDER BY seq',
+                    (item_name, cursor)
+                ).fetchall()
+                last_seq = rows[-1][0] if rows else cursor
+        listings = {item_id: self.load_listing(data, delisted) for _, item_id, data, delisted in rows}
+        return listings, last_seq or 0
+
+    def get_item_names(self):
+        with self.lock:
+            rows = self.connection.execute('SELECT DISTINCT item_name FROM listings').fetchall()
+        return [item_name for item_name, in rows]
+
+    def read_item_index(self):
+        with self.lock:
+            rows = self.connection.execute('SELECT item_name, data FROM item_index').fetchall()
+        return {item_name: json.loads(data) for item_name, data in rows}
+
+    def write_item_index(self, entries):
+        rows = [(item_name, json.dumps(entry)) for item_name, entry in entries.items()]
+        with self.lock, self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO item_index (item_name, data) VALUES (?, ?)', rows)
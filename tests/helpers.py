@@ -0,0 +1,25 @@
+from threads.stashprocessor.modifiertemplate import UniqueTemplate
+from threads.stashprocessor.structs import CleanedItem
+import time
+
+
+def create_template(name='Test Unique', explicit=('(10-20)% increased Damage', '+(5-10) to Strength'), implicit=()):
+    return UniqueTemplate({
+        'name': name,
+        'explicitModifiers': [{'text': text, 'constant': False} for text in explicit],
+        'implicitModifiers': [{'text': text, 'constant': False} for text in implicit],
+    })
+
+
+def create_cleaned_item(item_id, template, price=10.0, explicit=None, implicit=None, corrupted=False, seen=None):
+    return CleanedItem(
+        item_id,
+        template,
+        corrupted,
+        price,
+        price,
+        0,
+        seen if seen is not None else time.time(),
+        explicit if explicit is not None else {0: 15.0, 1: 7.0},
+        implicit or {},
+    )
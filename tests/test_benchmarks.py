@@ -0,0 +1,16 @@
+import os
+import pytest
+import subprocess
+import sys
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_replay_imports_without_firebase_credentials():
+    pytest.importorskip('pyrebase')
+    env = {key: value for key, value in os.environ.items() if key != 'private_key'}
+    result = subprocess.run(
+        [sys.executable, '-c', 'import benchmarks.replay'], cwd=REPO_ROOT, env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,21 @@
+from threads.stashprocessor.checkpoint import load_checkpoint, save_checkpoint
+import json
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    leagues = {'Standard': {'listings': {'A': {'1': {'price': 5.0}}}, 'delistings': {'A': {'2': 100}}}}
+    save_checkpoint('1-2-3', leagues, path)
+    assert load_checkpoint(path) == ('1-2-3', leagues)
+
+
+def test_version_1_checkpoints_are_read_without_delistings(tmp_path):
+    path = tmp_path / 'checkpoint.json'
+    path.write_text(json.dumps({'version': 1, 'change_id': '1-2-3', 'leagues': {'Standard': {'A': {'1': {'price': 5.0}}}}}))
+    assert load_checkpoint(str(path)) == ('1-2-3', {'Standard': {'listings': {'A': {'1': {'price': 5.0}}}, 'delistings': {}}})
+
+
+def test_unknown_versions_are_ignored(tmp_path):
+    path = tmp_path / 'checkpoint.json'
+    path.write_text(json.dumps({'version': 99, 'change_id': '1-2-3', 'leagues': {}}))
+    assert load_checkpoint(str(path)) is None
@@ -0,0 +1,52 @@
+from threads.stashprocessor.cleaningpool import CleaningPool, get_shard_uniques
+import pytest
+
+
+UNIQUES_INFO = {
+    'weapons': {
+        name: {
+            'name': name,
+            'explicitModifiers': [{'text': '(10-20)% increased Damage', 'constant': False}],
+            'implicitModifiers': [],
+        }
+    for name in ('Unique A', 'Unique B', 'Unique C', 'Unique D')},
+}
+
+
+def create_item(name, mods=('15% increased Damage',)):
+    return {'name': name, 'extended': {'category': 'weapons'}, 'explicitMods': list(mods)}
+
+
+@pytest.fixture
+def pool():
+    pool = CleaningPool(UNIQUES_INFO, 2)
+    yield pool
+    pool.close()
+
+
+def test_shards_split_the_uniques():
+    shards = [get_shard_uniques(UNIQUES_INFO, shard, 2)['weapons'] for shard in range(2)]
+    assert sorted(name for shard in shards for name in shard) == sorted(UNIQUES_INFO['weapons'])
+    assert not shards[0].keys() & shards[1].keys()
+
+
+def test_match(pool):
+    results = pool.match([create_item('Unique A'), create_item('Unknown'), create_item('Unique D')])
+    assert results[0] == ({0: 15.0}, {})
+    assert results[1] is None
+    assert results[2] == ({0: 15.0}, {})
+
+
+def test_bad_records_are_left_uncleaned(pool):
+    results = pool.match([create_item('Unique A', mods=(None,)), create_item('Unique B')])
+    assert results == [None, ({0: 15.0}, {})]
+
+
+def test_dead_workers_are_replaced(pool):
+    items = [create_item(name) for name in UNIQUES_INFO['weapons']]
+    pool.processes[0].kill()
+    pool.processes[0].join()
+    results = pool.match(items)
+    assert any(result is None for result in results)
+    assert pool.processes[0].is_alive()
+    assert pool.match(items) == [({0: 15.0}, {})] * len(items)
@@ -0,0 +1,99 @@
+from config.stashprocessor import CURRENCY_KEYS, RATE_REFRESH_RETRY_INTERVAL
+from datetime import datetime, timedelta
+from threading import Event
+from threads.stashprocessor.currencyexchange import CurrencyExchange
+import pytest
+
+
+CHAOS = CURRENCY_KEYS.index('chaos')
+EXALTED = CURRENCY_KEYS.index('exalted')
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    '''
+    Exchange rates poe.ninja returns, one entry per fetch. An exception entry is raised instead.
+    '''
+    fetches = []
+
+    def fetch_exchange_rates(self):
+        result = fetches.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(CurrencyExchange, 'fetch_exchange_rates', fetch_exchange_rates)
+    return fetches
+
+
+def expire(exchange):
+    exchange.last_refresh = datetime.now() - exchange.cache_expiry - timedelta(seconds=1)
+
+
+def wait_for_revalidation(exchange):
+    assert exchange.refresh_lock.acquire(timeout=5)
+    exchange.refresh_lock.release()
+
+
+def test_expired_rates_are_served_while_revalidating(fetches, monkeypatch):
+    fetches += [{'chaos': 1.0, 'exalted': 100.0}, {'chaos': 1.0, 'exalted': 120.0}]
+    exchange = CurrencyExchange('Standard')
+    expire(exchange)
+    fetching, release = Event(), Event()
+    fetch = CurrencyExchange.fetch_exchange_rates
+
+    def blocking_fetch(self):
+        fetching.set()
+        release.wait(5)
+        return fetch(self)
+
+    monkeypatch.setattr(CurrencyExchange, 'fetch_exchange_rates', blocking_fetch)
+    assert exchange.get_exchange_rate('exalted', 'chaos') == 100.0
+    assert fetching.wait(5)
+    # a refresh is already running, so this neither blocks nor starts another one
+    assert exchange.get_exchange_rate('exalted', 'chaos') == 100.0
+    release.set()
+    wait_for_revalidation(exchange)
+    assert exchange.get_exchange_rate('exalted', 'chaos') == 120.0
+    assert exchange.chaos_rates[EXALTED] == 120.0
+    assert not fetches
+
+
+def test_failed_revalidation_is_retried_after_the_retry_interval(fetches):
+    fetches += [{'chaos': 1.0, 'exalted': 100.0}, ValueError('poe.ninja is down')]
+    exchange = CurrencyExchange('Standard')
+    expire(exchange)
+    exchange.refresh_if_expired()
+    wait_for_revalidation(exchange)
+    assert exchange.chaos_rates[EXALTED] == 100.0
+    retry_at = exchange.next_refresh_attempt
+    assert retry_at > datetime.now() + RATE_REFRESH_RETRY_INTERVAL - timedelta(seconds=5)
+    # no other attempt before the retry interval is up
+    fetches.append({'chaos': 1.0, 'exalted': 110.0})
+    exchange.refresh_if_expired()
+    wait_for_revalidation(exchange)
+    assert len(fetches) == 1
+    exchange.next_refresh_attempt = datetime.now()
+    exchange.refresh_if_expired()
+    wait_for_revalidation(exchange)
+    assert exchange.chaos_rates[EXALTED] == 110.0
+    assert not exchange.is_cache_expired()
+
+
+@pytest.mark.parametrize('timestamp, exalted', [
+    (50, 100.0),  # older than the history
+    (100, 100.0),
+    (150, 100.0),
+    (200, 110.0),
+    (299.5, 110.0),
+    (300, 120.0),
+    (10 ** 10, 120.0),
+])
+def test_chaos_rates_at(fetches, timestamp, exalted):
+    fetches.append({'chaos': 1.0})
+    exchange = CurrencyExchange('Standard')
+    exchange.history.clear()
+    for snapshot_time, rate in ((100, 100.0), (200, 110.0), (300, 120.0)):
+        exchange.history.append((snapshot_time, exchange.create_chaos_rates({'chaos': 1.0, 'exalted': rate})))
+    chaos_rates = exchange.get_chaos_rates_at(timestamp)
+    assert (chaos_rates[CHAOS], chaos_rates[EXALTED]) == (1.0, exalted)
@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+from dashboard import datacache
+from dashboard.datacache import DataFrameCache
+from storage.sqlitestore import SQLiteListingsStore
+import numpy as np
+import pytest
+
+
+def create_listing(price, damage):
+    return {'corrupted': False, 'explicitMods': [{'Damage': damage}], 'implicitMods': [], 'price': price, 'seen': 100}
+
+
+@pytest.fixture
+def store():
+    return SQLiteListingsStore(':memory:')
+
+
+@pytest.fixture
+def cache(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(datacache, 'DATA_ROOT', str(tmp_path))
+    return DataFrameCache(store, league='test')
+
+
+def test_get_builds_a_frame_of_active_listings(store, cache):
+    store.write_listings({'A': {'1': create_listing(5.0, 10.0), '2': create_listing(6.0, 20.0)}})
+    store.write_delistings({'A': {'2': 200}})
+    df, version = cache.get('A')
+    assert list(df.columns) == ['price', 'Damage']
+    assert df['price'].tolist() == [5.0]
+    assert cache.get('A')[1] == version
+
+
+def test_stale_items_are_refreshed_incrementally(store, cache):
+    store.write_listings({'A': {'1': create_listing(5.0, 10.0)}})
+    _, version = cache.get('A')
+    store.write_listings({'A': {'2': create_listing(7.0, 30.0)}})
+    cache.mark_stale(['A'])
+    df, new_version = cache.get('A')
+    assert new_version != version
+    assert sorted(df['price'].tolist()) == [5.0, 7.0]
+
+
+def test_get_version_returns_the_requested_version(store, cache):
+    store.write_listings({'A': {'1': create_listing(5.0, 10.0)}})
+    df, version = cache.get('A')
+    assert cache.get_version('A', version)['price'].tolist() == df['price'].tolist()
+
+
+def test_query(store, cache):
+    store.write_listings({'A': {str(i): create_listing(float(i), float(i * 10)) for i in range(1, 11)}})
+    num_matches, listings, _ = cache.query('A', {'Damage': (50, None), 'price': (None, 8)}, 2)
+    assert num_matches == 4
+    assert [listing['price'] for listing in listings] == [5.0, 6.0]
+    assert cache.nbytes == cache.entries['A'].nbytes > cache.entries['A'].query_index.nbytes > 0
+
+
+def test_query_a_given_version(store, cache):
+    store.write_listings({'A': {'1': create_listing(5.0, 10.0)}})
+    _, version = cache.get('A')
+    store.write_listings({'A': {'2': create_listing(7.0, 30.0)}})
+    cache.mark_stale(['A'])
+    cache.get('A')
+    num_matches, _, query_version = cache.query('A', {'price': (None, None)}, 10, version)
+    assert (num_matches, query_version) == (1, version)
+    assert cache.query('A', {'price': (None, None)}, 10)[0] == 2
+    assert cache.query('A', {'price': (None, None)}, 10, 'gone') is None
+
+
+def test_concurrent_gets_count_an_item_once(store, cache):
+    store.write_listings({'A': {'1': create_listing(5.0, 10.0)}})
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(cache.get, ['A'] * 8))
+    assert cache.nbytes == cache.entries['A'].nbytes
+
+
+def test_built_frames_are_served_from_the_shared_store(store, cache):
+    store.write_listings({'A': {'1': create_listing(5.0, 10.0)}})
+    df, _ = cache.get('A')
+    values = df['price'].to_numpy()
+    while values is not None and not isinstance(values, np.memmap):
+        values = values.base
+    assert values is not None
+
+
+def test_get_version_of_a_removed_version_is_none(store, cache):
+    store.write_listings({'A': {'1': create_listing(5.0, 10.0)}})
+    cache.get('A')
+    assert cache.get_version('A', 'gone') is None
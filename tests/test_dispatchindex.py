@@ -0,0 +1,55 @@
+from threads.stashprocessor.dispatchindex import DispatchIndex
+import pytest
+
+
+def create_item(name, league, note='~price 5 chaos', identified=True):
+    item = {'name': name, 'league': league, 'identified': identified}
+    if note is not None:
+        item['note'] = note
+    return item
+
+
+@pytest.fixture
+def index():
+    index = DispatchIndex()
+    index.subscribe('Ritual', {'Headhunter', 'Mageblood'}, 'softcore')
+    index.subscribe('Hardcore Ritual', {'Headhunter'}, 'hardcore')
+    return index
+
+
+@pytest.mark.parametrize('league_name, league_key', [
+    ('Ritual', 'ritual'),
+    ('RITUAL', 'ritual'),
+    ('Hardcore Ritual', 'hardcore ritual'),
+    ('SSF Hardcore Ritual', 'ssf hardcore ritual'),
+    ('Standard', 'standard'),
+])
+def test_get_league_key(league_name, league_key):
+    assert DispatchIndex().get_league_key(league_name) == league_key
+
+
+def test_league_keys_are_cached_per_name():
+    index = DispatchIndex()
+    key = index.get_league_key('Hardcore Ritual')
+    assert index.get_league_key('Hardcore Ritual') is key
+    assert index.league_keys == {'Hardcore Ritual': 'hardcore ritual'}
+
+
+@pytest.mark.parametrize('item, subscriber', [
+    (create_item('Headhunter', 'Ritual'), 'softcore'),
+    (create_item('Headhunter', 'ritual'), 'softcore'),
+    (create_item('Headhunter', 'Hardcore Ritual'), 'hardcore'),
+    (create_item('Mageblood', 'Ritual'), 'softcore'),
+    (create_item('Mageblood', 'Hardcore Ritual'), None),  # only tracked in softcore
+    (create_item('Headhunter', 'SSF Hardcore Ritual'), None),
+    (create_item('Tabula Rasa', 'Ritual'), None),
+    (create_item('Headhunter', 'Ritual', note=None), None),
+    (create_item('Headhunter', 'Ritual', identified=False), None),
+])
+def test_route(index, item, subscriber):
+    assert index.route(item) == subscriber
+    assert index.is_acceptable(item) == (subscriber is not None)
+
+
+def test_item_names_of_every_league(index):
+    assert index.get_item_names() == {'Headhunter', 'Mageblood'}
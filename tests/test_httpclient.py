@@ -0,0 +1,35 @@
+from threads.stashprocessor.httpclient import HttpClient, RateLimiter
+import time
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    def get(self, url, **kwargs):
+        return self.responses.pop(0)
+
+
+def test_rate_limited_responses_are_closed_before_retrying():
+    client = HttpClient()
+    limited, ok = FakeResponse(429), FakeResponse(200)
+    limiter = RateLimiter()
+    client.get_host = lambda host: (FakeSession([limited, ok]), limiter)
+    start = time.time()
+    assert client.get('https://example.com/', stream=True) is ok
+    assert limited.closed and not ok.closed
+    # sent after the one second block the 429 caused, which the request time leaves out
+    assert ok.requested - start >= 1.0
@@ -0,0 +1,124 @@
+from helpers import create_cleaned_item, create_template
+from storage.sqlitestore import SQLiteListingsStore
+from threads.stashprocessor.listingswriter import ListingsWriter
+
+
+def create_writer():
+    store = SQLiteListingsStore(':memory:')
+    return ListingsWriter(store), store
+
+
+def test_flush_writes_listings_with_template_columns():
+    writer, store = create_writer()
+    template = create_template()
+    written = []
+    writer.on_write = written.append
+    writer.add('Test Unique', create_cleaned_item('1', template, price=12.0, explicit={0: 15.0}))
+    writer.flush()
+    listing = store.read_listings('Test Unique')['1']
+    assert listing['price'] == 12.0
+    assert listing['explicitMods'] == [{'(10-20)% increased Damage': 15.0}]
+    assert written == [['Test Unique']]
+    assert not writer.pending and writer.inflight_bytes == 0
+
+
+def test_relisted_id_is_written_once_with_its_latest_price():
+    writer, store = create_writer()
+    template = create_template()
+    writer.add('Test Unique', create_cleaned_item('1', template, price=12.0))
+    writer.add('Test Unique', create_cleaned_item('1', template, price=9.0))
+    assert writer.pending.count == 1
+    writer.flush()
+    assert store.read_listings('Test Unique')['1']['price'] == 9.0
+
+
+def test_delisting_a_buffered_listing():
+    writer, store = create_writer()
+    writer.add('Test Unique', create_cleaned_item('1', create_template()))
+    writer.delist('Test Unique', '1', 500)
+    writer.flush()
+    assert store.read_listings('Test Unique')['1']['delisted'] == 500
+    assert store.read_listings_since('Test Unique')[0] == {}
+
+
+def test_delisting_a_written_listing():
+    writer, store = create_writer()
+    writer.add('Test Unique', create_cleaned_item('1', create_template()))
+    writer.flush()
+    writer.delist('Test Unique', '1', 500)
+    writer.flush()
+    assert store.read_listings('Test Unique')['1']['delisted'] == 500
+
+
+def test_snapshot_and_restore_round_trip():
+    writer, _ = create_writer()
+    writer.add('Test Unique', create_cleaned_item('1', create_template(), price=3.0))
+    writer.delist('Other Unique', '2', 400)
+    listings, delistings = writer.snapshot()
+    restored, store = create_writer()
+    restored.restore(listings, delistings)
+    assert restored.snapshot() == (listings, delistings)
+    store.write_listings({'Other Unique': {'2': {'price': 1.0}}})
+    restored.flush()
+    assert store.read_listings('Test Unique')['1']['price'] == 3.0
+    assert store.read_listings('Other Unique')['2']['delisted'] == 400
+
+
+def test_item_index_counts_written_listings():
+    writer, store = create_writer()
+    writer.add('Test Unique', create_cleaned_item('1', create_template()))
+    writer.add('Test Unique', create_cleaned_item('2', create_template()))
+    writer.flush()
+    assert store.read_item_index()['Test Unique']['count'] == 2
+
+
+def test_relisting_does_not_grow_the_pending_bytes():
+    writer, _ = create_writer()
+    template = create_template()
+    writer.add('Test Unique', create_cleaned_item('1', template, price=12.0))
+    nbytes = writer.pending.nbytes
+    for price in range(5):
+        writer.add('Test Unique', create_cleaned_item('1', template, price=float(price)))
+    assert writer.pending.nbytes == nbytes
+
+
+def test_item_index_does_not_count_rewrites_again():
+    writer, store = create_writer()
+    template = create_template()
+    store.write_listings({'Test Unique': {'0': {'price': 1.0}}})
+    writer.add('Test Unique', create_cleaned_item('0', template, price=2.0))
+    writer.add('Test Unique', create_cleaned_item('1', template, price=12.0))
+    writer.flush()
+    writer.add('Test Unique', create_cleaned_item('1', template, price=9.0))
+    writer.delist('Test Unique', '0', 500)
+    writer.flush()
+    entry = store.read_item_index()['Test Unique']
+    assert entry['count'] == 2
+    assert entry['delisted'] == 1
+    assert writer.item_index.get_active_count('Test Unique') == 1
+
+
+def test_item_index_counts_relisted_listings_as_active():
+    writer, store = create_writer()
+    template = create_template()
+    writer.add('Test Unique', create_cleaned_item('1', template))
+    writer.flush()
+    writer.delist('Test Unique', '1', 500)
+    writer.flush()
+    assert writer.item_index.get_active_count('Test Unique') == 0
+    writer.add('Test Unique', create_cleaned_item('1', template))
+    writer.flush()
+    entry = store.read_item_index()['Test Unique']
+    assert (entry['count'], entry['delisted']) == (2, 1)
+    assert writer.item_index.get_active_count('Test Unique') == 1
+
+
+def test_stop_ends_the_writer_thread_and_keeps_pending_listings():
+    writer, store = create_writer()
+    writer.start()
+    writer.stop(timeout=5)
+    assert not writer.is_alive()
+    writer.add('Test Unique', create_cleaned_item('1', create_template()))
+    assert list(writer.snapshot()[0]['Test Unique']) == ['1']
+    writer.flush()
+    assert '1' in store.read_listings('Test Unique')
@@ -0,0 +1,58 @@
+from threads.stashprocessor.modifiertemplate import ModifierTemplate, UniqueColumns, UniqueTemplate
+
+
+def create_modifier_template(*texts):
+    return ModifierTemplate([{'text': text, 'constant': False} for text in texts])
+
+
+def test_match_sums_values_per_column():
+    template = create_modifier_template('Adds (5-10) to (20-30) Fire Damage', '(10-20)% increased Damage')
+    assert template.match(['15% increased Damage', 'Adds 7 to 25 Fire Damage']) == {0: 32.0, 1: 15.0}
+
+
+def test_unmatched_and_missing_lines_produce_no_value():
+    template = create_modifier_template('(10-20)% increased Damage', '+(5-10) to Strength')
+    assert template.match(['Some other mod', '+6 to Strength']) == {1: 6.0}
+
+
+def test_negative_ranges():
+    template = create_modifier_template('-(10-5) to Total Mana Cost of Skills')
+    assert template.match(['-7 to Total Mana Cost of Skills']) == {0: -7.0}
+
+
+def test_same_text_twice_fills_both_columns():
+    template = create_modifier_template('+(10-20) to Strength', '+(10-20) to Strength')
+    assert template.match(['+12 to Strength', '+18 to Strength']) == {0: 12.0, 1: 18.0}
+
+
+def test_hybrid_modifier_lines_sum_into_one_column():
+    template = create_modifier_template('+(10-20) to Strength\n+(5-10)% increased Damage', '(20-30)% increased Damage')
+    assert template.columns[0] == '+(10-20) to Strength +(5-10)% increased Damage'
+    assert template.match(['+15 to Strength', '+7% increased Damage', '25% increased Damage']) == {0: 22.0, 1: 25.0}
+
+
+def test_constant_modifiers_have_no_column():
+    template = ModifierTemplate([
+        {'text': 'Cannot be Frozen', 'constant': True},
+        {'text': '(10-20)% increased Damage', 'constant': False},
+    ])
+    assert template.columns == ['(10-20)% increased Damage']
+    assert template.match(['Cannot be Frozen', '12% increased Damage']) == {0: 12.0}
+
+
+def test_unique_columns_match_the_compiled_template():
+    item_info = {
+        'name': 'Test Unique',
+        'explicitModifiers': [
+            {'text': '+(10-20) to Strength\n+(5-10)% increased Damage', 'constant': False},
+            {'text': 'Cannot be Frozen', 'constant': True},
+            {'text': '(20-30)% increased Damage', 'constant': False},
+        ],
+        'implicitModifiers': [{'text': '+(8-12)% to all Elemental Resistances', 'constant': False}],
+    }
+    template, columns = UniqueTemplate(item_info), UniqueColumns(item_info)
+    assert columns.name == template.name
+    assert columns.explicit.columns == template.explicit.columns == [
+        '+(10-20) to Strength +(5-10)% increased Damage', '(20-30)% increased Damage'
+    ]
+    assert columns.implicit.columns == template.implicit.columns
@@ -0,0 +1,75 @@
+from config.stashprocessor import CURRENCY_KEYS, PRICE_NOTE_CACHE_SIZE
+from threads.stashprocessor.priceparser import CURRENCY_INDEX, PriceParser
+import pytest
+
+
+class FakeExchange:
+    def __init__(self, rates):
+        self.chaos_rates = tuple(rates.get(key) for key in CURRENCY_KEYS)
+
+
+def create_parser():
+    return PriceParser(FakeExchange({'chaos': 1.0, 'exalted': 100.0, 'divine': 8.0}))
+
+
+@pytest.mark.parametrize('note, expected', [
+    ('~price 5 chaos', 5.0),
+    ('~b/o 2.5 chaos', 2.5),
+    ('~price .5 exalted', 50.0),
+    ('~price 1/2 exa', 50.0),
+    ('~b/o 3/4 exalted', 75.0),
+    ('~price 1/.5 div', 16.0),
+    ('~price 10 chaos ', 10.0),
+])
+def test_get_price(note, expected):
+    assert create_parser().get_price(note) == expected
+
+
+@pytest.mark.parametrize('note', [
+    '~price 1/0 chaos',
+    '~price 1/0.0 exalted',
+    '~price 5 shiny-pebbles',
+    '~price chaos',
+    '~price 5. chaos',
+    '~offer 5 chaos',
+    'price 5 chaos',
+])
+def test_unrecognised_notes(note):
+    assert create_parser().get_price(note) is None
+
+
+@pytest.mark.parametrize('alias, key', [
+    ('c', 'chaos'),
+    ('ex', 'exalted'),
+    ('exa', 'exalted'),
+    ('div', 'divine'),
+    ('alchemy', 'alch'),
+    ('fuse', 'fusing'),
+    ('mir', 'mirror'),
+])
+def test_aliases_parse_as_their_currency(alias, key):
+    assert create_parser().parse_note(f'~b/o 2 {alias}') == (2.0, CURRENCY_INDEX[key])
+
+
+def test_currency_without_a_rate_has_no_price():
+    parser = create_parser()
+    assert parser.parse_note('~price 5 mirror') == (5.0, CURRENCY_INDEX['mirror'])
+    assert parser.get_price('~price 5 mirror') is None
+
+
+def test_repeated_notes_are_parsed_once():
+    parser = create_parser()
+    for _ in range(3):
+        parser.get_price('~price 5 chaos')
+    info = parser.parse_note.cache_info()
+    assert (info.misses, info.hits) == (1, 2)
+
+
+def test_note_cache_is_bounded():
+    parser = create_parser()
+    for amount in range(PRICE_NOTE_CACHE_SIZE + 10):
+        parser.get_price(f'~price {amount} chaos')
+    assert parser.parse_note.cache_info().currsize == PRICE_NOTE_CACHE_SIZE
+    # the least recently used notes were evicted
+    parser.get_price('~price 0 chaos')
+    assert parser.parse_note.cache_info().misses == PRICE_NOTE_CACHE_SIZE + 11
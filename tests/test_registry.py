@@ -0,0 +1,27 @@
+from metrics import registry as registry_module
+from metrics.registry import Registry
+
+
+def create_external_text():
+    ingest = Registry(enabled=True)
+    ingest.counter('ingest_pages_total', 'River pages fetched').inc(5)
+    return ingest.render()
+
+
+def test_external_families_replace_local_ones():
+    registry = Registry(enabled=True)
+    registry.counter('ingest_pages_total', 'River pages fetched')
+    registry.counter('dashboard_requests_total', 'Requests').inc()
+    registry.set_external('ingest', create_external_text())
+    text = registry.render()
+    assert text.count('# TYPE ingest_pages_total') == 1
+    assert 'ingest_pages_total 5' in text
+    assert 'dashboard_requests_total 1' in text
+
+
+def test_stale_external_metrics_are_dropped(monkeypatch):
+    registry = Registry(enabled=True)
+    registry.set_external('ingest', create_external_text())
+    monkeypatch.setattr(registry_module, 'METRICS_EXTERNAL_MAX_AGE', -1)
+    assert 'ingest_pages_total' not in registry.render()
+    assert not registry.external
@@ -0,0 +1,34 @@
+from dashboard import rendering
+from dashboard.rendering import create_figure, get_figure_selection
+from dashboard.selection import get_selection_key
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'price': rng.uniform(1, 100, 500), 'Damage': rng.uniform(10, 50, 500)})
+
+
+@pytest.mark.parametrize('rows', [None, np.arange(100, 300)])
+def test_point_selection_matches_the_drawn_figure(df, rows):
+    selected_rows = np.arange(0, 500, 7)
+    figure = create_figure(df, 'Damage', 'price', selected_rows, rows)
+    selectedpoints = get_figure_selection(df, 'Damage', 'price', selected_rows, rows)
+    assert get_selection_key(selectedpoints) == get_selection_key(figure.data[0].selectedpoints)
+
+
+@pytest.mark.parametrize('rows', [None, np.arange(100, 300)])
+def test_density_selection_matches_the_drawn_figure(df, rows, monkeypatch):
+    monkeypatch.setattr(rendering, 'DENSITY_POINT_THRESHOLD', 50)
+    selected_rows = np.arange(0, 500, 7)
+    figure = create_figure(df, 'Damage', 'price', selected_rows, rows)
+    selectedpoints = get_figure_selection(df, 'Damage', 'price', selected_rows, rows)
+    assert len(selectedpoints) > 0
+    assert get_selection_key(selectedpoints) == get_selection_key(figure.data[0].selectedpoints)
+
+
+def test_no_selection():
+    assert get_selection_key(None) is None
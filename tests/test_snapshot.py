@@ -0,0 +1,96 @@
+from datetime import timedelta
+from threads.stashprocessor.snapshot import SNAPSHOT_HEADER, SNAPSHOT_MAGIC, SnapshotCache, load_snapshot, save_snapshot
+import os
+import pytest
+import time
+
+
+@pytest.fixture
+def path(tmp_path):
+    return os.path.join(tmp_path, 'snapshots', 'uniques.snapshot')
+
+
+def write_header(path, magic=SNAPSHOT_MAGIC, version=1, key=b'Ritual', payload=b''):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(magic, version, time.time(), len(key)) + key + payload)
+
+
+def test_round_trip(path):
+    save_snapshot(path, 'Ritual', {'armour': {'Kaom\'s Heart': [1, 2.5]}})
+    created, value = load_snapshot(path, 'Ritual')
+    assert value == {'armour': {'Kaom\'s Heart': [1, 2.5]}}
+    assert abs(created - time.time()) < 5
+
+
+def test_snapshot_of_another_league_is_ignored(path):
+    save_snapshot(path, 'Ritual', [1])
+    assert load_snapshot(path, 'Hardcore Ritual') is None
+    assert load_snapshot(path, 'Ritua') is None
+
+
+@pytest.mark.parametrize('contents', [
+    b'',
+    b'PMA',
+    b'not a snapshot at all',
+])
+def test_corrupt_snapshot_is_ignored(path, contents):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(contents)
+    assert load_snapshot(path, 'Ritual') is None
+
+
+@pytest.mark.parametrize('header', [
+    {'magic': b'XXXX'},
+    {'version': 0},
+    {'version': 2},
+    {'payload': b'truncated zlib'},
+])
+def test_foreign_or_old_version_header_is_ignored(path, header):
+    write_header(path, **header)
+    assert load_snapshot(path, 'Ritual') is None
+
+
+def test_missing_snapshot_is_fetched_and_saved(path):
+    fetches = []
+    cache = SnapshotCache('test', path, 'Ritual', lambda: fetches.append(1) or {'a': 1}, timedelta(days=1))
+    assert cache.get() == {'a': 1}
+    assert cache.get() == {'a': 1}
+    assert len(fetches) == 1
+    assert load_snapshot(path, 'Ritual')[1] == {'a': 1}
+
+
+def test_league_change_fetches_again(path):
+    save_snapshot(path, 'Ritual', {'league': 'Ritual'})
+    cache = SnapshotCache('test', path, 'Standard', lambda: {'league': 'Standard'}, timedelta(days=1))
+    assert cache.get() == {'league': 'Standard'}
+    assert load_snapshot(path, 'Standard')[1] == {'league': 'Standard'}
+
+
+def test_stale_snapshot_is_served_while_revalidating(path):
+    save_snapshot(path, 'Ritual', {'version': 1})
+    updates = []
+    cache = SnapshotCache(
+        'test', path, 'Ritual', lambda: {'version': 2}, timedelta(0), lambda value, previous: updates.append((value, previous))
+    )
+    assert cache.get() == {'version': 1}
+    assert cache.revalidate_lock.acquire(timeout=5)
+    cache.revalidate_lock.release()
+    assert updates == [({'version': 2}, {'version': 1})]
+    assert cache.value == {'version': 2}
+    assert load_snapshot(path, 'Ritual')[1] == {'version': 2}
+
+
+def test_failed_revalidation_keeps_the_snapshot(path):
+    save_snapshot(path, 'Ritual', {'version': 1})
+
+    def fetch():
+        raise ConnectionError('offline')
+
+    cache = SnapshotCache('test', path, 'Ritual', fetch, timedelta(0))
+    assert cache.get() == {'version': 1}
+    assert cache.revalidate_lock.acquire(timeout=5)
+    cache.revalidate_lock.release()
+    assert cache.value == {'version': 1}
+    assert load_snapshot(path, 'Ritual')[1] == {'version': 1}
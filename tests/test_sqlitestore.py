@@ -0,0 +1,61 @@
+from storage.sqlitestore import SQLiteListingsStore
+import pytest
+
+
+def create_listing(price, seen=100, **fields):
+    return {'corrupted': False, 'explicitMods': [{'Mod': 1.0}], 'implicitMods': [], 'price': price, 'seen': seen, **fields}
+
+
+@pytest.fixture
+def store():
+    return SQLiteListingsStore(':memory:')
+
+
+def test_write_and_read(store):
+    store.write_listings({'A': {'1': create_listing(5.0)}, 'B': {'2': create_listing(6.0)}})
+    assert store.read_listings('A') == {'1': create_listing(5.0)}
+    assert sorted(store.get_item_names()) == ['A', 'B']
+    assert store.read_listings('C') == {}
+
+
+def test_rewriting_an_id_replaces_the_listing(store):
+    store.write_listings({'A': {'1': create_listing(5.0)}})
+    store.write_listings({'A': {'1': create_listing(7.0)}})
+    assert store.read_listings('A') == {'1': create_listing(7.0)}
+
+
+def test_read_listings_since_returns_only_newer_changes(store):
+    store.write_listings({'A': {'1': create_listing(5.0), '2': create_listing(6.0)}})
+    listings, cursor = store.read_listings_since('A')
+    assert set(listings) == {'1', '2'}
+    assert store.read_listings_since('A', cursor) == ({}, cursor)
+    store.write_listings({'A': {'3': create_listing(7.0)}, 'B': {'4': create_listing(8.0)}})
+    listings, next_cursor = store.read_listings_since('A', cursor)
+    assert set(listings) == {'3'}
+    assert next_cursor > cursor
+
+
+def test_delistings(store):
+    store.write_listings({'A': {'1': create_listing(5.0), '2': create_listing(6.0)}})
+    _, cursor = store.read_listings_since('A')
+    store.write_delistings({'A': {'1': 200}})
+    # a fresh read only returns active listings
+    listings, _ = store.read_listings_since('A')
+    assert set(listings) == {'2'}
+    # an incremental read sees the delisting
+    listings, _ = store.read_listings_since('A', cursor)
+    assert listings == {'1': create_listing(5.0, delisted=200)}
+
+
+def test_relisting_after_a_delisting(store):
+    store.write_listings({'A': {'1': create_listing(5.0)}})
+    store.write_delistings({'A': {'1': 200}})
+    store.write_listings({'A': {'1': create_listing(4.0, seen=300)}})
+    listings, _ = store.read_listings_since('A')
+    assert listings == {'1': create_listing(4.0, seen=300)}
+
+
+def test_item_index(store):
+    store.write_item_index({'A': {'count': 1}})
+    store.write_item_index({'A': {'count': 2}, 'B': {'count': 1}})
+    assert store.read_item_index() == {'A': {'count': 2}, 'B': {'count': 1}}
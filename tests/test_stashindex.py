@@ -0,0 +1,57 @@
+from threads.stashprocessor.stashindex import StashIndex
+
+
+def listings(*item_ids, item_name='Headhunter'):
+    return {item_id: ('softcore', item_name) for item_id in item_ids}
+
+
+def test_listings_missing_from_a_stash_are_delisted():
+    index = StashIndex()
+    assert index.update('a', listings('1', '2')) == []
+    assert index.update('a', listings('2', '3')) == [('softcore', 'Headhunter', '1')]
+    assert index.stashes['a'] == listings('2', '3')
+
+
+def test_emptied_stash_delists_everything_and_is_dropped():
+    index = StashIndex()
+    index.update('a', listings('1', '2'))
+    assert sorted(index.update('a', {})) == [('softcore', 'Headhunter', '1'), ('softcore', 'Headhunter', '2')]
+    assert len(index) == 0
+    assert index.item_stashes == {}
+
+
+def test_item_moved_to_a_stash_seen_first_is_not_delisted():
+    index = StashIndex()
+    index.update('a', listings('1'))
+    assert index.update('b', listings('1')) == []
+    assert index.update('a', {}) == []
+    assert index.item_stashes == {'1': 'b'}
+
+
+def test_item_moved_to_a_stash_seen_later_is_delisted_then_listed_again():
+    index = StashIndex()
+    index.update('a', listings('1'))
+    assert index.update('a', {}) == [('softcore', 'Headhunter', '1')]
+    assert index.update('b', listings('1')) == []
+    assert index.item_stashes == {'1': 'b'}
+
+
+def test_least_recently_updated_stash_is_evicted():
+    index = StashIndex(max_stashes=2)
+    index.update('a', listings('1'))
+    index.update('b', listings('2'))
+    index.update('a', listings('1', '3'))  # a is now more recent than b
+    index.update('c', listings('4'))
+    assert list(index.stashes) == ['a', 'c']
+    assert index.evictions == 1
+    assert '2' not in index.item_stashes
+    # the evicted stash's listings are no longer noticed going
+    assert index.update('b', {}) == []
+
+
+def test_stashes_without_tracked_listings_are_not_indexed():
+    index = StashIndex(max_stashes=1)
+    index.update('a', listings('1'))
+    assert index.update('b', {}) == []
+    assert list(index.stashes) == ['a']
+    assert index.evictions == 0
@@ -0,0 +1,73 @@
+from threads.stashprocessor.stashparser import StashStreamParser
+import json
+
+
+TRACKED = {'Tracked Unique'}
+
+
+def create_item(item_id, name, note='~price 5 chaos', league='Standard'):
+    return {'id': item_id, 'name': name, 'note': note, 'identified': True, 'league': league}
+
+
+def create_page(stashes, next_change_id='1-2-3'):
+    return json.dumps({'next_change_id': next_change_id, 'stashes': stashes})
+
+
+def create_stash(stash_id, items):
+    return {'id': stash_id, 'public': True, 'accountName': 'someone', 'items': items}
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def parse(text, chunk_size=7):
+    parser = StashStreamParser(TRACKED, lambda item: item['name'] in TRACKED)
+    return parser.parse_chunks(chunked(text, chunk_size))
+
+
+def test_parse_keeps_accepted_items_of_every_stash():
+    page = create_page([
+        create_stash('a', [create_item('1', 'Tracked Unique'), create_item('2', 'Other Unique')]),
+        create_stash('b', [create_item('3', 'Other Unique')]),
+        create_stash('c', [create_item('4', 'Tracked Unique')]),
+    ])
+    next_change_id, stashes = parse(page)
+    assert next_change_id == '1-2-3'
+    assert [(stash_id, [item['id'] for item in items]) for stash_id, items in stashes] == [
+        ('a', ['1']), ('b', []), ('c', ['4'])
+    ]
+
+
+def test_parse_is_independent_of_chunk_boundaries():
+    page = create_page([
+        create_stash(f's{i}', [create_item(f'{i}', 'Tracked Unique' if i % 3 == 0 else 'Other', note=f'~b/o {i} "chaos"')])
+    for i in range(20)])
+    expected = parse(page, len(page))
+    for chunk_size in (1, 2, 13, 64):
+        assert parse(page, chunk_size) == expected
+
+
+def test_change_id_after_the_stashes():
+    page = json.dumps({'stashes': [create_stash('a', [create_item('1', 'Tracked Unique')])], 'next_change_id': '9-9'})
+    next_change_id, stashes = parse(page)
+    assert next_change_id == '9-9'
+    assert [item['id'] for item in stashes[0][1]] == ['1']
+
+
+def test_empty_page():
+    assert parse(create_page([])) == ('1-2-3', [])
+
+
+def test_change_id_after_an_untracked_last_stash():
+    page = json.dumps({
+        'stashes': [
+            create_stash('a', [create_item('1', 'Tracked Unique')]),
+            create_stash('b', [create_item('2', 'Other Unique')]),
+        ],
+        'next_change_id': '9-9',
+    })
+    for chunk_size in (1, 7, len(page)):
+        next_change_id, stashes = parse(page, chunk_size)
+        assert next_change_id == '9-9'
+        assert [(stash_id, [item['id'] for item in items]) for stash_id, items in stashes] == [('a', ['1']), ('b', [])]
@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock, Thread
+from threads.stashprocessor.riverlag import RiverLag
+from threads.stashprocessor.stashindex import StashIndex
+from threads.stashprocessor.stashprocessor import StashProcessor
+
+
+class FakeParser:
+    def __init__(self, pages):
+        self.pages = pages  # change id -> (next change id, finish)
+
+    def parse_deferred(self, change_id):
+        return self.pages[change_id]
+
+
+def fail():
+    raise ValueError('Truncated page')
+
+
+def create_stash_processor(pages):
+    # only the fetch and process stages are exercised, so skip the reference data StashProcessor loads
+    stash_processor = StashProcessor.__new__(StashProcessor)
+    Thread.__init__(stash_processor, name='StashProcessor')
+    stash_processor.next_change_id = '1-1'
+    stash_processor.epoch = 0
+    stash_processor.change_id_lock = Lock()
+    stash_processor.river_lag = RiverLag('1-1')
+    stash_processor.river_lag.checked = float('inf')
+    stash_processor.catch_up_pool = ThreadPoolExecutor(2)
+    stash_processor.catch_up_slots = BoundedSemaphore(2)
+    stash_processor.stash_parser = FakeParser(pages)
+    stash_processor.fetch_stash_page = lambda change_id, stream: change_id
+    stash_processor.subscribers = []
+    stash_processor.cleaning_pool = None
+    stash_processor.stash_index = StashIndex()
+    return stash_processor
+
+
+def test_a_failed_catch_up_page_is_fetched_again():
+    pages = {'1-1': ('2-2', fail), '2-2': ('3-3', lambda: [])}
+    stash_processor = create_stash_processor(pages)
+    first = stash_processor.fetch_ahead()
+    second = stash_processor.fetch_ahead()
+    assert stash_processor.next_change_id == '3-3'
+    assert stash_processor.process_stage(first) is None
+    assert stash_processor.next_change_id == '1-1'
+    # fetched after the failed page, so it is dropped rather than persisted past it
+    assert stash_processor.process_stage(second) is None
+    pages['1-1'] = ('2-2', lambda: [])
+    again = stash_processor.fetch_ahead()
+    assert again[1:3] == ('1-1', '2-2')
+    assert stash_processor.process_stage(again) == ('2-2', [], [])
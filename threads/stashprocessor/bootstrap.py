@@ -0,0 +1,7 @@
+from concurrent.futures import ThreadPoolExecutor
+from config.stashprocessor import BOOTSTRAP_CONCURRENCY
+
+
+# Runs the reference data requests made at startup, at most BOOTSTRAP_CONCURRENCY at a time. Only submit
+# tasks that never wait on other tasks of the pool, a task waiting on a queued one could wait forever.
+bootstrap_pool = ThreadPoolExecutor(BOOTSTRAP_CONCURRENCY, thread_name_prefix='Bootstrap')
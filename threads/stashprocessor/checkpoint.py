@@ -0,0 +1,39 @@
+from config.stashprocessor import CHECKPOINT_FILE
+import json
+import os
+
+
+CHECKPOINT_VERSION = 2
+
+
+def save_checkpoint(change_id, leagues, path=CHECKPOINT_FILE):
+    '''
+    Saves the change id to resume from and {league: {'listings': {item name: {item id: listing}},
+    'delistings': {item name: {item id: delisted time}}}} not written yet. The checkpoint is written to a
+    temporary file first and renamed into place, so a crash mid-save leaves the previous checkpoint intact.
+    '''
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': CHECKPOINT_VERSION, 'change_id': change_id, 'leagues': leagues}, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path=CHECKPOINT_FILE):
+    '''
+    Returns (change id, leagues) as saved, or None if there is no usable checkpoint. Version 1 checkpoints,
+    which only held {league: {item name: {item id: listing}}}, are read as leagues without delistings.
+    '''
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if checkpoint.get('version') not in (1, CHECKPOINT_VERSION) or not checkpoint.get('change_id'):
+        return None
+    leagues = checkpoint['leagues']
+    if checkpoint['version'] == 1:
+        leagues = {league: {'listings': listings, 'delistings': {}} for league, listings in leagues.items()}
+    return checkpoint['change_id'], leagues
@@ -0,0 +1,148 @@
+from threads.stashprocessor.modifiertemplate import UniqueTemplate
+import multiprocessing
+import traceback
+import zlib
+
+
+def flatten_values(values):
+    return tuple(v for column_value in values.items() for v in column_value)
+
+
+def unflatten_values(flat):
+    return dict(zip(flat[::2], flat[1::2]))
+
+
+def get_shard(item_name, num_shards):
+    return zlib.crc32(item_name.encode()) % num_shards
+
+
+def get_shard_uniques(uniques_info, shard, num_shards):
+    return {
+        item_category: {
+            item_name: item_info
+        for item_name, item_info in category_items.items() if get_shard(item_name, num_shards) == shard}
+    for item_category, category_items in uniques_info.items()}
+
+
+def match_record(templates, item_category, item_name, explicit_mods, implicit_mods):
+    template = templates.get((item_category, item_name))
+    if template is None:
+        return None
+    return (
+        flatten_values(template.explicit.match(explicit_mods)),
+        flatten_values(template.implicit.match(implicit_mods)),
+    )
+
+
+def run_worker(uniques_info, connection):
+    '''
+    Worker process main loop. The templates of the worker's shard are compiled once at start, then every
+    request is a list of (category, name, explicit mods, implicit mods) tuples and every reply a list of
+    flattened (explicit values, implicit values) tuples, or None where the unique has no template or its
+    record could not be matched.
+    '''
+    templates = {
+        (item_category, item_name): UniqueTemplate(item_info)
+    for item_category, category_items in uniques_info.items() for item_name, item_info in category_items.items()}
+    while True:
+        records = connection.recv()
+        if records is None:
+            return
+        results = []
+        for record in records:
+            try:
+                results.append(match_record(templates, *record))
+            except Exception:
+                print(f'[CleaningPool]: Error matching item: {record[1]}')
+                print(traceback.format_exc())
+                results.append(None)
+        connection.send(results)
+
+
+class CleaningPool:
+    '''
+    Matches listing modifiers against unique templates in worker processes, sidestepping the GIL when
+    tracking many uniques. Items are sharded by unique name and each worker only compiles the templates of
+    its own shard. Only plain tuples of strings and numbers cross the process boundary. A worker that dies is
+    replaced, and the items it was matching are left uncleaned.
+    '''
+    def __init__(self, uniques_info, num_workers):
+        self.name = 'CleaningPool'
+        self.uniques_info = uniques_info
+        # spawn rather than fork since the parent already runs threads
+        self.context = multiprocessing.get_context('spawn')
+        self.connections = [None] * num_workers
+        self.processes = [None] * num_workers
+        for shard in range(num_workers):
+            self.start_worker(shard)
+
+    def log(self, msg):
+        print(f'[{self.name}]: {msg}')
+
+    def start_worker(self, shard):
+        parent_connection, child_connection = self.context.Pipe()
+        process = self.context.Process(
+            target=run_worker,
+            args=(get_shard_uniques(self.uniques_info, shard, len(self.connections)), child_connection),
+            daemon=True
+        )
+        process.start()
+        # only the worker may hold the other end, so recv raises EOFError once it dies instead of blocking
+        child_connection.close()
+        self.connections[shard] = parent_connection
+        self.processes[shard] = process
+
+    def restart_worker(self, shard):
+        self.log(f'Worker {shard} failed, restarting it')
+        self.log(traceback.format_exc())
+        self.connections[shard].close()
+        if self.processes[shard].is_alive():
+            self.processes[shard].kill()
+        self.processes[shard].join()
+        self.start_worker(shard)
+
+    def match(self, items):
+        '''
+        Returns ({explicit column: value}, {implicit column: value}) for every item, None where the unique has
+        no template or its item could not be matched, in the same order as `items`.
+        '''
+        shards = [[] for _ in self.connections]
+        positions = [[] for _ in self.connections]
+        for position, item in enumerate(items):
+            shard = get_shard(item['name'], len(self.connections))
+            shards[shard].append((
+                item['extended']['category'],
+                item['name'],
+                tuple(item.get('explicitMods', ())),
+                tuple(item.get('implicitMods', ())),
+            ))
+            positions[shard].append(position)
+        sent = []
+        for shard, records in enumerate(shards):
+            if records:
+                try:
+                    self.connections[shard].send(records)
+                    sent.append(shard)
+                except (OSError, ValueError):
+                    self.restart_worker(shard)
+        results = [None] * len(items)
+        for shard in sent:
+            # every send is matched by exactly one recv or a restart, so no reply is left behind for the next call
+            try:
+                shard_results = self.connections[shard].recv()
+            except (EOFError, OSError):
+                self.restart_worker(shard)
+                continue
+            for position, result in zip(positions[shard], shard_results):
+                if result is not None:
+                    results[position] = (unflatten_values(result[0]), unflatten_values(result[1]))
+        return results
+
+    def close(self):
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+        for process in self.processes:
+            process.join()
@@ -1,15 +1,56 @@
-from config.shared import LEAGUE, LEAGUE_CAP
-from config.stashprocessor import CURRENCIES, POE_NINJA_CURRENCY_OVERVIEW_URL, POE_NINJA_LANG
-from datetime import date, datetime, timedelta
-import requests
+from config.shared import LEAGUE_CAP
+from bisect import bisect_right
+from collections import deque
+from config.stashprocessor import CURRENCIES, CURRENCY_KEYS, POE_NINJA_CURRENCY_OVERVIEW_URL, POE_NINJA_LANG, RATE_HISTORY_SIZE, RATE_REFRESH_RETRY_INTERVAL
+from datetime import datetime, timedelta
+from metrics.registry import registry
+from threading import Lock, Thread
+from threads.stashprocessor.httpclient import shared_client
+from threads.stashprocessor.snapshot import load_snapshot, save_snapshot
+import time
+import traceback
+
+
+REFRESH_SECONDS = registry.histogram('ingest_rate_refresh_seconds', 'Time to refresh exchange rates', ('league',))
+REFRESH_FAILURES = registry.counter('ingest_rate_refresh_failures_total', 'Failed exchange rate refreshes', ('league',))
 
 
 class CurrencyExchange:
-    def __init__(self, cache_expiry=timedelta(days=1)):
-        self.name = 'Currency Exchange'
+    def __init__(self, league_name=LEAGUE_CAP, cache_expiry=timedelta(days=1), snapshot_path=None):
+        self.name = f'Currency Exchange {league_name}'
+        self.league_name = league_name
         self.cache_expiry = cache_expiry
+        self.snapshot_path = snapshot_path
         self.last_refresh = datetime.now()
-        self.exchange_rates = self.fetch_exchange_rates()
+        self.next_refresh_attempt = datetime.now()
+        self.refresh_lock = Lock()
+        self.history = deque(maxlen=RATE_HISTORY_SIZE)  # (timestamp, chaos rates) snapshots, oldest first
+        if not self.restore_snapshot():
+            self.refresh_rates()
+
+    def restore_snapshot(self):
+        '''
+        Serves the rates of the last run from their local snapshot so startup does not wait on poe.ninja.
+        Expired rates are refreshed in the background like any others. Returns whether rates were restored.
+        '''
+        if self.snapshot_path is None or (snapshot := load_snapshot(self.snapshot_path, self.league_name)) is None:
+            return False
+        created, rates = snapshot
+        self.exchange_rates = rates['exchange_rates']
+        self.chaos_rates = self.create_chaos_rates(self.exchange_rates)
+        self.history.extend((timestamp, tuple(chaos_rates)) for timestamp, chaos_rates in rates['history'])
+        self.last_refresh = datetime.fromtimestamp(created)
+        return True
+
+    def save_snapshot(self):
+        try:
+            save_snapshot(self.snapshot_path, self.league_name, {
+                'exchange_rates': self.exchange_rates,
+                'history': list(self.history),
+            })
+        except Exception:
+            self.log('Failed to save rates snapshot')
+            self.log(traceback.format_exc())
 
     def flatten_lines(self, lines):
         ret = []
@@ -24,11 +65,10 @@ class CurrencyExchange:
 
     def fetch_exchange_rates(self):
         self.log('Fetching exchange rates')
-        self.last_refresh = datetime.now()
-        response_json = requests.get(
+        response_json = shared_client.get(
             POE_NINJA_CURRENCY_OVERVIEW_URL,
             params={
-                'league': LEAGUE_CAP,
+                'league': self.league_name,
                 'type': 'Currency',
                 'language': POE_NINJA_LANG,
             }
@@ -44,12 +84,60 @@ class CurrencyExchange:
         currencies_chaos_val['chaos'] = 1.0
         return currencies_chaos_val
 
+    def create_chaos_rates(self, exchange_rates):
+        '''
+        Chaos value of every currency in CURRENCY_KEYS order, None where poe.ninja has no rate.
+        '''
+        return tuple(exchange_rates.get(key) for key in CURRENCY_KEYS)
+
+    def refresh_rates(self):
+        with REFRESH_SECONDS.labels(self.league_name).time():
+            exchange_rates = self.fetch_exchange_rates()
+        chaos_rates = self.create_chaos_rates(exchange_rates)
+        self.history.append((time.time(), chaos_rates))
+        self.exchange_rates = exchange_rates
+        self.chaos_rates = chaos_rates
+        self.last_refresh = datetime.now()
+        if self.snapshot_path is not None:
+            self.save_snapshot()
+
+    def revalidate(self):
+        try:
+            self.refresh_rates()
+        except Exception:
+            REFRESH_FAILURES.labels(self.league_name).inc()
+            self.log('Failed to refresh exchange rates, serving last known rates')
+            self.log(traceback.format_exc())
+            self.next_refresh_attempt = datetime.now() + RATE_REFRESH_RETRY_INTERVAL
+        finally:
+            self.refresh_lock.release()
+
+    def refresh_if_expired(self):
+        '''
+        Starts a background refresh once the rates expire. Never blocks: the last known rates keep being
+        served until the refresh succeeds, and failed refreshes are retried after RATE_REFRESH_RETRY_INTERVAL.
+        '''
+        if (
+            self.is_cache_expired() and
+            datetime.now() >= self.next_refresh_attempt and
+            self.refresh_lock.acquire(blocking=False)
+        ):
+            Thread(target=self.revalidate, name=f'{self.name} refresh', daemon=True).start()
+
     def is_cache_expired(self):
         return datetime.now() > (self.last_refresh + self.cache_expiry)
 
+    def get_chaos_rates_at(self, timestamp):
+        '''
+        Returns the chaos rate table that was in force at `timestamp` (seconds since the epoch). Timestamps
+        older than the retained history get the oldest snapshot.
+        '''
+        history = self.history
+        index = bisect_right([snapshot_time for snapshot_time, _ in history], timestamp)
+        return history[max(index - 1, 0)][1]
+
     def get_exchange_rate(self, have, want):
         if have == want:
             return 1.0
-        if self.is_cache_expired():
-            self.exchange_rates = self.fetch_exchange_rates()
+        self.refresh_if_expired()
         return self.exchange_rates[have] / self.exchange_rates[want]
@@ -0,0 +1,37 @@
+class DispatchIndex:
+    '''
+    Routes river items to the subscriber tracking them. Subscribers register a league and the item names they
+    track, and every item is then routed with a single dict lookup on (league, item name), so one pass over
+    the river serves every league. League names are casefolded once per distinct name rather than per item.
+    '''
+    def __init__(self):
+        self.routes = {}  # (casefolded league name, item name) -> subscriber
+        self.league_keys = {}  # league name as seen in the river -> casefolded league name
+
+    def get_league_key(self, league_name):
+        league_key = self.league_keys.get(league_name)
+        if league_key is None:
+            league_key = self.league_keys[league_name] = league_name.casefold()
+        return league_key
+
+    def subscribe(self, league_name, item_names, subscriber):
+        league_key = self.get_league_key(league_name)
+        for item_name in item_names:
+            self.routes[(league_key, item_name)] = subscriber
+
+    def get_item_names(self):
+        '''
+        Returns the names tracked in any league, for pre-filtering stashes before their items are routed.
+        '''
+        return {item_name for _, item_name in self.routes}
+
+    def route(self, item):
+        '''
+        Returns the subscriber of a priced, identified item, or None if no subscriber tracks it.
+        '''
+        if 'note' not in item or not item['identified']:
+            return None
+        return self.routes.get((self.get_league_key(item['league']), item['name']))
+
+    def is_acceptable(self, item):
+        return self.route(item) is not None
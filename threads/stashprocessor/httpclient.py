@@ -0,0 +1,132 @@
+from collections import deque
+from config.stashprocessor import DEFAULT_RATE_LIMITS, HTTP_BACKOFF_FACTOR, HTTP_POOL_SIZE, HTTP_RETRIES, HTTP_TIMEOUT
+from metrics.registry import registry
+from requests.adapters import HTTPAdapter
+from threading import Lock
+from urllib.parse import urlsplit
+from urllib3.util.retry import Retry
+import requests
+import time
+
+
+REQUEST_SECONDS = registry.histogram('ingest_http_request_seconds', 'Time to the response headers of upstream requests', ('host',))
+RESPONSES = registry.counter('ingest_http_responses_total', 'Upstream responses by status code', ('host', 'status'))
+
+
+class RateLimiter:
+    '''
+    Paces requests to a single host. Rules are (max hits, period in seconds) pairs, learnt from the
+    X-Rate-Limit-* response headers the PoE API sends. Requests are spread evenly over each period rather
+    than sent in bursts, and any restriction or Retry-After the server reports blocks the host until it ends.
+    '''
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        self.history = deque()
+        self.blocked_until = 0.0
+        self.lock = Lock()
+
+    def wait_time(self, now):
+        wait = self.blocked_until - now
+        longest_period = max((period for _, period in self.rules), default=0)
+        while self.history and self.history[0] < now - longest_period:
+            self.history.popleft()
+        for max_hits, period in self.rules:
+            if self.history:
+                wait = max(wait, self.history[-1] + period / max_hits - now)
+            hits = [t for t in self.history if t > now - period]
+            if len(hits) >= max_hits:
+                wait = max(wait, hits[-max_hits] + period - now)
+        return wait
+
+    def acquire(self):
+        # sleep without the lock, so a concurrent update() reporting a restriction is seen on the re-check
+        while True:
+            with self.lock:
+                if (wait := self.wait_time(time.time())) <= 0:
+                    self.history.append(time.time())
+                    return
+            time.sleep(wait)
+
+    def parse_rule_values(self, value):
+        return [tuple(float(v) for v in part.split(':')) for part in value.split(',') if part]
+
+    def update(self, response):
+        headers = response.headers
+        now = time.time()
+        with self.lock:
+            if 'X-Rate-Limit-Rules' in headers:
+                rules = []
+                for rule_name in headers['X-Rate-Limit-Rules'].split(','):
+                    limits = self.parse_rule_values(headers.get(f'X-Rate-Limit-{rule_name}', ''))
+                    states = self.parse_rule_values(headers.get(f'X-Rate-Limit-{rule_name}-State', ''))
+                    for (max_hits, period, _), (hits, _, restricted) in zip(limits, states):
+                        rules.append((max_hits, period))
+                        if restricted > 0:
+                            self.blocked_until = max(self.blocked_until, now + restricted)
+                        # server saw more hits than we did (e.g. another process on this IP)
+                        seen = sum(1 for t in self.history if t > now - period)
+                        for _ in range(int(hits) - seen):
+                            self.history.append(now)
+                if rules:
+                    self.rules = rules
+            if response.status_code == 429:
+                retry_after = float(headers.get('Retry-After', 0) or 0)
+                self.blocked_until = max(self.blocked_until, now + max(retry_after, 1.0))
+
+
+class HttpClient:
+    '''
+    Shared HTTP client for all upstream calls. Keeps one pooled keep-alive session per host, negotiates
+    gzip/brotli, retries transient errors with backoff and paces each host by its rate limit headers.
+    '''
+    def __init__(self):
+        self.name = 'HttpClient'
+        self.sessions = {}
+        self.limiters = {}
+        self.lock = Lock()
+
+    def log(self, msg):
+        print(f'[{self.name}]: {msg}')
+
+    def create_session(self):
+        session = requests.Session()
+        retry = Retry(
+            total=HTTP_RETRIES,
+            backoff_factor=HTTP_BACKOFF_FACTOR,
+            status_forcelist=(500, 502, 503, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['Accept-Encoding'] = 'gzip, deflate, br'
+        return session
+
+    def get_host(self, host):
+        with self.lock:
+            if host not in self.sessions:
+                self.sessions[host] = self.create_session()
+                self.limiters[host] = RateLimiter(DEFAULT_RATE_LIMITS.get(host, ()))
+            return self.sessions[host], self.limiters[host]
+
+    def get(self, url, params=None, headers=None, stream=False):
+        host = urlsplit(url).hostname
+        session, limiter = self.get_host(host)
+        for attempt in range(HTTP_RETRIES + 1):
+            limiter.acquire()
+            requested = time.time()
+            with REQUEST_SECONDS.labels(host).time():
+                response = session.get(url, params=params, headers=headers, stream=stream, timeout=HTTP_TIMEOUT)
+            # when the request was sent, so callers can time it without the rate limiter's pacing
+            response.requested = requested
+            RESPONSES.labels(host, str(response.status_code)).inc()
+            limiter.update(response)
+            if response.status_code != 429:
+                break
+            response.close()  # an unread streamed body would keep its pooled connection
+            self.log(f'Rate limited by {host}, waiting {round(limiter.blocked_until - time.time(), 2)}s')
+        response.raise_for_status()
+        return response
+
+
+shared_client = HttpClient()
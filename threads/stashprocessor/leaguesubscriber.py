@@ -0,0 +1,22 @@
+from config.shared import DATA_ROOT
+from config.stashprocessor import RATES_FILE
+from storage.listingsstore import create_listings_store
+from threads.stashprocessor.currencyexchange import CurrencyExchange
+from threads.stashprocessor.listingswriter import ListingsWriter
+from threads.stashprocessor.priceparser import PriceParser
+import os
+
+
+class LeagueSubscriber:
+    '''
+    Per league ingest state: the league's exchange rates and price parser, the uniques tracked in it and the
+    writer persisting its listings to the league's own store.
+    '''
+    def __init__(self, league, league_name, tracking_uniques):
+        self.league = league
+        self.league_name = league_name
+        self.tracking_uniques = set(tracking_uniques)
+        self.currency_exchange = CurrencyExchange(league_name, snapshot_path=os.path.join(DATA_ROOT, league, RATES_FILE))
+        self.price_parser = PriceParser(self.currency_exchange)
+        self.listings_store = create_listings_store(league)
+        self.listings_writer = ListingsWriter(self.listings_store, f'ListingsWriter {league_name}')
@@ -0,0 +1,259 @@
+from config.stashprocessor import WRITE_BATCH_SIZE, WRITE_MAX_INFLIGHT_BYTES, WRITE_MAX_LATENCY, WRITE_RETRY_BACKOFF, WRITE_RETRY_MAX_BACKOFF
+from metrics.registry import registry
+from storage.itemindex import ItemIndex
+from storage.listingsbuffer import ListingsBuffer
+from threading import Condition, Thread
+import time
+import traceback
+
+
+WRITE_SECONDS = registry.histogram('ingest_store_write_seconds', 'Time to write a batch to the listings store', ('writer',))
+WRITTEN = registry.counter('ingest_written_listings_total', 'Listings and delistings written', ('writer',))
+WRITE_FAILURES = registry.counter('ingest_store_write_failures_total', 'Failed listings store writes', ('writer',))
+
+
+class WriterStats:
+    def __init__(self):
+        self.flushes = 0
+        self.failures = 0
+        self.listings = 0
+        self.flush_time = 0.0
+        self.last_flush_time = 0.0
+        self.last_batch_size = 0
+
+    def record(self, batch_size, duration):
+        self.flushes += 1
+        self.listings += batch_size
+        self.flush_time += duration
+        self.last_flush_time = duration
+        self.last_batch_size = batch_size
+
+
+def get_listing_size(item_id, num_mods):
+    # rough in-memory size: float columns, the id and a corrupted flag
+    return 8 * (6 + num_mods) + len(item_id) + 1
+
+
+class WriteBatch:
+    def __init__(self):
+        self.buffers = {}  # item name -> ListingsBuffer
+        self.delistings = {}  # item name -> {item id: delisted time} of listings not in `buffers`
+        self.count = 0
+        self.nbytes = 0
+        self.oldest = None
+
+    def __bool__(self):
+        return bool(self.buffers or self.delistings)
+
+    def get_item_names(self):
+        return list(self.buffers.keys() | self.delistings.keys())
+
+    def add(self, item_name, cleaned_item, size):
+        if (buffer := self.buffers.get(item_name)) is None:
+            buffer = self.buffers[item_name] = ListingsBuffer(cleaned_item.template)
+        if self.delistings.get(item_name, {}).pop(cleaned_item.id, None) is not None:
+            self.count -= 1  # relisted before the delisting was written
+        if cleaned_item.id not in buffer.rows:
+            self.nbytes += size  # a relisted id reuses its row
+        self.count -= len(buffer)
+        buffer.add(cleaned_item)
+        self.count += len(buffer)
+        if self.oldest is None:
+            self.oldest = time.time()
+
+    def add_listings(self, item_name, listings):
+        if (buffer := self.buffers.get(item_name)) is None:
+            buffer = self.buffers[item_name] = ListingsBuffer()
+        self.count -= len(buffer)
+        for item_id, listing in listings.items():
+            if item_id not in buffer.rows:
+                num_mods = len(listing.get('explicitMods', [])) + len(listing.get('implicitMods', []))
+                self.nbytes += get_listing_size(item_id, num_mods)
+            buffer.add_listing(item_id, listing)
+        self.count += len(buffer)
+        if self.oldest is None:
+            self.oldest = time.time()
+
+    def delist(self, item_name, item_id, timestamp):
+        if (buffer := self.buffers.get(item_name)) is not None and buffer.delist(item_id, timestamp):
+            return
+        item_delistings = self.delistings.setdefault(item_name, {})
+        if item_id not in item_delistings:
+            self.count += 1
+            self.nbytes += len(item_id) + 8
+        item_delistings[item_id] = timestamp
+        if self.oldest is None:
+            self.oldest = time.time()
+
+
+class ListingsWriter(Thread):
+    '''
+    Write-behind buffer for cleaned listings. Listings of every unique are collected into columnar
+    ListingsBuffers and written to the listings store in one call once it reaches WRITE_BATCH_SIZE listings or its oldest
+    listing has waited WRITE_MAX_LATENCY seconds. Delistings of listings that are not buffered any more are
+    written along with them. Writes run on this thread and failed writes are retried with exponential
+    backoff. `add` only blocks once WRITE_MAX_INFLIGHT_BYTES of listings are waiting.
+    '''
+    def __init__(self, listings_store, name='ListingsWriter'):
+        super().__init__()
+        self.name = name
+        self.listings_store = listings_store
+        self.item_index = ItemIndex(listings_store.read_item_index())
+        self.on_write = None  # called with the written item names after every successful write
+        self.pending = WriteBatch()
+        self.inflight = []  # batches taken for writing that have not been written yet
+        self.inflight_bytes = 0
+        self.condition = Condition()
+        self.stopped = False
+        self.stats = WriterStats()
+        self.setDaemon(True)
+
+    def log(self, msg):
+        print(f'[{self.name}]: {msg}')
+
+    def add(self, item_name, cleaned_item):
+        size = get_listing_size(cleaned_item.id, len(cleaned_item.explicit) + len(cleaned_item.implicit))
+        with self.condition:
+            while self.pending.nbytes + self.inflight_bytes + size > WRITE_MAX_INFLIGHT_BYTES and self.pending:
+                self.condition.wait()
+            self.pending.add(item_name, cleaned_item, size)
+            if self.pending.count >= WRITE_BATCH_SIZE:
+                self.condition.notify_all()
+
+    def delist(self, item_name, item_id, timestamp):
+        '''
+        Marks a listing as delisted at `timestamp`. Never blocks.
+        '''
+        with self.condition:
+            self.pending.delist(item_name, item_id, timestamp)
+            if self.pending.count >= WRITE_BATCH_SIZE:
+                self.condition.notify_all()
+
+    def restore(self, listings, delistings):
+        '''
+        Queues {item name: {item id: listing}} in the stored dict form and {item name: {item id: delisted time}}
+        for writing, e.g. the ones recovered from a checkpoint. Never blocks.
+        '''
+        with self.condition:
+            for item_name, item_listings in listings.items():
+                self.pending.add_listings(item_name, item_listings)
+            for item_name, item_delistings in delistings.items():
+                for item_id, timestamp in item_delistings.items():
+                    self.pending.delist(item_name, item_id, timestamp)
+            self.condition.notify_all()
+
+    def snapshot(self):
+        '''
+        Returns everything not written yet, pending or in flight, as ({item name: {item id: listing}},
+        {item name: {item id: delisted time}}).
+        '''
+        with self.condition:
+            listings = {}
+            delistings = {}
+            for batch in self.inflight + [self.pending]:
+                for item_name, buffer in batch.buffers.items():
+                    listings.setdefault(item_name, {}).update(buffer.to_listings())
+                for item_name, item_delistings in batch.delistings.items():
+                    delistings.setdefault(item_name, {}).update(item_delistings)
+            return listings, delistings
+
+    def take_pending(self):
+        batch = self.pending
+        self.pending = WriteBatch()
+        self.inflight.append(batch)
+        self.inflight_bytes += batch.nbytes
+        return batch
+
+    def release(self, batch):
+        with self.condition:
+            self.inflight = [inflight for inflight in self.inflight if inflight is not batch]
+            self.inflight_bytes -= batch.nbytes
+            self.condition.notify_all()
+
+    def take_batch(self):
+        '''
+        Waits for the next batch to write. Returns None once the writer is stopped.
+        '''
+        with self.condition:
+            while True:
+                if self.stopped:
+                    return None
+                if self.pending:
+                    deadline = self.pending.oldest + WRITE_MAX_LATENCY
+                    if self.pending.count >= WRITE_BATCH_SIZE or time.time() >= deadline:
+                        break
+                    self.condition.wait(deadline - time.time())
+                else:
+                    self.condition.wait()
+            return self.take_pending()
+
+    def write(self, batch):
+        listings = {item_name: buffer.to_listings() for item_name, buffer in batch.buffers.items()}
+        delistings = {item_name: item_delistings for item_name, item_delistings in batch.delistings.items() if item_delistings}
+        index_entries = None
+        backoff = WRITE_RETRY_BACKOFF
+        while True:
+            start = time.time()
+            try:
+                if index_entries is None:
+                    index_entries = {
+                        item_name: self.item_index.update(
+                            item_name, batch.buffers.get(item_name), delistings.get(item_name, {})
+                        )
+                    for item_name in batch.get_item_names()}
+                self.listings_store.write_listings(listings)
+                if delistings:
+                    self.listings_store.write_delistings(delistings)
+                self.listings_store.write_item_index(index_entries)
+                self.stats.record(batch.count, time.time() - start)
+                WRITE_SECONDS.labels(self.name).observe(time.time() - start)
+                WRITTEN.labels(self.name).inc(batch.count)
+                if self.on_write is not None:
+                    self.on_write(batch.get_item_names())
+                return
+            except Exception:
+                self.stats.failures += 1
+                WRITE_FAILURES.labels(self.name).inc()
+                self.log(f'Failed to write {batch.count} listings, retrying in {backoff}s')
+                self.log(traceback.format_exc())
+                time.sleep(backoff)
+                backoff = min(backoff * 2, WRITE_RETRY_MAX_BACKOFF)
+
+    def stop(self, timeout=None):
+        '''
+        Stops the writer thread once its current write is done and waits up to `timeout` seconds for it.
+        Anything not written stays pending, for a `flush` or a checkpoint.
+        '''
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.is_alive():
+            self.join(timeout)
+
+    def flush(self):
+        '''
+        Writes everything pending right away, on the calling thread. Only call this once the writer thread is
+        stopped or was never started, the item index is not shared between threads.
+        '''
+        with self.condition:
+            batch = self.take_pending()
+        try:
+            if batch:
+                self.write(batch)
+        finally:
+            self.release(batch)
+
+    def report(self):
+        average = self.stats.flush_time / self.stats.flushes if self.stats.flushes else 0.0
+        return (
+            f'{self.name}: pending={self.pending.count} inflight={self.inflight_bytes}B flushes={self.stats.flushes} '
+            f'failures={self.stats.failures} last_batch={self.stats.last_batch_size} '
+            f'last_flush={round(self.stats.last_flush_time * 1000, 2)}ms avg_flush={round(average * 1000, 2)}ms'
+        )
+
+    def run(self):
+        while (batch := self.take_batch()) is not None:
+            try:
+                self.write(batch)
+            finally:
+                self.release(batch)
@@ -0,0 +1,124 @@
+import re
+
+
+# matches constants and ranges in 4 groups:
+# 1. sign (optional)
+# 2. ignore
+# 3. lower number (possibly a negative number)
+# 4. upper number (optional)
+RANGE_PATTERN = re.compile(r'([+-]?)(\()?([+-]?\d+(?:\.\d+)?)(?(2)-(\d+(?:\.\d+)?)|(?!\)))')
+VALUE_PATTERN = r'([+-]?\d+(?:\.\d+)?)'
+
+
+def get_columns(modifiers):
+    '''
+    Column name of every non-constant modifier, hybrid modifier lines joined into one.
+    '''
+    return [modifier['text'].replace('\n', ' ') for modifier in modifiers if not modifier['constant']]
+
+
+class ModifierTemplate:
+    '''
+    Compiled form of one unique's modifier list (explicit or implicit). Every non-constant modifier gets a
+    listing pattern with a capture group per number in its template text, and all patterns are combined
+    into one alternation so each listing line is identified with a single match. Lines may come in any
+    order and missing lines simply produce no value. Hybrid modifiers are one multi-line text on poe.ninja
+    but a line each on listings, so every line gets its own pattern and their values are summed into the
+    modifier's column.
+    '''
+    def __init__(self, modifiers):
+        self.constant_mask = [modifier['constant'] for modifier in modifiers]
+        self.columns = get_columns(modifiers)
+        self.alternative_columns = []  # column of each alternative
+        self.value_groups = []  # (first, last) capture group of each alternative's values
+        alternatives = []
+        group = 1
+        for column, modifier in enumerate(modifier for modifier in modifiers if not modifier['constant']):
+            for line in modifier['text'].split('\n'):
+                pattern, num_values = self.compile_modifier(line)
+                self.alternative_columns.append(column)
+                self.value_groups.append((group + 1, group + num_values))
+                alternatives.append(f'({pattern})')
+                group += num_values + 1
+        self.group_alternatives = {first - 1: alternative for alternative, (first, _) in enumerate(self.value_groups)}
+        self.pattern = re.compile('|'.join(alternatives)) if alternatives else None
+        self.alternative_patterns = [re.compile(alternative) for alternative in alternatives]
+
+    def compile_modifier(self, text):
+        parts = []
+        last = 0
+        num_values = 0
+        for match in RANGE_PATTERN.finditer(text):
+            parts.append(self.escape(text[last:match.start()]))
+            parts.append(VALUE_PATTERN)
+            last = match.end()
+            if match.group(2) and text.startswith(')', last):
+                last += 1  # the range pattern stops short of the closing bracket
+            num_values += 1
+        parts.append(self.escape(text[last:]))
+        return ''.join(parts), num_values
+
+    def escape(self, text):
+        return r'\s+'.join(re.escape(word) for word in re.split(r'\s+', text))
+
+    def sum_values(self, match, alternative, offset=0):
+        first, last = self.value_groups[alternative]
+        return sum(float(match.group(i - offset)) for i in range(first, last + 1))
+
+    def match(self, item_mods):
+        '''
+        Matches a listing's modifier lines against the template. Returns {column index: value} where the
+        value is the sum of the numbers on the modifier's lines, as the price/mod scatter plots expect.
+        '''
+        values = {}
+        if self.pattern is None:
+            return values
+        claimed = set()
+        for line in item_mods:
+            match = self.pattern.fullmatch(line)
+            if match is None:
+                continue
+            alternative = self.group_alternatives[match.lastindex]
+            offset = 0
+            if alternative in claimed:
+                # the combined pattern picked a line that is already matched, try the others one by one
+                alternative = self.match_unclaimed(line, claimed)
+                if alternative is None:
+                    continue
+                match = self.alternative_patterns[alternative].fullmatch(line)
+                offset = self.value_groups[alternative][0] - 2
+            claimed.add(alternative)
+            column = self.alternative_columns[alternative]
+            values[column] = values.get(column, 0.0) + self.sum_values(match, alternative, offset)
+        return values
+
+    def match_unclaimed(self, line, claimed):
+        for alternative, pattern in enumerate(self.alternative_patterns):
+            if alternative not in claimed and pattern.fullmatch(line):
+                return alternative
+        return None
+
+
+class UniqueTemplate:
+    def __init__(self, item_info):
+        self.name = item_info['name']
+        self.explicit = ModifierTemplate(item_info['explicitModifiers'])
+        self.implicit = ModifierTemplate(item_info['implicitModifiers'])
+
+
+class ModifierColumns:
+    '''
+    The columns of a modifier list without the patterns to match it, for listings matched elsewhere.
+    '''
+    def __init__(self, modifiers):
+        self.columns = get_columns(modifiers)
+
+
+class UniqueColumns:
+    '''
+    Stands in for a UniqueTemplate where listings are only buffered, like the ones the cleaning pool matched.
+    '''
+    def __init__(self, item_info):
+        self.name = item_info['name']
+        self.explicit = ModifierColumns(item_info['explicitModifiers'])
+        self.implicit = ModifierColumns(item_info['implicitModifiers'])
@@ -0,0 +1,71 @@
+from threading import Thread
+import queue
+import time
+import traceback
+
+
+class StageStats:
+    def __init__(self):
+        self.started = time.time()
+        self.jobs = 0
+        self.busy_time = 0.0
+
+    def record(self, duration):
+        self.jobs += 1
+        self.busy_time += duration
+
+    def throughput(self):
+        elapsed = time.time() - self.started
+        return self.jobs / elapsed if elapsed > 0 else 0.0
+
+    def utilisation(self):
+        elapsed = time.time() - self.started
+        return self.busy_time / elapsed if elapsed > 0 else 0.0
+
+
+class Stage(Thread):
+    '''
+    A single pipeline stage. Pulls jobs from `inbox` (or generates them if it is a source stage), runs
+    `work` on each, and pushes non-None results to `outbox`. Queues are bounded so a slow downstream
+    stage applies back-pressure to the stages before it.
+    '''
+    def __init__(self, name, work, inbox=None, outbox=None):
+        super().__init__()
+        self.name = name
+        self.work = work
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stats = StageStats()
+        self.setDaemon(True)
+
+    def log(self, msg):
+        print(f'[{self.name}]: {msg}')
+
+    def queue_depth(self):
+        if self.inbox is None:
+            return 0
+        return self.inbox.qsize()
+
+    def report(self):
+        depth = f'{self.queue_depth()}/{self.inbox.maxsize}' if self.inbox is not None else '-'
+        return (
+            f'{self.name}: queue={depth} jobs={self.stats.jobs} '
+            f'rate={round(self.stats.throughput(), 2)}/s busy={round(self.stats.utilisation() * 100, 1)}%'
+        )
+
+    def run(self):
+        while True:
+            job = self.inbox.get() if self.inbox is not None else None
+            start = time.time()
+            try:
+                result = self.work(job)
+            except Exception:
+                self.log(traceback.format_exc())
+                result = None
+            self.stats.record(time.time() - start)
+            if result is not None and self.outbox is not None:
+                self.outbox.put(result)
+
+
+def create_queue(maxsize):
+    return queue.Queue(maxsize=maxsize)
@@ -0,0 +1,68 @@
+from config.stashprocessor import CURRENCY_ALIASES, CURRENCY_KEYS, PRICE_NOTE_CACHE_SIZE
+from functools import lru_cache
+import re
+
+
+CURRENCY_INDEX = {key: index for index, key in enumerate(CURRENCY_KEYS)}
+CURRENCY_INDEX.update({alias: CURRENCY_INDEX[key] for alias, key in CURRENCY_ALIASES.items()})
+
+
+class PriceParser:
+    '''
+    Turns price notes into chaos values. Notes repeat a lot, so parsed (amount, currency index) pairs are kept
+    in a bounded LRU cache and the per-listing cost is a cache hit plus a multiply by the exchange's chaos
+    rate table. The table is replaced as a whole on every rate refresh, so readers never see a partial update.
+    '''
+    NOTE_PATTERN = re.compile(r'~(?:price|b/o)\s+(\d*\.?\d+)(?:/(\d*\.?\d+))?\s+([\w-]+)\s*')
+
+    def __init__(self, currency_exchange):
+        self.currency_exchange = currency_exchange
+        self.parse_note = lru_cache(maxsize=PRICE_NOTE_CACHE_SIZE)(self.parse_note_uncached)
+
+    def parse_note_uncached(self, note):
+        '''
+        Parses '~b/o 1 exa', '~price 2.5 chaos', '~price .5 div' or fractional '~price 1/2 exa' notes. Returns
+        (amount, currency index) or None if the note is not a recognised price.
+        '''
+        match = self.NOTE_PATTERN.fullmatch(note)
+        if match is None:
+            return None
+        numerator, denominator, currency = match.groups()
+        amount = float(numerator)
+        if denominator is not None:
+            if float(denominator) == 0:
+                return None
+            amount /= float(denominator)
+        currency_index = CURRENCY_INDEX.get(currency)
+        if currency_index is None:
+            return None
+        return amount, currency_index
+
+    def to_chaos(self, amount, currency_index, chaos_rates):
+        rate = chaos_rates[currency_index]
+        if rate is None:
+            return None
+        return round(amount * rate, 2)
+
+    def get_price(self, note):
+        '''
+        Returns the note's price in chaos at the current rates, or None if the note or its currency rate is unknown.
+        '''
+        parsed = self.parse_note(note)
+        if parsed is None:
+            return None
+        amount, currency_index = parsed
+        return self.to_chaos(amount, currency_index, self.currency_exchange.chaos_rates)
+
+    def renormalize(self, listings, timestamp=None):
+        '''
+        Recomputes the chaos price of cleaned listings in place from their original amount and currency. Each
+        listing is converted at the rates in force when it was seen, or at the rates in force at `timestamp`
+        if given. Listings recorded before amounts were kept are left untouched.
+        '''
+        for listing in listings:
+            if 'amount' not in listing or listing['currency'] not in CURRENCY_INDEX:
+                continue
+            chaos_rates = self.currency_exchange.get_chaos_rates_at(timestamp if timestamp is not None else listing['seen'])
+            if (price := self.to_chaos(listing['amount'], CURRENCY_INDEX[listing['currency']], chaos_rates)) is not None:
+                listing['price'] = price
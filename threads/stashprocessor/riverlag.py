@@ -0,0 +1,86 @@
+from collections import deque
+from config.stashprocessor import CATCH_UP_MAX_LAG_PAGES, CATCH_UP_MIN_LAG_PAGES, LAG_CHECK_INTERVAL, LAG_OVERRUN_CHECK_INTERVAL, PAGE_ADVANCE_WINDOW
+from itertools import zip_longest
+import time
+
+
+def parse_change_id(change_id):
+    return [int(position) for position in change_id.split('-')]
+
+
+def get_change_id_distance(change_id, later_change_id):
+    '''
+    Change ids are '-' joined positions in each of the river's shards, so the distance between two of them
+    is the summed distance of their shards. Shards added in between count from zero.
+    '''
+    return sum(
+        max(later - earlier, 0)
+    for earlier, later in zip_longest(parse_change_id(change_id), parse_change_id(later_change_id), fillvalue=0))
+
+
+class RiverLag:
+    '''
+    Tracks how far the ingested change id is behind the river head. The head is only looked up every
+    LAG_CHECK_INTERVAL seconds, in between the lag is reduced by the distance each page advanced. Lag is
+    converted to pages with the average advance of the last PAGE_ADVANCE_WINDOW pages.
+    '''
+    def __init__(self, change_id=None):
+        self.change_id = change_id
+        self.head_change_id = change_id
+        self.lag = 0
+        self.checked = 0.0  # check after the first page, which may have been resumed from far behind
+        self.page_advances = deque(maxlen=PAGE_ADVANCE_WINDOW)
+        self.pages_skipped = 0
+        self.head_skips = 0
+
+    def advance(self, next_change_id):
+        if self.change_id is not None and next_change_id is not None:
+            distance = get_change_id_distance(self.change_id, next_change_id)
+            self.page_advances.append(distance)
+            self.lag = max(self.lag - distance, 0)
+        self.change_id = next_change_id
+
+    def rewind(self, change_id):
+        '''
+        Goes back to an earlier change id without counting it as a page advance.
+        '''
+        if self.change_id is not None and change_id is not None:
+            self.lag += get_change_id_distance(change_id, self.change_id)
+        self.change_id = change_id
+
+    def update_head(self, head_change_id):
+        self.head_change_id = head_change_id
+        self.lag = get_change_id_distance(self.change_id, head_change_id) if self.change_id is not None else 0
+        self.checked = time.time()
+
+    def is_check_due(self, overrun=False):
+        '''
+        Whether to look up the head again. Slow fetches check sooner, as ingest may be falling behind.
+        '''
+        return time.time() - self.checked >= (LAG_OVERRUN_CHECK_INTERVAL if overrun else LAG_CHECK_INTERVAL)
+
+    def get_lag_pages(self):
+        page_advance = sum(self.page_advances) / len(self.page_advances) if self.page_advances else 0
+        return self.lag / page_advance if page_advance > 0 else 0.0
+
+    def is_catching_up(self):
+        return self.get_lag_pages() > CATCH_UP_MIN_LAG_PAGES
+
+    def is_too_far_behind(self):
+        return self.get_lag_pages() > CATCH_UP_MAX_LAG_PAGES
+
+    def skip_to_head(self):
+        '''
+        Gives up on the backlog. Returns the head change id to continue from.
+        '''
+        self.pages_skipped += round(self.get_lag_pages())
+        self.head_skips += 1
+        self.change_id = self.head_change_id
+        self.lag = 0
+        return self.change_id
+
+    def report(self):
+        return (
+            f'RiverLag: lag={self.lag} (~{round(self.get_lag_pages(), 1)} pages) catching_up={self.is_catching_up()} '
+            f'pages_skipped={self.pages_skipped} head_skips={self.head_skips}'
+        )
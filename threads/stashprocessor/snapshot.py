@@ -0,0 +1,121 @@
+from threading import Lock, Thread
+import json
+import os
+import struct
+import time
+import traceback
+import zlib
+
+
+SNAPSHOT_MAGIC = b'PMAS'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<4sHdH')  # magic, format version, created time, key length
+
+
+def save_snapshot(path, key, value):
+    '''
+    Saves a JSON-serializable value as a snapshot: a fixed header, the key and the zlib-compressed value. The
+    snapshot is written to a temporary file first and renamed into place, so a crash mid-save leaves the
+    previous snapshot intact.
+    '''
+    encoded_key = key.encode()
+    payload = zlib.compress(json.dumps(value, separators=(',', ':')).encode())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, time.time(), len(encoded_key)))
+        f.write(encoded_key)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path, key):
+    '''
+    Returns (created time, value) of the snapshot at `path`, or None if there is none or it was saved in
+    another format version or under another key.
+    '''
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, created, key_length = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            return None
+        start = SNAPSHOT_HEADER.size
+        if data[start:start + key_length].decode() != key:
+            return None
+        return created, json.loads(zlib.decompress(data[start + key_length:]))
+    except (OSError, ValueError, struct.error, zlib.error):
+        return None
+
+
+class SnapshotCache:
+    '''
+    Serves a value from its local snapshot so startup does not wait on remote reads. Only a missing or
+    invalid snapshot is fetched in the foreground, a snapshot older than `max_age` is served as is while
+    `fetch` runs in the background, and the fresh value is saved and handed to `on_update` together with the
+    value it replaces. The key identifies what the value was fetched for, e.g. the league, and a snapshot
+    saved under another key is ignored.
+    '''
+    def __init__(self, name, path, key, fetch, max_age, on_update=None):
+        self.name = name
+        self.path = path
+        self.key = key
+        self.fetch = fetch
+        self.max_age = max_age
+        self.on_update = on_update
+        self.value = None
+        self.revalidate_lock = Lock()
+
+    def log(self, msg):
+        print(f'[{self.name}]: {msg}')
+
+    def get(self):
+        value = self.load()
+        if value is None:
+            self.log('No usable snapshot, fetching')
+            value = self.fetch()
+            self.store(value)
+        return value
+
+    def load(self):
+        '''
+        Returns the snapshot's value, or None if there is no usable snapshot. A stale snapshot starts a
+        background revalidation.
+        '''
+        snapshot = load_snapshot(self.path, self.key)
+        if snapshot is None:
+            return None
+        created, self.value = snapshot
+        if time.time() - created > self.max_age.total_seconds():
+            self.revalidate_in_background()
+        return self.value
+
+    def store(self, value):
+        self.value = value
+        self.save(value)
+
+    def save(self, value):
+        try:
+            save_snapshot(self.path, self.key, value)
+        except Exception:
+            self.log('Failed to save snapshot')
+            self.log(traceback.format_exc())
+
+    def revalidate_in_background(self):
+        if self.revalidate_lock.acquire(blocking=False):
+            Thread(target=self.revalidate, name=f'{self.name} revalidate', daemon=True).start()
+
+    def revalidate(self):
+        try:
+            value = self.fetch()
+            self.save(value)
+            previous, self.value = self.value, value
+            if self.on_update is not None:
+                self.on_update(value, previous)
+        except Exception:
+            self.log('Failed to revalidate, serving the snapshot')
+            self.log(traceback.format_exc())
+        finally:
+            self.revalidate_lock.release()
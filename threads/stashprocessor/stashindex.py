@@ -0,0 +1,44 @@
+from collections import OrderedDict
+from config.stashprocessor import STASH_INDEX_MAX_STASHES
+
+
+class StashIndex:
+    '''
+    The tracked listings every stash held when it was last seen. The river always sends a stash's full
+    contents, so listings missing from its new contents were sold or taken down. Only stashes holding tracked
+    listings are indexed, and past STASH_INDEX_MAX_STASHES the least recently updated stash is evicted, which
+    bounds memory at the cost of no longer noticing when that stash's listings go.
+    '''
+    def __init__(self, max_stashes=STASH_INDEX_MAX_STASHES):
+        self.max_stashes = max_stashes
+        self.stashes = OrderedDict()  # stash id -> {item id: (subscriber, item name)}
+        self.item_stashes = {}  # item id -> id of the stash it was last seen in
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.stashes)
+
+    def remove(self, stash_id):
+        listings = self.stashes.pop(stash_id, None) or {}
+        for item_id in listings:
+            if self.item_stashes.get(item_id) == stash_id:
+                del self.item_stashes[item_id]
+        return listings
+
+    def update(self, stash_id, listings):
+        '''
+        Replaces a stash's {item id: (subscriber, item name)} listings. Returns (subscriber, item name, item id)
+        of the listings that are gone, leaving out items that were moved to another stash.
+        '''
+        previous = self.remove(stash_id)
+        if listings:
+            self.stashes[stash_id] = listings
+            for item_id in listings:
+                self.item_stashes[item_id] = stash_id
+            while len(self.stashes) > self.max_stashes:
+                self.remove(next(iter(self.stashes)))
+                self.evictions += 1
+        return [
+            (subscriber, item_name, item_id)
+        for item_id, (subscriber, item_name) in previous.items()
+            if item_id not in listings and item_id not in self.item_stashes]
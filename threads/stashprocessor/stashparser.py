@@ -0,0 +1,159 @@
+import codecs
+import json
+import re
+
+
+def iter_stash_items(stash):
+    '''
+    Returns a stash's items. Items without a note of their own inherit the stash tab's name when it is a price,
+    which is how the game prices a whole tab.
+    '''
+    stash_note = stash.get('stash') or ''
+    if stash_note.startswith('~'):
+        for item in stash['items']:
+            item.setdefault('note', stash_note)
+    return stash['items']
+
+
+class _ChunkBuffer:
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.text = ''
+        self.exhausted = False
+
+    def read_more(self):
+        try:
+            self.text += next(self.chunks)
+            return True
+        except StopIteration:
+            self.exhausted = True
+            return False
+
+    def discard(self, pos):
+        self.text = self.text[pos:]
+
+
+class StashStreamParser:
+    '''
+    Incremental parser for public stash tab pages. Reads the response body chunk by chunk and only decodes
+    stashes whose raw text mentions one of the tracked item names; every other stash is skipped without
+    building any Python objects beyond its id. Decoded items are then checked against `is_acceptable`, so only
+    passing items are returned. Peak memory is bounded by the largest single stash rather than the whole page.
+    '''
+    CHANGE_ID_PATTERN = re.compile(r'"next_change_id"\s*:\s*"([^"]*)"')
+    STASHES_PATTERN = re.compile(r'"stashes"\s*:\s*\[\s*')
+    # An unescaped quote cannot occur inside a JSON string, so this only matches real stash objects. If the
+    # key order ever changes the parser is still correct, it just decodes every stash.
+    STASH_START_PATTERN = re.compile(r'\{"id"\s*:\s*"([0-9a-fA-F]+)"\s*,\s*"public"\s*:')
+    SEPARATOR_PATTERN = re.compile(r'\s*,?\s*')
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, item_names, is_acceptable):
+        self.decoder = json.JSONDecoder()
+        self.is_acceptable = is_acceptable
+        self.set_item_names(item_names)
+
+    def set_item_names(self, item_names):
+        names = '|'.join(re.escape(json.dumps(name, ensure_ascii=False)[1:-1]) for name in item_names)
+        self.name_pattern = re.compile(f'"name"\\s*:\\s*"(?:{names})"')
+
+    def iter_text(self, response):
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+            if text := decoder.decode(chunk):
+                yield text
+        if text := decoder.decode(b'', final=True):
+            yield text
+
+    def parse(self, response):
+        '''
+        Parses a streamed `requests` response. Returns (next_change_id, stashes) with a (stash id, accepted
+        items) tuple for every stash on the page.
+        '''
+        return self.parse_chunks(self.iter_text(response))
+
+    def parse_deferred(self, response):
+        '''
+        Reads a streamed response only as far as its next change id. Returns (next_change_id, finish), where
+        finish() parses the rest of the body, so the next page can be requested
+        while this one is still streaming in. finish() returns the stashes like `parse`. Pages that only send the change id after their stashes are
+        parsed in full before returning.
+        '''
+        buf, pos, next_change_id = self.read_header(self.iter_text(response))
+        if next_change_id is None:
+            stashes, pos = self.read_stashes(buf, pos)
+            next_change_id = self.read_trailer(buf, pos)
+            return next_change_id, lambda: stashes
+        return next_change_id, lambda: self.read_stashes(buf, pos)[0]
+
+    def parse_chunks(self, chunks):
+        buf, pos, next_change_id = self.read_header(chunks)
+        stashes, pos = self.read_stashes(buf, pos)
+        if next_change_id is None:
+            next_change_id = self.read_trailer(buf, pos)
+        return next_change_id, stashes
+
+    def read_header(self, chunks):
+        '''
+        Reads just far enough to find the start of the stashes array. Returns (buffer, position of the first
+        stash, next change id or None if it comes after the stashes).
+        '''
+        buf = _ChunkBuffer(chunks)
+        while (match := self.STASHES_PATTERN.search(buf.text)) is None:
+            if not buf.read_more():
+                raise ValueError('Malformed stash page: no stashes array')
+        next_change_id = None
+        if change_id_match := self.CHANGE_ID_PATTERN.search(buf.text, 0, match.start()):
+            next_change_id = change_id_match.group(1)
+        return buf, match.end(), next_change_id
+
+    def read_stashes(self, buf, pos):
+        stashes = []
+        scan_from = pos + 1
+        while True:
+            if pos >= len(buf.text) and not buf.read_more():
+                raise ValueError('Malformed stash page: truncated stashes array')
+            if buf.text[pos] == ']':
+                break
+            next_stash = self.STASH_START_PATTERN.search(buf.text, max(pos + 1, scan_from))
+            if next_stash is None and not buf.exhausted:
+                scan_from = max(pos + 1, len(buf.text) - 256)  # the pattern may straddle a chunk boundary
+                buf.read_more()
+                continue
+            end = next_stash.start() if next_stash is not None else len(buf.text)
+            if (
+                self.name_pattern.search(buf.text, pos, end) is None and
+                (stash_start := self.STASH_START_PATTERN.match(buf.text, pos)) is not None
+            ):
+                stashes.append((stash_start.group(1), []))
+                if next_stash is None:
+                    # skipped the last stash, whose text runs on into the page trailer, so the trailer is
+                    # searched from the start of the stash
+                    break
+                pos = end  # no tracked names anywhere in this stash, skip it without decoding
+            else:
+                stash, pos = self.decode_stash(buf, pos)
+                stashes.append((stash['id'], list(filter(self.is_acceptable, iter_stash_items(stash)))))
+            if pos > self.CHUNK_SIZE:
+                buf.discard(pos)
+                pos = 0
+            if pos < len(buf.text):
+                pos = self.SEPARATOR_PATTERN.match(buf.text, pos).end()
+            scan_from = pos + 1
+        return stashes, pos
+
+    def read_trailer(self, buf, pos):
+        while buf.read_more():
+            pass
+        if change_id_match := self.CHANGE_ID_PATTERN.search(buf.text, pos):
+            return change_id_match.group(1)
+        return None
+
+    def decode_stash(self, buf, pos):
+        while True:
+            try:
+                return self.decoder.raw_decode(buf.text, pos)
+            except json.JSONDecodeError:
+                # the stash is not fully buffered yet
+                if not buf.read_more():
+                    raise
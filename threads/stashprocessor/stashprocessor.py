@@ -1,36 +1,91 @@
+from metrics.registry import registry
 from pyrebase.pyrebase import Firebase
 from threads.stashprocessor.uniquesinfosvc import UniquesInfoSvc
-from threads.stashprocessor.currencyexchange import CurrencyExchange
-from threads.stashprocessor.structs import Item, ItemUse
-from config.shared import DEFAULT_POE_HEADERS, FIREBASE_CONFIG, LEAGUE
-from config.stashprocessor import DUMP_THRESHOLD, NUM_TRACKING_UNIQUES, POE_NINJA_BUILD_OVERVIEW_URL, POE_NINJA_LADDER, POE_NINJA_LANG, POE_NINJA_STATS_URL, PUBLIC_STASH_URL, UNIQUES_BLACKLIST
-from threading import Thread
-import requests
+from threads.stashprocessor.bootstrap import bootstrap_pool
+from threads.stashprocessor.checkpoint import load_checkpoint, save_checkpoint
+from threads.stashprocessor.cleaningpool import CleaningPool
+from threads.stashprocessor.dispatchindex import DispatchIndex
+from threads.stashprocessor.httpclient import shared_client
+from threads.stashprocessor.leaguesubscriber import LeagueSubscriber
+from threads.stashprocessor.pipeline import Stage, create_queue
+from threads.stashprocessor.riverlag import RiverLag
+from threads.stashprocessor.snapshot import SnapshotCache
+from threads.stashprocessor.stashindex import StashIndex
+from threads.stashprocessor.stashparser import StashStreamParser, iter_stash_items
+from threads.stashprocessor.structs import CleanedItem, Item, ItemUse
+from config.shared import DATA_ROOT, DEFAULT_POE_HEADERS, FIREBASE_CONFIG, LEAGUES
+from config.stashprocessor import CATCH_UP_CONCURRENCY, CHECKPOINT_INTERVAL, CLEANING_POOL_WORKERS, FETCH_OVERRUN_TIME, LISTING_QUEUE_SIZE, NUM_TRACKING_UNIQUES, PAGE_QUEUE_SIZE, POE_NINJA_BUILD_OVERVIEW_URL, POE_NINJA_LADDER, POE_NINJA_LANG, POE_NINJA_STATS_URL, PUBLIC_STASH_URL, STATS_LOG_INTERVAL, STREAMING_STASH_PARSER, TRACKING_UNIQUES_FILE, TRACKING_UNIQUES_MAX_AGE, UNIQUES_BLACKLIST
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock, Thread
 import heapq
+import os
 import time
-import itertools
-import re
 import traceback
 
 
+PAGE_FETCH_SECONDS = registry.histogram('ingest_page_fetch_seconds', 'Time to fetch and decode a river page, the streaming parser decodes while the body arrives')
+PAGES = registry.counter('ingest_pages_total', 'River pages fetched', ('mode',))
+FILTER_SECONDS = registry.histogram('ingest_filter_seconds', 'Time to route the items of a page to the leagues tracking them')
+PRICE_PARSE_SECONDS = registry.histogram('ingest_price_parse_seconds', 'Time to parse the prices of the routed items of a page')
+CLEAN_SECONDS = registry.histogram('ingest_clean_seconds', 'Time to match the modifiers of the priced items of a page')
+ITEMS = registry.counter('ingest_items_total', 'Items by how far they got through processing', ('outcome',))
+DELISTINGS = registry.counter('ingest_delistings_total', 'Listings gone from their stash')
+LAG_PAGES = registry.gauge('ingest_lag_pages', 'Estimated pages behind the river head')
+PAGES_SKIPPED = registry.counter('ingest_pages_skipped_total', 'Pages skipped by jumping to the river head')
+
+
+def check_next_change_id(next_change_id):
+    # a page without a next change id, e.g. a truncated one, is a failed fetch and is fetched again
+    if not next_change_id:
+        raise ValueError('Page has no next change id')
+
+
 class StashProcessor(Thread):
     def __init__(self):
         super().__init__()
         self.name = 'StashProcessor'
-        self.database = Firebase(FIREBASE_CONFIG).database().child(self.name)
-        self.currency_exchange = CurrencyExchange()
+        self.firebase = Firebase(FIREBASE_CONFIG)
+        # each league's tracking list and rates load on the bootstrap pool alongside the uniques data
+        subscribers = [
+            bootstrap_pool.submit(self.create_subscriber, league, league_name)
+        for league, league_name in LEAGUES]
         self.uniques_data_svc = UniquesInfoSvc()
-        self.tracking_uniques = self.get_tracking_uniques()
-        self.listings = {unique: {} for unique in self.tracking_uniques}
+        self.cleaning_pool = None
+        if CLEANING_POOL_WORKERS > 0:
+            # the workers compile their templates once, so they need all uniques data up front
+            self.uniques_data_svc.wait_until_loaded()
+            self.cleaning_pool = CleaningPool(self.uniques_data_svc.get_uniques_info_all(), CLEANING_POOL_WORKERS)
+        self.subscribers = [subscriber.result() for subscriber in subscribers]
+        self.dispatch_index = DispatchIndex()
+        for subscriber in self.subscribers:
+            self.dispatch_index.subscribe(subscriber.league_name, subscriber.tracking_uniques, subscriber)
+        self.next_change_id = None
+        self.epoch = 0  # bumped when fetching goes back to a page, the pages fetched before that are dropped
+        self.change_id_lock = Lock()
+        self.river_lag = RiverLag()
+        self.stash_index = StashIndex()
+        self.persisted_change_id = None  # change id to resume from once everything handed to the writers is written
+        self.checkpoint_lock = Lock()
+        self.last_checkpoint = time.time()
+        self.catch_up_pool = ThreadPoolExecutor(CATCH_UP_CONCURRENCY, thread_name_prefix='CatchUp')
+        self.catch_up_slots = BoundedSemaphore(CATCH_UP_CONCURRENCY)
+        self.stash_parser = StashStreamParser(self.dispatch_index.get_item_names(), self.dispatch_index.is_acceptable)
+
+    def create_subscriber(self, league, league_name):
+        return LeagueSubscriber(league, league_name, self.get_tracking_uniques(league))
 
-    def fetch_tracking_uniques_src(self):
+    def league_ref(self, league):
+        # pyrebase keeps the child path on the database object, so every call starts from a fresh one
+        return self.firebase.database().child(self.name).child('leagues').child(league)
+
+    def fetch_tracking_uniques_src(self, league):
         '''
-        Fetch n most or least used unique items from poeninja. Returns a list of item names.
+        Fetch n most or least used unique items of a league from poeninja. Returns a list of item names.
         '''
-        response_json = requests.get(
+        response_json = shared_client.get(
             POE_NINJA_BUILD_OVERVIEW_URL,
             params={
-                'overview': LEAGUE,
+                'overview': league,
                 'type': POE_NINJA_LADDER,
                 'language': POE_NINJA_LANG
             }
@@ -48,144 +103,376 @@ class StashProcessor(Thread):
         uniques = [item_use.item.name for item_use in item_uses]
         return uniques
 
-    def fetch_tracking_uniques_db(self):
+    def fetch_tracking_uniques_db(self, league):
         '''
-        Fetch tracking uniques from Firebase. Returns a list of item names.
+        Fetch a league's tracking uniques from Firebase. Returns a list of item names.
         '''
-        uniques = self.database.child('trackingUniques').get().val()
+        uniques = self.league_ref(league).child('trackingUniques').get().val()
         return uniques
 
-    def get_tracking_uniques(self):
+    def get_tracking_uniques(self, league):
+        '''
+        Gets a league's tracking uniques from the local snapshot, falling back to Firebase and poeninja. A
+        stale snapshot is revalidated in the background and changes to the list apply from the next start,
+        as subscriptions are fixed once ingest runs. Returns a list of item names.
         '''
-        Gets the tracking uniques from cache or poeninja. Returns a list of item names.
+        def on_update(tracking_uniques, previous):
+            if set(tracking_uniques) != set(previous):
+                self.log(f'Tracking uniques for {league} changed, restart to track the new list')
+
+        snapshot = SnapshotCache(
+            f'{self.name} {league} tracking snapshot',
+            os.path.join(DATA_ROOT, league, TRACKING_UNIQUES_FILE),
+            f'{league}:{POE_NINJA_LADDER}:{NUM_TRACKING_UNIQUES}',
+            lambda: self.fetch_tracking_uniques(league),
+            TRACKING_UNIQUES_MAX_AGE,
+            on_update,
+        )
+        return snapshot.get()
+
+    def fetch_tracking_uniques(self, league):
         '''
-        tracking_uniques = self.fetch_tracking_uniques_db()
+        Gets a league's tracking uniques from Firebase or poeninja. Returns a list of item names.
+        '''
+        tracking_uniques = self.fetch_tracking_uniques_db(league)
         fetch = False
         if tracking_uniques is None:
-            self.log('No existing tracking uniques found in Firebase, fetching from source')
+            self.log(f'No existing tracking uniques found in Firebase for {league}, fetching from source')
             fetch = True
         elif len(tracking_uniques) != NUM_TRACKING_UNIQUES:
-            self.log('Number of tracking uniques is different from cache, fetching from source')
+            self.log(f'Number of tracking uniques for {league} is different from cache, fetching from source')
             fetch = True
         if fetch:
-            tracking_uniques = self.fetch_tracking_uniques_src()
-            self.database.child(self.name).child('trackingUniques').set(tracking_uniques)
+            tracking_uniques = self.fetch_tracking_uniques_src(league)
+            self.league_ref(league).child('trackingUniques').set(tracking_uniques)
         return tracking_uniques
 
     def fetch_next_change_id(self):
-        return requests.get(POE_NINJA_STATS_URL).json()['next_change_id']
+        return shared_client.get(POE_NINJA_STATS_URL).json()['next_change_id']
 
-    def fetch_stash_data(self, id):
-        return requests.get(
+    def fetch_stash_page(self, id, stream=False):
+        return shared_client.get(
                 PUBLIC_STASH_URL,
                 params={'id': id},
-                headers=DEFAULT_POE_HEADERS
-            ).json()['stashes']
-
-    def clean_currency(self, currency):
-        if currency == 'exa':
-            return 'exalted'
-        return currency
-
-    def extract_price(self, note):
-        pattern = '^~(?:price|b\/o) (\d+(?:\.\d+)?) (\w+)$'
-        match = re.search(pattern, note)
-        if match:
-            amount, currency = match.groups()
-            currency = self.clean_currency(currency)
-            try:
-                return round(float(amount) * self.currency_exchange.get_exchange_rate(currency, 'chaos'), 2)
-            except Exception as e:
-                self.log(f'Error extracting price: {e} note: {note}')
-        return None
+                headers=DEFAULT_POE_HEADERS,
+                stream=stream
+            )
 
-    def item_is_acceptable(self, item, acceptable_items):
-        return (
-            item['league'].casefold() == LEAGUE.casefold() and
-            'note' in item and
-            item['identified'] and
-            item['name'] in acceptable_items
+    def fetch_stash_data(self, id):
+        return self.fetch_stash_page(id).json()
+
+    def create_cleaned_item(self, item, subscriber, price, template, explicit, implicit):
+        amount, currency_index = subscriber.price_parser.parse_note(item['note'])
+        return CleanedItem(
+            item['id'],
+            template,
+            item.get('corrupted', False),
+            price,
+            amount,
+            currency_index,
+            time.time(),
+            explicit,
+            implicit,
         )
 
-    def extract_modifier_values(self, modifier):
-        pattern = '([+-]?)(\d+(?:\.\d+)?)'
-        values = []
-        for match in re.finditer(pattern, modifier):
-            sign, value = match.groups()
-            values.append(-float(value) if sign == '-' else float(value))
-        return values
-
-    def clean_item(self, item, price):
-        item_info = self.uniques_data_svc.get_unique_item_info(item['extended']['category'], item['name'])
-        explicitModifiers = item.get('explicitMods', [])
-        if len(explicitModifiers) > 0:
-            explicitModifiers = [{
-                item_info_mod['text'].replace('\n', ' '): sum(self.extract_modifier_values(item_mod))
-            }
-            for item_mod, item_info_mod in zip(
-                explicitModifiers, item_info['explicitModifiers']
-            ) if not item_info_mod['constant']]
-        implicitModifiers = item.get('implicitMods', [])
-        if len(implicitModifiers) > 0:
-            implicitModifiers = [{
-                item_info_mod['text'].replace('\n', ' '): sum(self.extract_modifier_values(item_mod))
-            }
-            for item_mod, item_info_mod in zip(
-                implicitModifiers, item_info['implicitModifiers']
-            ) if not item_info_mod['constant']]
-        return {
-            'corrupted': item.get('corrupted', False),
-            'explicitMods': explicitModifiers,
-            'implicitMods': implicitModifiers,
-            'price': price,
-        }
-
-    def save_listings_to_db(self, item):
-        self.database.child(self.name).child('listings').child(item).update(self.listings[item])
+    def clean_item(self, item, subscriber, price):
+        template = self.uniques_data_svc.get_unique_template(item['extended']['category'], item['name'])
+        if template is None:
+            return None
+        return self.create_cleaned_item(
+            item,
+            subscriber,
+            price,
+            template,
+            template.explicit.match(item.get('explicitMods', [])),
+            template.implicit.match(item.get('implicitMods', [])),
+        )
+
+    def price_items(self, routed_items):
+        '''
+        Prices (stash id, item, subscriber) tuples with their league's price parser. Returns (stash id, item,
+        subscriber, price) tuples of the items with a valid price.
+        '''
+        priced_items = []
+        for stash_id, item, subscriber in routed_items:
+            try:
+                if (price := subscriber.price_parser.get_price(item['note'])) is not None:
+                    priced_items.append((stash_id, item, subscriber, price))
+            except Exception:
+                self.log(f'Error pricing item: {item.get("name")} {item.get("id")}')
+                self.log(traceback.format_exc())
+        return priced_items
+
+    def clean_items(self, priced_items):
+        '''
+        Cleans (stash id, item, subscriber, price) tuples in this thread.
+        '''
+        listings = []
+        for stash_id, item, subscriber, price in priced_items:
+            try:
+                if (cleaned_item := self.clean_item(item, subscriber, price)) is not None:
+                    listings.append((stash_id, subscriber, item['name'], cleaned_item))
+            except Exception:
+                self.log(f'Error cleaning item: {item.get("name")} {item.get("id")}')
+                self.log(traceback.format_exc())
+        return listings
+
+    def clean_items_pooled(self, priced_items):
+        '''
+        Cleans (stash id, item, subscriber, price) tuples with the modifier matching done in the cleaning pool's
+        worker processes. Only the workers compile templates, the listings here just need their columns.
+        '''
+        results = self.cleaning_pool.match([item for _, item, _, _ in priced_items])
+        listings = []
+        for (stash_id, item, subscriber, price), result in zip(priced_items, results):
+            if result is not None:
+                columns = self.uniques_data_svc.get_unique_columns(item['extended']['category'], item['name'])
+                cleaned_item = self.create_cleaned_item(item, subscriber, price, columns, *result)
+                listings.append((stash_id, subscriber, item['name'], cleaned_item))
+        return listings
 
     def log(self, msg):
         print(f'[{self.name}]: {msg}')
 
-    def run(self):
-        self.log('Starting')
-        self.log(f'Num tracking uniques: {len(self.tracking_uniques)}; Dump threshold: {DUMP_THRESHOLD}')
-        self.listings = {unique: {} for unique in self.tracking_uniques}
-        next_change_id = self.fetch_next_change_id()
-        while True:
+    def fetch_stage(self, _):
+        '''
+        Source stage. Fetches the page for the current change id and queues (epoch, change id, next change id,
+        stashes) for processing while the next page is requested. Pacing is left to the shared client's rate limiter. With
+        STREAMING_STASH_PARSER the body is parsed as it streams in and only items tracked in some league are kept.
+        '''
+        if STREAMING_STASH_PARSER and self.river_lag.is_catching_up():
+            return self.fetch_ahead()
+        with self.change_id_lock:
+            epoch, change_id = self.epoch, self.next_change_id
+        try:
+            response = self.fetch_stash_page(change_id, stream=STREAMING_STASH_PARSER)
+            if STREAMING_STASH_PARSER:
+                next_change_id, stashes = self.stash_parser.parse(response)
+            else:
+                stash_data = response.json()
+                next_change_id = stash_data['next_change_id']
+                stashes = [(stash['id'], iter_stash_items(stash)) for stash in stash_data['stashes']]
+            check_next_change_id(next_change_id)
+        except Exception:
+            self.log(traceback.format_exc())
+            return None
+        # Timed from when the request was sent up to the parsed body, leaving out the rate limiter's wait.
+        # response.elapsed stops at the headers, the streamed body is only read while parsing.
+        fetch_time = time.time() - response.requested
+        PAGE_FETCH_SECONDS.observe(fetch_time)
+        PAGES.labels('live').inc()
+        if not self.advance(epoch, next_change_id, fetch_time > FETCH_OVERRUN_TIME):
+            return None
+        return epoch, change_id, next_change_id, stashes
+
+    def fetch_ahead(self):
+        '''
+        Catch-up fetch. Reads a page only as far as its next change id and leaves the rest of the body to the
+        catch-up pool, so up to CATCH_UP_CONCURRENCY pages stream in at once while the rate limiter keeps
+        spacing out the requests. The page's stashes are returned as a Future.
+        '''
+        self.catch_up_slots.acquire()
+        with self.change_id_lock:
+            epoch, change_id = self.epoch, self.next_change_id
+        try:
+            response = self.fetch_stash_page(change_id, stream=True)
+            next_change_id, finish = self.stash_parser.parse_deferred(response)
+            check_next_change_id(next_change_id)
+        except Exception:
+            self.catch_up_slots.release()
+            self.log(traceback.format_exc())
+            return None
+        stashes = self.catch_up_pool.submit(finish)
+        stashes.add_done_callback(lambda _: self.catch_up_slots.release())
+        PAGES.labels('catch_up').inc()
+        if not self.advance(epoch, next_change_id, False):
+            return None
+        return epoch, change_id, next_change_id, stashes
+
+    def advance(self, epoch, next_change_id, overrun):
+        '''
+        Moves on to the next change id, unless fetching went back to an earlier page while this one was
+        fetched. Returns whether it did.
+        '''
+        with self.change_id_lock:
+            if epoch != self.epoch:
+                return False
+            self.river_lag.advance(next_change_id)
+            self.next_change_id = next_change_id
+        if self.river_lag.is_check_due(overrun):
+            self.check_lag()
+        return True
+
+    def rewind(self, epoch, change_id):
+        '''
+        Fetches the page at `change_id` again and drops every page fetched after it, e.g. when its body could
+        not be read. Pages of an earlier epoch were dropped already.
+        '''
+        with self.change_id_lock:
+            if epoch != self.epoch:
+                return
+            self.epoch += 1
+            self.river_lag.rewind(change_id)
+            self.next_change_id = change_id
+
+    def check_lag(self):
+        '''
+        Compares the current change id with the river head. Falls back to skipping to the head once the
+        backlog is more than CATCH_UP_MAX_LAG_PAGES pages, everything below that is caught up on.
+        '''
+        try:
+            self.river_lag.update_head(self.fetch_next_change_id())
+        except Exception:
+            self.log(traceback.format_exc())
+            return
+        lag_pages = self.river_lag.get_lag_pages()
+        LAG_PAGES.set(lag_pages)
+        if self.river_lag.is_too_far_behind():
+            self.log(f'{round(lag_pages)} pages behind the river, skipping to latest change id')
+            PAGES_SKIPPED.inc(round(lag_pages))
+            with self.change_id_lock:
+                self.next_change_id = self.river_lag.skip_to_head()
+
+    def process_stage(self, page):
+        '''
+        Routes the items of a page's stashes, or a Future of them while catching up, to the leagues tracking
+        them and cleans the priced ones. Returns the page's next change id, a list of (stash id, league
+        subscriber, item name, cleaned item) tuples and the delistings for the persistence stage. A catch-up
+        page whose body fails is fetched again along with every page after it, so no page is skipped.
+        '''
+        epoch, change_id, next_change_id, stashes = page
+        if epoch != self.epoch:
+            return None  # fetched after a page that is fetched again
+        if isinstance(stashes, Future):
             try:
-                next_request_time = time.time() + 0.51
-                stash_data = self.fetch_stash_data(next_change_id)
-
-                accepted_items = 0
-                dumps = 0
-                processing_time = time.time()
-                items = filter(
-                    lambda item: self.item_is_acceptable(item, self.tracking_uniques),
-                    itertools.chain.from_iterable(map(lambda stash: stash['items'], stash_data))
-                )
-                for item in items:
-                    if (price := self.extract_price(item['note'])) is not None:
-                        cleaned_item = self.clean_item(item, price)
-                        item_name = item['name']
-                        self.listings[item_name][item['id']] = cleaned_item
-                        if len(self.listings[item_name]) > DUMP_THRESHOLD:
-                            self.save_listings_to_db(item_name)
-                            self.listings[item_name] = {}
-                            dumps += 1
-                        accepted_items += 1
-                processing_time = time.time() - processing_time
-                self.log(f'Processed: ({accepted_items};{dumps}) items in {round(processing_time * 1000, 2)}ms')
-
-                current_time = time.time()
-                if next_request_time <= current_time:
-                    next_change_id = self.fetch_next_change_id()
-                else:
-                    next_change_id = stash_data['next_change_id']
-                    delay = next_request_time - current_time
-                    time.sleep(max(delay, 0))
+                stashes = stashes.result()
+            except Exception:
+                self.log(f'Failed to read page {change_id}, fetching it again')
+                self.log(traceback.format_exc())
+                self.rewind(epoch, change_id)
+                return None
+        processing_time = time.time()
+        for subscriber in self.subscribers:
+            try:
+                subscriber.currency_exchange.refresh_if_expired()
             except Exception:
-                self.log(item)
                 self.log(traceback.format_exc())
-                self.log('Saving listings to Firebase')
-                for item in self.tracking_uniques:
-                    self.save_listings_to_db(item)
+        with FILTER_SECONDS.time():
+            routed_items = [
+                (stash_id, item, subscriber)
+            for stash_id, items in stashes for item in items if (subscriber := self.dispatch_index.route(item)) is not None]
+        with PRICE_PARSE_SECONDS.time():
+            priced_items = self.price_items(routed_items)
+        with CLEAN_SECONDS.time():
+            if self.cleaning_pool is not None:
+                listings = self.clean_items_pooled(priced_items)
+            else:
+                listings = self.clean_items(priced_items)
+        ITEMS.labels('routed').inc(len(routed_items))
+        ITEMS.labels('priced').inc(len(priced_items))
+        ITEMS.labels('cleaned').inc(len(listings))
+        delistings = self.track_stashes(stashes, listings)
+        DELISTINGS.inc(len(delistings))
+        processing_time = time.time() - processing_time
+        self.log(f'Processed: {len(listings)} items, {len(delistings)} delisted in {round(processing_time * 1000, 2)}ms')
+        return next_change_id, listings, delistings
+
+    def track_stashes(self, stashes, listings):
+        '''
+        Records the listings of every stash on the page in the stash index. Returns (league subscriber, item
+        name, item id) of the listings that are gone from their stash.
+        '''
+        stash_listings = {stash_id: {} for stash_id, _ in stashes}
+        for stash_id, subscriber, item_name, cleaned_item in listings:
+            stash_listings[stash_id][cleaned_item.id] = (subscriber, item_name)
+        delistings = []
+        for stash_id, current in stash_listings.items():
+            delistings += self.stash_index.update(stash_id, current)
+        return delistings
+
+    def persist_stage(self, page):
+        '''
+        Hands cleaned listings and delistings to their league's write-behind ListingsWriter, which batches them
+        across uniques, and checkpoints every CHECKPOINT_INTERVAL seconds.
+        '''
+        next_change_id, listings, delistings = page
+        delisted = time.time()
+        # Adds block while the writers are full, so they are made outside the lock and a checkpoint taken in
+        # the meantime does not wait for them. Such a checkpoint holds part of this page under the previous
+        # change id, and replaying the page on resume rewrites the same listings.
+        for _, subscriber, item_name, cleaned_item in listings:
+            subscriber.listings_writer.add(item_name, cleaned_item)
+        for subscriber, item_name, item_id in delistings:
+            subscriber.listings_writer.delist(item_name, item_id, delisted)
+        with self.checkpoint_lock:
+            self.persisted_change_id = next_change_id
+        if time.time() - self.last_checkpoint >= CHECKPOINT_INTERVAL:
+            self.save_checkpoint()
+        return None
+
+    def save_checkpoint(self):
+        '''
+        Saves the change id after the last page handed to the writers together with every listing and
+        delisting the writers have not written yet, so a restart resumes exactly where this one left off. The
+        stash index is not saved, listings of stashes seen before a restart are only delisted once they are
+        relisted and gone again.
+        '''
+        self.last_checkpoint = time.time()
+        try:
+            with self.checkpoint_lock:
+                if self.persisted_change_id is None:
+                    return
+                change_id = self.persisted_change_id
+                leagues = {}
+                for subscriber in self.subscribers:
+                    listings, delistings = subscriber.listings_writer.snapshot()
+                    leagues[subscriber.league] = {'listings': listings, 'delistings': delistings}
+                # written under the lock too, so a checkpoint taken on shutdown is never replaced by an
+                # older one the persister was still writing
+                save_checkpoint(change_id, leagues)
+        except Exception:
+            self.log('Failed to save checkpoint')
+            self.log(traceback.format_exc())
+
+    def restore_checkpoint(self):
+        '''
+        Queues the unwritten listings and delistings of the last checkpoint for writing. Returns the change id to resume from,
+        or None if there is no checkpoint.
+        '''
+        if (checkpoint := load_checkpoint()) is None:
+            return None
+        change_id, leagues = checkpoint
+        for subscriber in self.subscribers:
+            league = leagues.get(subscriber.league, {})
+            subscriber.listings_writer.restore(league.get('listings', {}), league.get('delistings', {}))
+        num_listings = sum(
+            len(item_listings) for league in leagues.values() for item_listings in league.get('listings', {}).values()
+        )
+        self.log(f'Resuming from checkpoint at {change_id} with {num_listings} unwritten listings')
+        return change_id
+
+    def run(self):
+        self.log('Starting')
+        for subscriber in self.subscribers:
+            self.log(f'Num tracking uniques in {subscriber.league_name}: {len(subscriber.tracking_uniques)}')
+            subscriber.listings_writer.start()
+        self.next_change_id = self.restore_checkpoint() or self.fetch_next_change_id()
+        self.persisted_change_id = self.next_change_id
+        self.river_lag = RiverLag(self.next_change_id)
+        pages = create_queue(PAGE_QUEUE_SIZE)
+        processed = create_queue(LISTING_QUEUE_SIZE)
+        stages = [
+            Stage('Fetcher', self.fetch_stage, outbox=pages),
+            Stage('Processor', self.process_stage, inbox=pages, outbox=processed),
+            Stage('Persister', self.persist_stage, inbox=processed),
+        ]
+        for stage in stages:
+            stage.start()
+        while True:
+            time.sleep(STATS_LOG_INTERVAL)
+            for stage in stages:
+                self.log(stage.report())
+            self.log(self.river_lag.report())
+            self.log(f'StashIndex: stashes={len(self.stash_index)} evictions={self.stash_index.evictions}')
+            for subscriber in self.subscribers:
+                self.log(subscriber.listings_writer.report())
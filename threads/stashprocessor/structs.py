@@ -25,3 +25,18 @@ class ItemUse:
     
     def __str__(self):
         return f'{self.item}: {self.num}'
+
+class CleanedItem:
+    __slots__ = ('id', 'template', 'corrupted', 'price', 'amount', 'currency_index', 'seen', 'explicit', 'implicit')
+
+    def __init__(self, id: str, template, corrupted: bool, price: float, amount: float, currency_index: int,
+                 seen: float, explicit: dict, implicit: dict):
+        self.id = id
+        self.template = template
+        self.corrupted = corrupted
+        self.price = price
+        self.amount = amount
+        self.currency_index = currency_index
+        self.seen = seen
+        self.explicit = explicit  # template explicit column index -> value
+        self.implicit = implicit  # template implicit column index -> value
@@ -1,25 +1,103 @@
 from pyrebase.pyrebase import Firebase
-from config.shared import FIREBASE_CONFIG, LEAGUE_CAP
-from config.stashprocessor import POE_NINJA_ITEM_OVERVIEW_URL, POE_NINJA_LANG
-import re
-import requests
+from config.shared import FIREBASE_CONFIG, LEAGUE, LEAGUE_CAP
+from config.stashprocessor import BOOTSTRAP_RETRY_INTERVAL, POE_NINJA_ITEM_OVERVIEW_URL, POE_NINJA_LANG, UNIQUES_DATA_FILE, UNIQUES_DATA_MAX_AGE
+from concurrent.futures import as_completed
+from threading import Event, Thread
+from threads.stashprocessor.bootstrap import bootstrap_pool
+from threads.stashprocessor.httpclient import shared_client
+from threads.stashprocessor.modifiertemplate import RANGE_PATTERN, UniqueColumns, UniqueTemplate
+from threads.stashprocessor.snapshot import SnapshotCache
+import time
+import traceback
+
+
+UNIQUE_ITEM_TYPES = {
+    'UniqueAccessory': 'accessories',
+    'UniqueArmour': 'armour',
+    'UniqueFlask': 'flasks',
+    'UniqueJewel': 'jewels',
+    'UniqueMap': 'maps',
+    'UniqueWeapon': 'weapons',
+}
 
 
 class UniquesInfoSvc:
-    def __init__(self):
+    def __init__(self, snapshot_path=UNIQUES_DATA_FILE):
         self.name = 'UniquesInfoSvc'
-        self.database = Firebase(FIREBASE_CONFIG).database().child(self.name)
-        self._uniques_info = self.get_uniques_info()
+        self.firebase = Firebase(FIREBASE_CONFIG)
+        self.snapshot = SnapshotCache(
+            f'{self.name} snapshot', snapshot_path, LEAGUE, self.refresh_uniques_info, UNIQUES_DATA_MAX_AGE, self.on_revalidated
+        )
+        self._templates = {}  # (category, name) -> compiled template
+        self._columns = {}  # (category, name) -> columns of uniques matched in the cleaning pool
+        self.loaded = Event()
+        self._uniques_info = self.snapshot.load()
+        if self._uniques_info is not None:
+            self.loaded.set()
+        else:
+            self._uniques_info = {}
+            Thread(target=self.bootstrap, name=f'{self.name} bootstrap', daemon=True).start()
 
     def log(self, msg):
         print(f'[{self.name}]: {msg}')
 
-    def get_uniques_info(self):
+    def uniques_ref(self):
+        # pyrebase clears the child path after every request, and revalidation reads again later
+        return self.firebase.database().child(self.name)
+
+    def on_revalidated(self, uniques, previous):
+        '''
+        Revalidated uniques data is saved but only applies from the next start, like tracking lists. The
+        cleaning pool's workers and every league's listing buffers keep the templates they started with, so
+        swapping templates while ingest runs would write listings against columns they were not matched with.
+        '''
+        if uniques != previous:
+            self.log('Uniques data changed, restart to apply it')
+
+    def bootstrap(self):
+        '''
+        Loads uniques data without a usable snapshot. Categories fetched from source are served as each one
+        arrives, so ingest starts on the uniques already loaded and skips the others until theirs is in.
+        '''
+        self.log('No usable snapshot, loading uniques data')
+        while True:
+            try:
+                uniques = self.get_uniques_info(self.add_category)
+                break
+            except Exception:
+                self.log(f'Failed to load uniques data, retrying in {BOOTSTRAP_RETRY_INTERVAL}s')
+                self.log(traceback.format_exc())
+                time.sleep(BOOTSTRAP_RETRY_INTERVAL)
+        self.snapshot.store(uniques)
+        self._uniques_info = uniques
+        self.loaded.set()
+        self.log(f'Loaded {sum(len(items) for items in uniques.values())} uniques')
+
+    def add_category(self, item_type, items):
+        self._uniques_info[item_type] = items
+
+    def wait_until_loaded(self):
+        self.loaded.wait()
+
+    def get_uniques_info(self, on_category=None):
         uniques = self.fetch_uniques_data_db()
         if uniques is None:
             self.log('No existing uniques data found in Firebase, fetching from source')
-            uniques = self.fetch_uniques_data_src()
-            self.database.update(uniques)
+            uniques = self.fetch_uniques_data_src(on_category)
+            self.uniques_ref().update(uniques)
+        return uniques
+
+    def refresh_uniques_info(self):
+        '''
+        Fetches uniques data from source and stores it in Firebase, so a stale snapshot is revalidated against
+        poe.ninja rather than against the copy in Firebase it was saved from.
+        '''
+        uniques = self.fetch_uniques_data_src()
+        try:
+            self.uniques_ref().update(uniques)
+        except Exception:
+            self.log('Failed to store refreshed uniques data in Firebase')
+            self.log(traceback.format_exc())
         return uniques
 
     def flatten_lines(self, lines):
@@ -31,14 +109,8 @@ class UniquesInfoSvc:
         return ret
 
     def extract_ranges(self, string):
-        # matches constants and ranges in 4 groups:
-        # 1. sign (optional)
-        # 2. ignore
-        # 3. lower number (possibly a negative number)
-        # 4. upper number (optional)
-        pattern = '([+-]?)(\()?([+-]?\d+(?:\.\d+)?)(?(2)-(\d+(?:\.\d+)?)|(?!\)))'
         ranges = []
-        for match in re.finditer(pattern, string):
+        for match in RANGE_PATTERN.finditer(string):
             sign, _, lower, upper = match.groups()
             lower = float(lower)
             upper = float(upper) if upper is not None else lower  # empty 'upper' indicates constant
@@ -55,7 +127,9 @@ class UniquesInfoSvc:
         return constant
 
     def fetch_uniques_data_db(self):
-        uniques = self.database.get().val()
+        uniques = self.uniques_ref().get().val()
+        if uniques is None:
+            return None
         # Re-create fields in case they are empty because FB does not store empty fields -_-
         for category_items in uniques.values():
             for item in category_items.values():
@@ -69,48 +143,88 @@ class UniquesInfoSvc:
                     item['mapTier'] = None
         return uniques
 
-    def fetch_uniques_data_src(self):
-        UNIQUE_ITEM_TYPES = {
-            'UniqueAccessory': 'accessories',
-            'UniqueArmour': 'armour',
-            'UniqueFlask': 'flasks',
-            'UniqueJewel': 'jewels',
-            'UniqueMap': 'maps',
-            'UniqueWeapon': 'weapons',
-        }
+    def fetch_uniques_data_src(self, on_category=None):
+        '''
+        Fetches every category of uniques concurrently on the bootstrap pool and parses each one as soon as
+        it arrives, handing it to `on_category(item type, items)` if given.
+        '''
+        fetches = {
+            bootstrap_pool.submit(self.fetch_unique_items, item_type_poeninja): item_type
+        for item_type_poeninja, item_type in UNIQUE_ITEM_TYPES.items()}
         uniques = {}
-        for item_type_poeninja, item_type in UNIQUE_ITEM_TYPES.items():
-            self.log(f'Fetching unique items type: {item_type}')
-            response_json = requests.get(
-                POE_NINJA_ITEM_OVERVIEW_URL,
-                params={
-                    'league': LEAGUE_CAP,
-                    'type': item_type_poeninja,
-                    'language': POE_NINJA_LANG,
-                }
-            ).json()
-            items = {}
-            for item in self.flatten_lines(response_json['lines']):
-                if not item['detailsId'].endswith('-relic'):  # filter out relic items
-                    for mod_type in ['explicitModifiers', 'implicitModifiers']:
-                        for modifier in item[mod_type]:
-                            ranges = self.extract_ranges(modifier['text'])
-                            constant = self.modifier_is_constant(ranges)
-                            modifier['ranges'] = ranges
-                            modifier['constant'] = constant
-                    items[item['name']] = {
-                        'detailsId': item['detailsId'],
-                        'name': item['name'],
-                        'explicitModifiers': item['explicitModifiers'],
-                        'implicitModifiers': item['implicitModifiers'],
-                        'links': item.get('links', None),
-                        'mapTier': item.get('mapTier', None),
-                    }
-            uniques[item_type] = items
+        for fetch in as_completed(fetches):
+            item_type = fetches[fetch]
+            uniques[item_type] = items = self.parse_unique_items(fetch.result())
+            if on_category is not None:
+                on_category(item_type, items)
         return uniques
 
+    def fetch_unique_items(self, item_type_poeninja):
+        self.log(f'Fetching unique items type: {item_type_poeninja}')
+        return shared_client.get(
+            POE_NINJA_ITEM_OVERVIEW_URL,
+            params={
+                'league': LEAGUE_CAP,
+                'type': item_type_poeninja,
+                'language': POE_NINJA_LANG,
+            }
+        ).json()
+
+    def parse_unique_items(self, response_json):
+        items = {}
+        for item in self.flatten_lines(response_json['lines']):
+            if not item['detailsId'].endswith('-relic'):  # filter out relic items
+                for mod_type in ['explicitModifiers', 'implicitModifiers']:
+                    for modifier in item[mod_type]:
+                        ranges = self.extract_ranges(modifier['text'])
+                        constant = self.modifier_is_constant(ranges)
+                        modifier['ranges'] = ranges
+                        modifier['constant'] = constant
+                items[item['name']] = {
+                    'detailsId': item['detailsId'],
+                    'name': item['name'],
+                    'explicitModifiers': item['explicitModifiers'],
+                    'implicitModifiers': item['implicitModifiers'],
+                    'links': item.get('links', None),
+                    'mapTier': item.get('mapTier', None),
+                }
+        return items
+
+    def get_uniques_info_all(self):
+        return self._uniques_info
+
     def get_unique_item_info(self, item_category, item_name):
         try:
             return self._uniques_info[item_category][item_name]
         except KeyError:
             return None
+
+    def get_unique_template(self, item_category, item_name):
+        '''
+        Compiles a unique's modifier list the first time it is listed and keeps it, so listings are matched
+        without any per-item template work and startup does not compile the uniques nobody tracks. Returns
+        None for uniques without data, which may still be loading.
+        '''
+        templates = self._templates
+        key = (item_category, item_name)
+        template = templates.get(key)
+        if template is None:
+            item_info = self.get_unique_item_info(item_category, item_name)
+            if item_info is None:
+                return None
+            template = templates[key] = UniqueTemplate(item_info)
+        return template
+
+    def get_unique_columns(self, item_category, item_name):
+        '''
+        Like get_unique_template but without compiling the modifier patterns, for listings the cleaning pool's
+        workers matched. Returns None for uniques without data.
+        '''
+        key = (item_category, item_name)
+        columns = self._columns.get(key)
+        if columns is None:
+            item_info = self.get_unique_item_info(item_category, item_name)
+            if item_info is None:
+                return None
+            columns = self._columns[key] = UniqueColumns(item_info)
+        return columns